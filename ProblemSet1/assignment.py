@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+from typing import List, Sequence
+
+# This file contains an incremental solver for the assignment problem (minimum cost perfect matching in a bipartite graph)
+# It is the Hungarian algorithm in its shortest augmenting path form:
+#   - Each row i has a potential u[i] and each column j has a potential v[j] such that
+#     the reduced cost "cost[i][j] - u[i] - v[j]" is never negative and it is zero for every matched pair.
+#   - Each unmatched row is matched by one augmentation (a Dijkstra-like search over the reduced costs) in O(n^2)
+#     so solving from scratch takes O(n^3).
+# Since the potentials prove the optimality of the matching, a solution can be repaired when the costs of a single row change:
+# the row is unmatched, its potential is lowered to keep the reduced costs non-negative, then it is matched again by one augmentation.
+# So the repair only costs O(n^2).
+
+@dataclass
+class Assignment:
+    costs: List[List[float]]        # The square cost matrix
+    row_potentials: List[float]
+    col_potentials: List[float]
+    row_match: List[int]            # row_match[i] is the column matched with row i
+    col_match: List[int]            # col_match[j] is the row matched with column j
+    total: float                    # The total cost of the matching
+
+# Solves the assignment problem for the given square cost matrix from scratch
+def solve_assignment(costs: Sequence[Sequence[float]]) -> Assignment:
+    n = len(costs)
+    costs = [list(row) for row in costs]
+    # Starting with zero potentials is valid since the costs are non-negative
+    row_potentials, col_potentials = [0] * n, [0] * n
+    row_match, col_match = [-1] * n, [-1] * n
+    for row in range(n):
+        _augment(costs, row_potentials, col_potentials, row_match, col_match, row)
+    return Assignment(costs, row_potentials, col_potentials, row_match, col_match, _total(costs, row_match))
+
+# Returns the solution of the same problem after replacing the costs of the given row
+# The given assignment is not modified (so it can still be reused for other repairs)
+def repair_assignment(assignment: Assignment, row: int, row_costs: Sequence[float]) -> Assignment:
+    costs = assignment.costs[:]
+    costs[row] = list(row_costs)
+    row_potentials, col_potentials = assignment.row_potentials[:], assignment.col_potentials[:]
+    row_match, col_match = assignment.row_match[:], assignment.col_match[:]
+    # Unmatch the row then lower its potential so that all its reduced costs are non-negative
+    col_match[row_match[row]] = -1
+    row_match[row] = -1
+    row_potentials[row] = min(cost - potential for cost, potential in zip(costs[row], col_potentials))
+    _augment(costs, row_potentials, col_potentials, row_match, col_match, row)
+    return Assignment(costs, row_potentials, col_potentials, row_match, col_match, _total(costs, row_match))
+
+def _total(costs: List[List[float]], row_match: List[int]) -> float:
+    return sum(costs[row][col] for row, col in enumerate(row_match))
+
+# Matches the unmatched row "root" by finding the shortest augmenting path over the reduced costs
+# and updates the potentials so that the reduced costs stay non-negative and zero on the matched pairs
+def _augment(costs, row_potentials, col_potentials, row_match, col_match, root: int) -> None:
+    n = len(costs)
+    INF = float('inf')
+    # slack[j] is the minimum reduced cost from the visited rows to column j and slack_row[j] is the row that achieves it
+    slack = [INF] * n
+    slack_row = [-1] * n
+    used_cols = [False] * n
+    visited_rows = [root]
+    row = root
+    while True:
+        # Relax the columns from the last visited row then pick the unused column with the minimum slack
+        row_costs, row_potential = costs[row], row_potentials[row]
+        delta, next_col = INF, -1
+        for col in range(n):
+            if used_cols[col]: continue
+            reduced = row_costs[col] - row_potential - col_potentials[col]
+            if reduced < slack[col]:
+                slack[col] = reduced
+                slack_row[col] = row
+            if slack[col] < delta:
+                delta, next_col = slack[col], col
+        # Shift the potentials by delta so that the edge to the picked column becomes tight
+        # while the matched pairs within the search tree stay tight
+        for visited in visited_rows:
+            row_potentials[visited] += delta
+        for col in range(n):
+            if used_cols[col]:
+                col_potentials[col] -= delta
+            else:
+                slack[col] -= delta
+        used_cols[next_col] = True
+        if col_match[next_col] == -1:
+            break
+        # The column is already matched so continue the search from its row
+        row = col_match[next_col]
+        visited_rows.append(row)
+    # Flip the matching along the augmenting path (from the free column back to the root)
+    col = next_col
+    while True:
+        row = slack_row[col]
+        previous_col = row_match[row]
+        row_match[row], col_match[col] = col, row
+        if row == root:
+            break
+        col = previous_col
@@ -0,0 +1,208 @@
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
+import argparse, glob, json, multiprocessing, os, queue, resource, sys, time
+
+from problem import HeuristicFunction, Problem
+
+# This file contains a batch solver which runs a search algorithm on many sokoban levels, parking lots and graphs
+# The files are given as glob patterns and the domain of each file is detected from its content (see detect_domain).
+#
+# Each instance is solved in its own forked process and at most "workers" instances run at the same time.
+# (a multiprocessing pool cannot stop a task that runs for too long, while a process per instance can be terminated)
+#   - if an instance runs longer than the timeout, its process is terminated and it is reported as "timeout"
+#   - if a memory cap is given, it is applied to the address space of the process (RLIMIT_AS) and an instance
+#     that exceeds it is reported as "memory" (the cap includes the memory inherited from the batch process)
+# The result of each instance is written as a JSON line as soon as it is finished (so the lines are in the order of completion):
+#   file, domain, algorithm, heuristic, status ("solved", "no solution", "timeout", "memory" or "error"),
+#   path (the actions as strings), cost, expansions (the calls to get_actions), time (the search time in seconds) and error
+# A summary with the throughput of the batch is printed to stderr at the end.
+
+ALGORITHMS = ("bfs", "dfs", "ids", "ucs", "astar", "gbfs", "idastar", "smastar", "arastar")
+INFORMED = ("astar", "gbfs", "idastar", "smastar", "arastar")
+# The heuristics of each domain, "default" selects the heuristic used by the benchmark suite (see benchmark.get_heuristic)
+HEURISTICS = {
+    "sokoban": ("default", "zero", "weak", "strong", "pdb", "pdb3"),
+    "parking": ("default", "zero", "distance", "blocking"),
+    "graph": ("default", "zero", "euclidean", "landmarks"),
+}
+
+# Detects the domain of a problem file: graphs are JSON files, sokoban levels contain a player and parking lots contain cars
+def detect_domain(path: str) -> str:
+    if path.endswith(".json"):
+        return "graph"
+    with open(path, "r") as f:
+        text = f.read()
+    if "#" in text:
+        if any(tile in text for tile in "@+"):
+            return "sokoban"
+        if any(car in text for car in "ABCDEFGHIJ"):
+            return "parking"
+    raise ValueError(f"Cannot detect the domain of '{path}'")
+
+def get_heuristic(domain: str, name: str) -> HeuristicFunction:
+    if name not in HEURISTICS[domain]:
+        raise ValueError(f"Unknown {domain} heuristic '{name}', expected one of {list(HEURISTICS[domain])}")
+    if name == "default":
+        from benchmark import get_heuristic as default_heuristic
+        return default_heuristic(domain)
+    if name == "zero":
+        return lambda *_: 0
+    if domain == "sokoban":
+        from play_sokoban import get_heuristic as sokoban_heuristic
+        return sokoban_heuristic(name)
+    if domain == "parking":
+        from parking_heuristic import HEURISTICS as parking_heuristics
+        return parking_heuristics[name]
+    from play_graph import get_heuristic as graph_heuristic
+    return graph_heuristic(name)
+
+# Returns the search function called as search_fn(problem, initial_state, *args)
+# The anytime A* returns the best solution found before the deadline (if any)
+def get_search(name: str, deadline: Optional[float]) -> Callable:
+    if name == "arastar":
+        from search import AnytimeAStarSearch
+        return lambda problem, state, heuristic: AnytimeAStarSearch(problem, state, heuristic, deadline=deadline)
+    from benchmark import get_search as benchmark_search
+    return benchmark_search(name)
+
+# Converts an action to a string: a direction (sokoban), a car and a direction (parking) or a node name (graph)
+def format_action(action: Any) -> str:
+    if isinstance(action, tuple):
+        car, direction = action
+        return f"{chr(ord('A') + car)}{direction}"
+    return str(action)
+
+# Solves an instance (in the child process) and returns its record
+def solve(path: str, domain: str, algorithm: str, heuristic_name: str, deadline: Optional[float]) -> Dict[str, Any]:
+    from portfolio import load_problem, solution_cost
+    from helpers.cache import memoize_heuristic
+    problem: Problem = load_problem(domain, path)
+    search_fn = get_search(algorithm, deadline)
+    extra = (memoize_heuristic(get_heuristic(domain, heuristic_name)),) if algorithm in INFORMED else ()
+    calls = [0]
+    get_actions = problem.get_actions
+    def counting_get_actions(state):
+        calls[0] += 1
+        return get_actions(state)
+    problem.get_actions = counting_get_actions
+    initial_state = problem.get_initial_state()
+    start = time.perf_counter()
+    solution = search_fn(problem, initial_state, *extra)
+    elapsed = time.perf_counter() - start
+    problem.get_actions = get_actions
+    return {
+        "status": "no solution" if solution is None else "solved",
+        "path": None if solution is None else [format_action(action) for action in solution],
+        "cost": None if solution is None else solution_cost(problem, initial_state, solution),
+        "expansions": calls[0],
+        "time": elapsed,
+    }
+
+def _child(index: int, task: Tuple[str, str, str, str], memory: Optional[int], deadline: Optional[float], results) -> None:
+    path, domain, algorithm, heuristic = task
+    # Only the soft limit is lowered, so it can be restored before sending the record (the queue starts a thread which needs memory)
+    limits = resource.getrlimit(resource.RLIMIT_AS)
+    try:
+        if memory is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (memory, limits[1]))
+        record = solve(path, domain, algorithm, heuristic, deadline)
+    except MemoryError:
+        record = {"status": "memory", "error": "MemoryError"}
+    except BaseException as error:
+        record = {"status": "error", "error": f"{type(error).__name__}: {error}"}
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, limits)
+    results.put((index, record))
+
+# Solves the tasks (path, domain, algorithm, heuristic) over "workers" processes and calls "emit" with the record of each instance
+def solve_all(tasks: List[Tuple[str, str, str, str]], workers: int, timeout: Optional[float], memory: Optional[int],
+              emit: Callable[[Dict[str, Any]], None]) -> None:
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    pending = deque(enumerate(tasks))
+    running: Dict[int, Tuple[Any, float]] = {}
+    # The anytime search stops a little before the timeout so that it can return its best solution
+    deadline = None if timeout is None else 0.9 * timeout
+
+    def finish(index: int, record: Dict[str, Any]) -> None:
+        process, _ = running.pop(index)
+        process.join()
+        path, domain, algorithm, heuristic = tasks[index]
+        emit({"file": path, "domain": domain, "algorithm": algorithm,
+              "heuristic": heuristic if algorithm in INFORMED else None, **record})
+
+    def receive(timeout: float) -> bool:
+        try:
+            index, record = results.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        # A record can arrive after its process was reported as a timeout
+        if index in running: finish(index, record)
+        return True
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, task = pending.popleft()
+            process = context.Process(target=_child, args=(index, task, memory, deadline, results), daemon=True)
+            process.start()
+            running[index] = (process, time.perf_counter())
+        receive(0.01)
+        now = time.perf_counter()
+        for index, (process, started) in list(running.items()):
+            if timeout is not None and now - started > timeout:
+                process.terminate()
+                finish(index, {"status": "timeout", "time": now - started})
+            elif not process.is_alive():
+                # The record of a finished process may still be in the queue, a process that died without one crashed
+                while index in running and receive(0.1): pass
+                if index in running:
+                    finish(index, {"status": "error", "error": f"the process exited with code {process.exitcode}"})
+
+# Expands the glob patterns into the list of files (each file is listed once, in sorted order)
+def find_files(patterns: List[str]) -> List[str]:
+    files = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            if path not in files and os.path.isfile(path):
+                files.append(path)
+    return files
+
+def main(args: argparse.Namespace) -> int:
+    output: TextIO = sys.stdout if args.output is None else open(args.output, "w")
+    summary = {"solved": 0, "instances": 0, "expansions": 0}
+    def emit(record: Dict[str, Any]) -> None:
+        summary["instances"] += 1
+        summary["solved"] += record["status"] == "solved"
+        summary["expansions"] += record.get("expansions", 0)
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+    start = time.perf_counter()
+    tasks = []
+    for path in find_files(args.files):
+        try:
+            domain = detect_domain(path) if args.domain == "auto" else args.domain
+        except ValueError as error:
+            emit({"file": path, "status": "error", "error": str(error)})
+            continue
+        tasks.append((path, domain, args.algorithm, args.heuristic))
+    memory = None if args.memory is None else int(args.memory * 2**20)
+    solve_all(tasks, args.workers, args.timeout, memory, emit)
+    elapsed = time.perf_counter() - start
+    if output is not sys.stdout: output.close()
+    print(f"Solved {summary['solved']}/{summary['instances']} instances in {elapsed:.3f}s "
+          f"({summary['instances'] / max(elapsed, 1e-9):.2f} instances/s, {summary['expansions'] / max(elapsed, 1e-9):.0f} expansions/s)",
+          file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve many sokoban levels, parking lots and graphs in parallel and write the results as JSON lines")
+    parser.add_argument("files", nargs="+", help="glob patterns of the problem files")
+    parser.add_argument("--domain", "-d", default="auto", choices=["auto", *HEURISTICS], help="the domain of the files (detected from each file by default)")
+    parser.add_argument("--algorithm", "-a", default="astar", choices=ALGORITHMS, help="the search algorithm")
+    parser.add_argument("--heuristic", "-hf", default="default", choices=sorted({name for names in HEURISTICS.values() for name in names}),
+                        help="the heuristic of the informed searches (it must exist in the domain of every file)")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1, help="the number of instances solved at the same time")
+    parser.add_argument("--timeout", "-t", type=float, default=None, help="the time limit of each instance in seconds")
+    parser.add_argument("--memory", "-m", type=float, default=None, help="the address space limit of each instance in MB")
+    parser.add_argument("--output", "-o", default=None, help="the file receiving the JSON lines (stdout by default)")
+    exit(main(parser.parse_args()))
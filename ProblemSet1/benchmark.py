@@ -0,0 +1,181 @@
+from typing import Any, Dict, List, Optional
+import argparse, glob, json, multiprocessing, os, resource, subprocess, time
+
+from problem import Problem
+
+# This file contains a benchmark suite which runs the search algorithms of search.py on every problem file
+# (the sokoban levels, the graphs and the parking lots) and keeps a history of the results to detect regressions.
+#
+# Each run is done in a forked child process so that:
+#   - its peak RSS (the maximum resident memory, from getrusage) is measured on its own
+#     (it is reported as the increase over the resident memory of the child before the search starts)
+#   - it can be killed when it exceeds the time limit
+# For each run, the suite records the wall time (the best of "repeat" runs), the expansions (the calls to get_actions),
+# the peak RSS and the solution cost (or the status: "no solution", "timeout" or "error").
+#
+# The results are appended to a JSON history file, and each case is compared with the latest earlier run where it was measured.
+# A case is flagged as a regression if its time, expansions or memory grew by more than the threshold (in percent),
+# if its cost grew, or if it was solved before and it is not solved anymore.
+# Very short times are noisy, so a time regression also needs the time to grow by more than "min_time" seconds.
+
+DOMAINS = {"sokoban": "levels/*.txt", "graph": "graphs/*.json", "parking": "parks/*.txt"}
+ALGORITHMS = ("bfs", "dfs", "ids", "ucs", "astar", "gbfs", "idastar", "smastar")
+INFORMED = ("astar", "gbfs", "idastar", "smastar")
+
+def get_search(name: str):
+    import search
+    return {
+        "bfs": search.BreadthFirstSearch, "dfs": search.DepthFirstSearch, "ids": search.IterativeDeepeningSearch, "ucs": search.UniformCostSearch,
+        "astar": search.AStarSearch, "gbfs": search.BestFirstSearch,
+        "idastar": search.IterativeDeepeningAStarSearch, "smastar": search.SMAStarSearch,
+    }[name]
+
+# The heuristic used by the informed searches in each domain
+def get_heuristic(domain: str):
+    if domain == "sokoban":
+        from sokoban_heuristic import strong_heuristic
+        return strong_heuristic
+    if domain == "parking":
+        from parking_heuristic import blocking_heuristic
+        return blocking_heuristic
+    from graph import graphrouting_heuristic
+    return graphrouting_heuristic
+
+# Runs one search (in the child process) and returns its measurements
+def _measure(domain: str, path: str, algorithm: str) -> Dict[str, Any]:
+    from portfolio import load_problem, solution_cost
+    problem: Problem = load_problem(domain, path)
+    search_fn = get_search(algorithm)
+    extra = (get_heuristic(domain),) if algorithm in INFORMED else ()
+    calls = [0]
+    get_actions = problem.get_actions
+    def counting_get_actions(state):
+        calls[0] += 1
+        return get_actions(state)
+    problem.get_actions = counting_get_actions
+    initial_state = problem.get_initial_state()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    solution = search_fn(problem, initial_state, *extra)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    problem.get_actions = get_actions
+    return {
+        "status": "solved" if solution is not None else "no solution",
+        "time": elapsed,
+        "expansions": calls[0],
+        "peak_rss_kb": peak_rss,
+        "cost": None if solution is None else solution_cost(problem, initial_state, solution),
+    }
+
+def _child(domain: str, path: str, algorithm: str, results) -> None:
+    try:
+        results.put(_measure(domain, path, algorithm))
+    except BaseException as error:
+        results.put({"status": "error", "error": f"{type(error).__name__}: {error}"})
+
+# Runs a case in a child process and returns its measurements (or a "timeout" status)
+def run_case(domain: str, path: str, algorithm: str, timeout: float) -> Dict[str, Any]:
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=_child, args=(domain, path, algorithm, results), daemon=True)
+    process.start()
+    try:
+        result = results.get(timeout=timeout)
+    except Exception:
+        result = {"status": "timeout"}
+        process.terminate()
+    process.join()
+    return result
+
+# Runs every case "repeat" times and keeps the best time (and the highest peak RSS)
+def run_suite(domains: List[str], algorithms: List[str], timeout: float, repeat: int, verbose: bool = True) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for domain in domains:
+        for path in sorted(glob.glob(DOMAINS[domain])):
+            for algorithm in algorithms:
+                key = f"{domain}:{os.path.basename(path)}:{algorithm}"
+                best = None
+                for _ in range(repeat):
+                    result = run_case(domain, path, algorithm, timeout)
+                    if best is None or result["status"] not in ("solved", "no solution"):
+                        best = result
+                    else:
+                        best["peak_rss_kb"] = max(best["peak_rss_kb"], result["peak_rss_kb"])
+                        best["time"] = min(best["time"], result["time"])
+                    if best["status"] not in ("solved", "no solution"): break
+                results[key] = best
+                if verbose: print(format_result(key, best))
+    return results
+
+def format_result(key: str, result: Dict[str, Any]) -> str:
+    if result["status"] not in ("solved", "no solution"):
+        return f"{key:<36}{result['status']:<12}{result.get('error', '')}"
+    cost = "-" if result["cost"] is None else f"{result['cost']:.4g}"
+    return f"{key:<36}{result['status']:<12}{result['time']:>10.4f}s{result['expansions']:>10}{result['peak_rss_kb']:>10}KB{cost:>10}"
+
+# Compares the results with the latest earlier measurement of each case and returns the regressions found
+def find_regressions(history: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]], threshold: float, min_time: float) -> List[str]:
+    regressions = []
+    for key, result in results.items():
+        previous = next((run["results"][key] for run in reversed(history) if key in run["results"]), None)
+        if previous is None: continue
+        solved_before = previous["status"] in ("solved", "no solution")
+        solved_now = result["status"] in ("solved", "no solution")
+        if not solved_now:
+            if solved_before:
+                regressions.append(f"{key}: {result['status']} (was {previous['status']})")
+            continue
+        if not solved_before: continue
+        if previous["cost"] is not None and (result["cost"] is None or result["cost"] > previous["cost"] + 1e-9):
+            regressions.append(f"{key}: cost {result['cost']} (was {previous['cost']})")
+        for metric, absolute in (("time", min_time), ("expansions", 0), ("peak_rss_kb", 0)):
+            before, after = previous[metric], result[metric]
+            if after > before * (1 + threshold / 100) and after - before > absolute:
+                change = 100 * (after - before) / before if before else float('inf')
+                regressions.append(f"{key}: {metric} {after:.4g} (was {before:.4g}, +{change:.1f}%)")
+    return regressions
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+# Returns the current git commit (if the suite runs in a git repository)
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def main(args: argparse.Namespace) -> int:
+    print(f"{'case':<36}{'status':<12}{'time':>11}{'expanded':>10}{'peak RSS':>12}{'cost':>10}")
+    results = run_suite(args.domains, args.algorithms, args.timeout, args.repeat)
+    history = load_history(args.history)
+    regressions = find_regressions(history, results, args.threshold, args.min_time)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold}%:")
+        for regression in regressions:
+            print("  " + regression)
+    elif history:
+        print(f"\nNo regressions beyond {args.threshold}%")
+    if not args.no_save:
+        history.append({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": current_commit(), "results": results})
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"Results appended to {args.history}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the search algorithms on every level, graph and parking lot")
+    parser.add_argument("--domains", "-d", nargs="+", default=list(DOMAINS), choices=list(DOMAINS), help="the domains to run")
+    parser.add_argument("--algorithms", "-a", nargs="+", default=list(ALGORITHMS), choices=ALGORITHMS, help="the algorithms to run")
+    parser.add_argument("--timeout", "-t", type=float, default=60, help="the time limit of each run in seconds")
+    parser.add_argument("--repeat", "-r", type=int, default=1, help="the number of runs of each case (the best time is kept)")
+    parser.add_argument("--history", default="benchmark_history.json", help="the JSON file holding the results of the earlier runs")
+    parser.add_argument("--threshold", type=float, default=10, help="the percent of growth that is flagged as a regression")
+    parser.add_argument("--min-time", type=float, default=0.05, help="the smallest time growth (in seconds) that is flagged as a regression")
+    parser.add_argument("--no-save", action="store_true", default=False, help="do not append the results to the history")
+    exit(main(parser.parse_args()))
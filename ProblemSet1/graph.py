@@ -1,4 +1,4 @@
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional
 from dataclasses import dataclass
 import json
 
@@ -20,12 +20,18 @@ class GraphNode:
         return self.name
 
 # This is the implementation of the graph routing problem
+# The reverse adjacency maps each node to the nodes that have an edge into it (used by the backward searches)
+# If it is not given, it is computed from the adjacency
 class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
-    def __init__(self, start: GraphNode, goal: GraphNode, adjacency: Dict[GraphNode, List[GraphNode]]) -> None:
+    def __init__(self, start: GraphNode, goal: GraphNode, adjacency: Dict[GraphNode, List[GraphNode]],
+                 reverse_adjacency: Optional[Dict[GraphNode, List[GraphNode]]] = None) -> None:
         super().__init__()
         self.start = start
         self.goal = goal
         self.adjacency = adjacency
+        if reverse_adjacency is None:
+            reverse_adjacency = reverse_adjacency_of(adjacency)
+        self.reverse_adjacency = reverse_adjacency
     
     def get_initial_state(self) -> GraphNode:
         return self.start
@@ -39,6 +45,11 @@ class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
     def get_actions(self, state: GraphNode) -> Iterable[GraphNode]:
         return self.adjacency.get(state, [])
     
+    # The predecessors of a node are the nodes from which it can be reached by a single edge
+    # Unlike get_actions, the calls are not recorded since they are only used by the backward searches
+    def get_predecessors(self, state: GraphNode) -> Iterable[GraphNode]:
+        return self.reverse_adjacency.get(state, [])
+
     # The next state and the action are the exact same thing for this problem
     def get_successor(self, state: GraphNode, action: GraphNode) -> GraphNode:
         return action
@@ -60,7 +71,16 @@ class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
             adjacency[node] = adjacent
         start = node_dict[problem_def.get("start", "")]
         goal = node_dict[problem_def.get("goal", "")]
-        return GraphRoutingProblem(start, goal, adjacency)
+        return GraphRoutingProblem(start, goal, adjacency, reverse_adjacency_of(adjacency))
+
+# Builds the reverse adjacency of a graph (the predecessors of every node)
+# The predecessors of each node are kept in the order of their appearance in the adjacency
+def reverse_adjacency_of(adjacency: Dict[GraphNode, List[GraphNode]]) -> Dict[GraphNode, List[GraphNode]]:
+    reverse_adjacency: Dict[GraphNode, List[GraphNode]] = {node: [] for node in adjacency}
+    for node, adjacent in adjacency.items():
+        for neighbor in adjacent:
+            reverse_adjacency.setdefault(neighbor, []).append(node)
+    return reverse_adjacency
 
 def graphrouting_heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
     return euclidean_distance(state.position, problem.goal.position)
\ No newline at end of file
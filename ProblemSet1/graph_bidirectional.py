@@ -0,0 +1,166 @@
+from typing import Dict, List, Optional
+from dataclasses import dataclass
+import argparse, itertools, time
+
+from graph import GraphNode, GraphRoutingProblem, graphrouting_heuristic
+from indexed_heap import IndexedHeap
+from problem import HeuristicFunction, Solution
+from helpers.utils import fetch_recorded_calls
+
+# This file contains a bidirectional search for the graph routing problem
+# A forward search grows from the start and a backward search grows from the goal over the reverse adjacency,
+# so each of them only explores a ball of about half the radius of a single forward search.
+#
+# To make it bidirectional A*, both searches use the average potential (front-to-end):
+#   p(v) = (h_forward(v) - h_backward(v)) / 2
+# where h_forward estimates the distance from v to the goal and h_backward estimates the distance from the start to v.
+# The forward search uses the key d_forward(v) + p(v) and the backward search uses d_backward(v) - p(v).
+# Both searches then work on the same graph with the reduced edge costs "cost(u, v) - p(u) + p(v)",
+# which are never negative if both heuristics are consistent, so the stopping rule of bidirectional Dijkstra holds:
+#   Once the sum of the minimum keys of the 2 frontiers reaches the cost of the best path found so far, this path is optimal.
+# Without a heuristic, the potentials are zero and it is bidirectional Dijkstra.
+#
+# The backward heuristic is the same heuristic function applied to the reversed problem (from the goal back to the start)
+
+@dataclass
+class BidirectionalResult:
+    path: Solution                  # The actions from the start to the goal (None if there is no path)
+    cost: float                     # The path cost (infinity if there is no path)
+    meeting_node: Optional[GraphNode]
+    forward_expansions: int
+    backward_expansions: int
+
+    @property
+    def expansions(self) -> int:
+        return self.forward_expansions + self.backward_expansions
+
+# Returns the problem that searches from the goal to the start over the reversed edges
+# The edge costs in this problem are symmetric (euclidean distances) so they are not affected by the reversal
+# The reversed problem is stored in problem.cache() (one per initial state), so the heuristic caches of the reversed problem
+# (e.g. the landmark tables) are computed once instead of on every query
+def reversed_problem(problem: GraphRoutingProblem, initial_state: GraphNode) -> GraphRoutingProblem:
+    cache = problem.cache()
+    key = ("reversed_problem", initial_state)
+    backward_problem = cache.get(key)
+    if backward_problem is None:
+        backward_problem = cache[key] = GraphRoutingProblem(problem.goal, initial_state, problem.reverse_adjacency, problem.adjacency)
+    return backward_problem
+
+def bidirectional_search(problem: GraphRoutingProblem, initial_state: GraphNode,
+                         heuristic: Optional[HeuristicFunction] = None) -> BidirectionalResult:
+    INF = float('inf')
+    goal = problem.goal
+    if initial_state == goal:
+        return BidirectionalResult([], 0, goal, 0, 0)
+    if heuristic is None:
+        potential = lambda _: 0
+    else:
+        backward_problem = reversed_problem(problem, initial_state)
+        potential = lambda node: (heuristic(problem, node) - heuristic(backward_problem, node)) / 2
+    potentials: Dict[GraphNode, float] = {}
+    def get_potential(node: GraphNode) -> float:
+        value = potentials.get(node)
+        if value is None:
+            value = potentials[node] = potential(node)
+        return value
+
+    # Each direction has its own distances, parents, frontier and set of expanded nodes
+    # The direction sign is +1 for the forward search and -1 for the backward search (the sign of the potential in the key)
+    counter = itertools.count()
+    distances = ({initial_state: 0}, {goal: 0})
+    parents = ({initial_state: None}, {goal: None})
+    frontiers = (IndexedHeap(), IndexedHeap())
+    expanded = (set(), set())
+    expansions = [0, 0]
+    frontiers[0].push(initial_state, (get_potential(initial_state), next(counter)))
+    frontiers[1].push(goal, (-get_potential(goal), next(counter)))
+
+    best_cost, meeting_node = INF, None
+    while frontiers[0] and frontiers[1]:
+        top_keys = (frontiers[0].peek()[1][0], frontiers[1].peek()[1][0])
+        # Stopping rule: no path through the unexpanded nodes can be cheaper than the best path
+        if top_keys[0] + top_keys[1] >= best_cost:
+            break
+        # Expand the direction with the smaller key so that both balls grow at the same rate
+        side = 0 if top_keys[0] <= top_keys[1] else 1
+        other = 1 - side
+        sign = 1 if side == 0 else -1
+        node, _, _ = frontiers[side].pop()
+        expanded[side].add(node)
+        expansions[side] += 1
+        node_distance = distances[side][node]
+        neighbors = problem.get_actions(node) if side == 0 else problem.get_predecessors(node)
+        for neighbor in neighbors:
+            if neighbor in expanded[side]:
+                continue
+            # The cost is always taken along the edge direction (from the predecessor to the node in the backward search)
+            edge_cost = problem.get_cost(node, neighbor) if side == 0 else problem.get_cost(neighbor, node)
+            distance = node_distance + edge_cost
+            if distance >= distances[side].get(neighbor, INF):
+                continue
+            distances[side][neighbor] = distance
+            parents[side][neighbor] = node
+            frontiers[side].push(neighbor, (distance + sign * get_potential(neighbor), next(counter)))
+            # If the other search already reached the neighbor, the 2 halves form a path
+            other_distance = distances[other].get(neighbor)
+            if other_distance is not None and distance + other_distance < best_cost:
+                best_cost, meeting_node = distance + other_distance, neighbor
+
+    if meeting_node is None:
+        return BidirectionalResult(None, INF, None, *expansions)
+    # The forward half is rebuilt from the meeting node back to the start then reversed
+    path: List[GraphNode] = []
+    node = meeting_node
+    while parents[0][node] is not None:
+        path.append(node)
+        node = parents[0][node]
+    path.reverse()
+    # The backward half already goes from the meeting node to the goal
+    node = parents[1][meeting_node]
+    while node is not None:
+        path.append(node)
+        node = parents[1][node]
+    return BidirectionalResult(path, best_cost, meeting_node, *expansions)
+
+# These wrap the bidirectional search to have the same signatures as the search functions in search.py
+
+def BidirectionalDijkstraSearch(problem: GraphRoutingProblem, initial_state: GraphNode) -> Solution:
+    return bidirectional_search(problem, initial_state).path
+
+def BidirectionalAStarSearch(problem: GraphRoutingProblem, initial_state: GraphNode, heuristic: HeuristicFunction) -> Solution:
+    return bidirectional_search(problem, initial_state, heuristic).path
+
+# Compares the bidirectional searches with UCS and A* on a graph file
+def main(args: argparse.Namespace):
+    from search import UniformCostSearch, AStarSearch
+    problem = GraphRoutingProblem.from_file(args.graph)
+    start = problem.get_initial_state()
+
+    def path_cost(path: Solution) -> float:
+        if path is None: return float('inf')
+        cost, state = 0, start
+        for action in path:
+            cost += problem.get_cost(state, action)
+            state = problem.get_successor(state, action)
+        return cost
+
+    for name, search in (("UCS", lambda: UniformCostSearch(problem, start)),
+                         ("A*", lambda: AStarSearch(problem, start, graphrouting_heuristic))):
+        fetch_recorded_calls(GraphRoutingProblem.get_actions)
+        begin = time.time()
+        path = search()
+        elapsed = time.time() - begin
+        expansions = len(fetch_recorded_calls(GraphRoutingProblem.get_actions))
+        print(f"{name:<16} cost: {path_cost(path):.4f} expansions: {expansions} time: {elapsed:.4f}s")
+    for name, heuristic in (("Bidirectional", None), ("Bidirectional A*", graphrouting_heuristic)):
+        begin = time.time()
+        result = bidirectional_search(problem, start, heuristic)
+        elapsed = time.time() - begin
+        fetch_recorded_calls(GraphRoutingProblem.get_actions)
+        print(f"{name:<16} cost: {result.cost:.4f} expansions: {result.expansions} "
+              f"(forward: {result.forward_expansions}, backward: {result.backward_expansions}) time: {elapsed:.4f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the bidirectional searches with UCS and A* on a graph routing problem")
+    parser.add_argument("graph", help="path to the graph file")
+    main(parser.parse_args())
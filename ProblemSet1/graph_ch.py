@@ -0,0 +1,343 @@
+from typing import Dict, List, Optional, Tuple
+import argparse, hashlib, heapq, json, os, random, time
+
+from graph import GraphNode, GraphRoutingProblem
+from problem import Solution
+
+# This file contains a contraction hierarchy (CH) for answering many shortest path queries on the same graph
+#
+# Preprocessing: the nodes are contracted one by one in order of importance (least important first).
+# Contracting a node v removes it from the graph, and for every pair of remaining neighbors u -> v -> w,
+# a shortcut edge u -> w (with the cost of both edges) is added unless a "witness" path from u to w
+# that avoids v is at most as expensive. So the distances between the remaining nodes never change.
+# The rank of a node is its position in the contraction order.
+#
+# Query: every shortest path can be found as an "up then down" path in the graph with all the shortcuts:
+# a bidirectional Dijkstra where the forward search only follows edges to higher ranked nodes and
+# the backward search only follows (reversed) edges from higher ranked nodes. Both searches only visit
+# a small part of the graph, so a query is orders of magnitude cheaper than a full Dijkstra.
+# Finally the shortcuts on the found path are unpacked into the original edges (each shortcut remembers its middle node).
+# NOTE: The cost returned by the query is summed over the hierarchy edges so it can differ from the UCS cost in the last bits.
+#       Summing get_cost along the unpacked path (as the search agents do) gives the exact same cost as UCS.
+# Grid-like graphs have little hierarchy (all the roads are equally important) so they are the worst case for this method.
+#
+# The hierarchy is saved in a JSON sidecar next to the graph file (e.g. graph1.json -> graph1.ch.json)
+# together with a hash of the graph file so that a stale sidecar is rebuilt.
+
+SIDECAR_VERSION = 1
+
+# The maximum number of nodes settled by a witness search (a smaller limit is faster but adds more unneeded shortcuts)
+# The priorities only estimate the number of shortcuts so they use a smaller limit than the actual contraction
+WITNESS_SETTLE_LIMIT = 64
+PRIORITY_SETTLE_LIMIT = 16
+
+# An edge in the hierarchy is (other node id, cost, middle node id) where the middle is -1 for the original edges
+Edge = Tuple[int, float, int]
+
+class ContractionHierarchy:
+    def __init__(self, names: List[str], ranks: List[int], upward: List[List[Edge]], downward: List[List[Edge]]) -> None:
+        self.names = names
+        self.ids: Dict[str, int] = {name: index for index, name in enumerate(names)}
+        self.ranks = ranks
+        # upward[u] holds the edges u -> w where w has a higher rank than u
+        # downward[w] holds the edges u -> w where u has a higher rank than w (stored at w for the backward search)
+        self.upward = upward
+        self.downward = downward
+        # The middle node of every shortcut edge u -> w (used to unpack the paths)
+        self.middles: Dict[Tuple[int, int], int] = {}
+        for u, edges in enumerate(upward):
+            for w, _, middle in edges:
+                if middle >= 0: self.middles[(u, w)] = middle
+        for w, edges in enumerate(downward):
+            for u, _, middle in edges:
+                if middle >= 0: self.middles[(u, w)] = middle
+
+    # Builds the hierarchy for the graph of the given problem
+    @staticmethod
+    def build(problem: GraphRoutingProblem) -> 'ContractionHierarchy':
+        nodes = list(problem.adjacency)
+        ids = {node: index for index, node in enumerate(nodes)}
+        for node in problem.reverse_adjacency:
+            if node not in ids:
+                ids[node] = len(nodes)
+                nodes.append(node)
+        count = len(nodes)
+        # outgoing[u][w] and incoming[w][u] hold the cost and the middle node of the edge u -> w in the remaining graph
+        outgoing: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(count)]
+        incoming: List[Dict[int, Tuple[float, int]]] = [{} for _ in range(count)]
+        for node, adjacent in problem.adjacency.items():
+            u = ids[node]
+            for neighbor in adjacent:
+                w = ids[neighbor]
+                if u == w: continue
+                cost = problem.get_cost(node, neighbor)
+                if cost < outgoing[u].get(w, (float('inf'),))[0]:
+                    outgoing[u][w] = incoming[w][u] = (cost, -1)
+        contracted = [False] * count
+        # The number of contracted neighbors of each node, it is added to the priority to spread the contraction
+        # uniformly over the graph which keeps the hierarchy shallow
+        contracted_neighbors = [0] * count
+
+        # Returns the shortcuts (u, w, cost) needed to contract v
+        def find_shortcuts(v: int, settle_limit: int = WITNESS_SETTLE_LIMIT) -> List[Tuple[int, int, float]]:
+            shortcuts = []
+            targets = outgoing[v]
+            if not targets: return shortcuts
+            max_outgoing = max(cost for cost, _ in targets.values())
+            for u, (cost_in, _) in incoming[v].items():
+                witness = _witness_search(outgoing, u, v, cost_in + max_outgoing, targets, settle_limit)
+                for w, (cost_out, _) in targets.items():
+                    if w == u: continue
+                    if witness.get(w, float('inf')) > cost_in + cost_out:
+                        shortcuts.append((u, w, cost_in + cost_out))
+            return shortcuts
+
+        def priority(v: int) -> int:
+            edge_difference = len(find_shortcuts(v, PRIORITY_SETTLE_LIMIT)) - len(outgoing[v]) - len(incoming[v])
+            return edge_difference + contracted_neighbors[v]
+
+        # The nodes are contracted in order of priority where the priorities are updated lazily:
+        # the priority of the popped node is recomputed and it is only contracted if it is still the minimum
+        queue = [(priority(v), v) for v in range(count)]
+        heapq.heapify(queue)
+        ranks = [0] * count
+        upward: List[List[Edge]] = [[] for _ in range(count)]
+        downward: List[List[Edge]] = [[] for _ in range(count)]
+        rank = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            if contracted[v]: continue
+            current = priority(v)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+            shortcuts = find_shortcuts(v)
+            # All the remaining neighbors will be contracted after v, so the remaining edges of v are its upward/downward edges
+            upward[v] = [(w, cost, middle) for w, (cost, middle) in outgoing[v].items()]
+            downward[v] = [(u, cost, middle) for u, (cost, middle) in incoming[v].items()]
+            neighbors = set(outgoing[v]) | set(incoming[v])
+            for w in outgoing[v]:
+                del incoming[w][v]
+            for u in incoming[v]:
+                del outgoing[u][v]
+            outgoing[v], incoming[v] = {}, {}
+            for u, w, cost in shortcuts:
+                if cost < outgoing[u].get(w, (float('inf'),))[0]:
+                    outgoing[u][w] = incoming[w][u] = (cost, v)
+            contracted[v] = True
+            ranks[v] = rank
+            rank += 1
+            # The priorities of the neighbors changed so they are updated right away
+            for neighbor in neighbors:
+                contracted_neighbors[neighbor] += 1
+                heapq.heappush(queue, (priority(neighbor), neighbor))
+        return ContractionHierarchy([node.name for node in nodes], ranks, upward, downward)
+
+    # Returns the cost and the list of nodes (starting with the start) of the shortest path from start to goal
+    # Returns (infinity, None) if there is no path
+    def query(self, start: str, goal: str) -> Tuple[float, Optional[List[str]]]:
+        INF = float('inf')
+        source, target = self.ids[start], self.ids[goal]
+        if source == target:
+            return 0, [start]
+        # Each direction has its own distances, parents (node -> (previous node, middle)) and frontier
+        distances = ({source: 0}, {target: 0})
+        parents = ({source: None}, {target: None})
+        frontiers = ([(0, source)], [(0, target)])
+        # The forward search follows the upward edges and the backward search follows the downward edges
+        graphs = (self.upward, self.downward)
+        best_cost, meeting_node = INF, -1
+        while True:
+            # A direction is done once its minimum distance is not less than the best cost
+            side = -1
+            for candidate in (0, 1):
+                frontier = frontiers[candidate]
+                if frontier and frontier[0][0] < best_cost and (side < 0 or frontier[0][0] < frontiers[side][0][0]):
+                    side = candidate
+            if side < 0: break
+            distance, node = heapq.heappop(frontiers[side])
+            side_distances = distances[side]
+            if distance > side_distances[node]: continue
+            other_distance = distances[1 - side].get(node)
+            if other_distance is not None and distance + other_distance < best_cost:
+                best_cost, meeting_node = distance + other_distance, node
+            # Stall-on-demand: if a higher ranked node already reached this node with a shorter path (via an edge going down),
+            # this node is not on a shortest up-path so there is no need to continue the search from it
+            if any(side_distances.get(higher, INF) + cost < distance for higher, cost, _ in graphs[1 - side][node]):
+                continue
+            side_parents, frontier = parents[side], frontiers[side]
+            for neighbor, cost, middle in graphs[side][node]:
+                new_distance = distance + cost
+                if new_distance < side_distances.get(neighbor, INF):
+                    side_distances[neighbor] = new_distance
+                    side_parents[neighbor] = (node, middle)
+                    heapq.heappush(frontier, (new_distance, neighbor))
+        if meeting_node < 0:
+            return INF, None
+        # Collect the hierarchy edges of the path (forward half reversed, then the backward half)
+        edges = []
+        node = meeting_node
+        while parents[0][node] is not None:
+            previous, middle = parents[0][node]
+            edges.append((previous, node, middle))
+            node = previous
+        edges.reverse()
+        node = meeting_node
+        while parents[1][node] is not None:
+            next_node, middle = parents[1][node]
+            edges.append((node, next_node, middle))
+            node = next_node
+        path = [source]
+        for u, w, middle in edges:
+            path.extend(self._unpack(u, w, middle))
+        return best_cost, [self.names[node] for node in path]
+
+    # Returns the original nodes of the edge u -> w (excluding u) by recursively replacing the shortcuts with their 2 halves
+    def _unpack(self, u: int, w: int, middle: int) -> List[int]:
+        nodes = []
+        stack = [(u, w, middle)]
+        while stack:
+            u, w, middle = stack.pop()
+            if middle < 0:
+                nodes.append(w)
+            else:
+                # The second half is pushed first so that the first half is unpacked first
+                stack.append((middle, w, self.middles.get((middle, w), -1)))
+                stack.append((u, middle, self.middles.get((u, middle), -1)))
+        return nodes
+
+    def to_json(self, graph_hash: str) -> Dict:
+        return {
+            "version": SIDECAR_VERSION,
+            "graph_hash": graph_hash,
+            "names": self.names,
+            "ranks": self.ranks,
+            "upward": self.upward,
+            "downward": self.downward,
+        }
+
+    @staticmethod
+    def from_json(data: Dict) -> 'ContractionHierarchy':
+        to_edges = lambda edges: [[(node, cost, middle) for node, cost, middle in node_edges] for node_edges in edges]
+        return ContractionHierarchy(data["names"], data["ranks"], to_edges(data["upward"]), to_edges(data["downward"]))
+
+# Returns the path of the sidecar file of the given graph file
+def sidecar_path(graph_path: str) -> str:
+    return os.path.splitext(graph_path)[0] + ".ch.json"
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+# Loads the hierarchy of the graph file from its sidecar, or builds it (and saves the sidecar) if it is missing or stale
+def load_hierarchy(graph_path: str, problem: Optional[GraphRoutingProblem] = None, rebuild: bool = False) -> ContractionHierarchy:
+    graph_hash = file_hash(graph_path)
+    path = sidecar_path(graph_path)
+    if not rebuild and os.path.exists(path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") == SIDECAR_VERSION and data.get("graph_hash") == graph_hash:
+            return ContractionHierarchy.from_json(data)
+    if problem is None:
+        problem = GraphRoutingProblem.from_file(graph_path)
+    hierarchy = ContractionHierarchy.build(problem)
+    # Write to a temporary file first so that a partially written sidecar is never loaded
+    temporary_path = path + f".{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(hierarchy.to_json(graph_hash), f)
+    os.replace(temporary_path, path)
+    return hierarchy
+
+# Runs a bounded Dijkstra from "source" over the remaining graph while ignoring the node "excluded"
+# It stops once all the targets are settled, the distance exceeds "limit" or "settle_limit" nodes are settled
+def _witness_search(outgoing: List[Dict[int, Tuple[float, int]]], source: int, excluded: int, limit: float,
+                    targets, settle_limit: int) -> Dict[int, float]:
+    distances = {source: 0}
+    frontier = [(0, source)]
+    settled = 0
+    remaining = len(targets)
+    while frontier and settled < settle_limit and remaining > 0:
+        distance, node = heapq.heappop(frontier)
+        if distance > distances[node]: continue
+        if distance > limit: break
+        settled += 1
+        if node in targets: remaining -= 1
+        for neighbor, (cost, _) in outgoing[node].items():
+            if neighbor == excluded: continue
+            new_distance = distance + cost
+            if new_distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_distance
+                heapq.heappush(frontier, (new_distance, neighbor))
+    return distances
+
+# This has the same signature as the search functions in search.py (except for the optional graph path)
+# The hierarchy is obtained once per problem (on the first call) and stored in problem.cache():
+# it is loaded from the sidecar of the graph file if "graph_path" is given (see load_hierarchy), otherwise it is built
+# The map from the node names to the nodes (to convert the path back into nodes) is stored with it,
+# so a query only costs the hierarchy query and the length of the path (not the size of the graph)
+def ContractionHierarchySearch(problem: GraphRoutingProblem, initial_state: GraphNode, graph_path: Optional[str] = None) -> Solution:
+    cache = problem.cache()
+    hierarchy = cache.get("contraction_hierarchy")
+    if hierarchy is None:
+        hierarchy = load_hierarchy(graph_path, problem) if graph_path is not None else ContractionHierarchy.build(problem)
+        cache["contraction_hierarchy"] = hierarchy
+        cache["contraction_hierarchy_nodes"] = {node.name: node for node in problem.adjacency}
+    _, path = hierarchy.query(initial_state.name, problem.goal.name)
+    if path is None:
+        return None
+    nodes = cache["contraction_hierarchy_nodes"]
+    return [nodes[name] for name in path[1:]]
+
+# Returns a search function using the hierarchy saved in the sidecar of the given graph file
+def make_ch_search(graph_path: str):
+    return lambda problem, initial_state: ContractionHierarchySearch(problem, initial_state, graph_path)
+
+# Builds (or loads) the hierarchy of a graph file then compares random queries with UniformCostSearch
+# It also measures ContractionHierarchySearch (the query and the conversion of the path into nodes) from random starts to the goal
+def main(args: argparse.Namespace):
+    from search import UniformCostSearch
+    problem = GraphRoutingProblem.from_file(args.graph)
+    begin = time.time()
+    hierarchy = load_hierarchy(args.graph, problem, args.rebuild)
+    print(f"Hierarchy ready in {time.time() - begin:.3f}s ({sum(map(len, hierarchy.upward)) + sum(map(len, hierarchy.downward))} edges)")
+    nodes = {node.name: node for node in problem.adjacency}
+    names = list(nodes)
+    rng = random.Random(args.seed)
+    query_time, search_time, mismatches = 0, 0, 0
+    for _ in range(args.queries):
+        start, goal = rng.choice(names), rng.choice(names)
+        begin = time.time()
+        _, path = hierarchy.query(start, goal)
+        query_time += time.time() - begin
+        cost = None if path is None else sum(problem.get_cost(nodes[u], nodes[w]) for u, w in zip(path, path[1:]))
+        query_problem = GraphRoutingProblem(nodes[start], nodes[goal], problem.adjacency, problem.reverse_adjacency)
+        begin = time.time()
+        solution = UniformCostSearch(query_problem, nodes[start])
+        search_time += time.time() - begin
+        expected = None
+        if solution is not None:
+            expected, state = 0, nodes[start]
+            for action in solution:
+                expected += problem.get_cost(state, action)
+                state = action
+        if cost != expected:
+            mismatches += 1
+            print(f"Mismatch from {start} to {goal}: {cost} != {expected}")
+    print(f"{args.queries} queries: CH {1000 * query_time / max(args.queries, 1):.3f}ms/query, "
+          f"UCS {1000 * search_time / max(args.queries, 1):.3f}ms/query, {mismatches} mismatches")
+    # The first call stores the hierarchy in the cache of the problem, so it is not measured
+    ContractionHierarchySearch(problem, problem.start, args.graph)
+    starts = [nodes[rng.choice(names)] for _ in range(args.queries)]
+    begin = time.time()
+    for start in starts:
+        ContractionHierarchySearch(problem, start, args.graph)
+    print(f"{args.queries} searches to the goal: ContractionHierarchySearch {1000 * (time.time() - begin) / max(args.queries, 1):.3f}ms/search "
+          f"({len(names)} nodes)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the contraction hierarchy of a graph and compare its queries with UCS")
+    parser.add_argument("graph", help="path to the graph file")
+    parser.add_argument("--queries", "-q", type=int, default=100, help="the number of random queries to compare")
+    parser.add_argument("--seed", "-s", type=int, default=0, help="the random seed of the queries")
+    parser.add_argument("--rebuild", "-r", action="store_true", default=False, help="rebuild the sidecar even if it is up to date")
+    main(parser.parse_args())
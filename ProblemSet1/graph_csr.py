@@ -0,0 +1,193 @@
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+import argparse, math, time, tracemalloc
+
+from graph import GraphNode, GraphRoutingProblem, graphrouting_heuristic
+from mathutils import Point, euclidean_distance
+from problem import HeuristicFunction, Problem, Solution
+from helpers.utils import track_call_count
+
+# This file contains a compact (compressed sparse row) backend for the graph routing problem
+# In GraphRoutingProblem, every node is a GraphNode (a dataclass holding a name and a Point) and the graph is a dictionary of lists,
+# so each expansion hashes dataclasses and each get_cost allocates Points to compute a euclidean distance.
+# In the CSR graph, the nodes are integer ids (their order in the adjacency) and the edges are stored in flat arrays:
+#   offsets[i] .. offsets[i+1] -> the range of the edges that leave node i
+#   targets[e]                 -> the node that edge e enters
+#   weights[e]                 -> the cost of edge e (precomputed with the same euclidean_distance so the costs are identical)
+# The edges of each node keep the order of the adjacency lists, so the searches expand the nodes in the same order.
+# In CSRGraphRoutingProblem, the states are node ids and the actions are edge indices.
+# The GraphNode API sits on top for display: node(id) rebuilds the GraphNode of an id.
+
+# The arrays can be any sequences that support indexing (e.g. arrays or memoryviews of a memory-mapped file, see graph_loader.py)
+class CSRGraph:
+    __slots__ = ("names", "_ids", "xs", "ys", "offsets", "targets", "weights")
+
+    def __init__(self, names: Sequence[str], xs: Sequence[float], ys: Sequence[float],
+                 offsets: Sequence[int], targets: Sequence[int], weights: Sequence[float]) -> None:
+        self.names = names
+        self._ids: Optional[Dict[str, int]] = None
+        self.xs, self.ys = xs, ys
+        self.offsets, self.targets, self.weights = offsets, targets, weights
+
+    # The map from the node names to the ids is only built when it is first needed
+    # since it is the only part of the graph that cannot be memory-mapped
+    @property
+    def ids(self) -> Dict[str, int]:
+        if self._ids is None:
+            self._ids = {name: index for index, name in enumerate(self.names)}
+        return self._ids
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    # Builds the CSR graph from the adjacency of a graph routing problem
+    @staticmethod
+    def from_adjacency(adjacency: Dict[GraphNode, List[GraphNode]]) -> 'CSRGraph':
+        nodes = list(adjacency)
+        ids = {node: index for index, node in enumerate(nodes)}
+        for adjacent in adjacency.values():
+            for node in adjacent:
+                if node not in ids:
+                    ids[node] = len(nodes)
+                    nodes.append(node)
+        offsets, targets, weights = array('q', [0]), array('q'), array('d')
+        for node in nodes:
+            for neighbor in adjacency.get(node, []):
+                targets.append(ids[neighbor])
+                weights.append(euclidean_distance(node.position, neighbor.position))
+            offsets.append(len(targets))
+        xs = array('d', (node.position.x for node in nodes))
+        ys = array('d', (node.position.y for node in nodes))
+        return CSRGraph([node.name for node in nodes], xs, ys, offsets, targets, weights)
+
+    # Returns the GraphNode of the given id
+    def node(self, index: int) -> GraphNode:
+        x, y = self.xs[index], self.ys[index]
+        # The positions are stored as floats, so the integer coordinates are restored to rebuild an equal GraphNode
+        return GraphNode(self.names[index], Point(int(x) if x.is_integer() else x, int(y) if y.is_integer() else y))
+
+class CSRGraphRoutingProblem(Problem[int, int]):
+    def __init__(self, graph: CSRGraph, start: int, goal: int) -> None:
+        super().__init__()
+        self.graph = graph
+        self.start = start
+        self.goal = goal
+        # Bind the arrays to the problem to avoid an attribute lookup on the graph in every call
+        self.offsets, self.targets, self.weights = graph.offsets, graph.targets, graph.weights
+
+    def get_initial_state(self) -> int:
+        return self.start
+
+    def is_goal(self, state: int) -> bool:
+        return state == self.goal
+
+    # The actions are the indices of the edges that leave the node
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: int) -> Iterable[int]:
+        return range(self.offsets[state], self.offsets[state + 1])
+
+    def get_successor(self, state: int, action: int) -> int:
+        return self.targets[action]
+
+    def get_cost(self, state: int, action: int) -> float:
+        return self.weights[action]
+
+    # Returns the GraphNode of the given state (for display)
+    def node(self, state: int) -> GraphNode:
+        return self.graph.node(state)
+
+    # Converts a solution (a list of edge indices) to the list of GraphNodes used as actions by GraphRoutingProblem
+    def to_graph_solution(self, solution: Solution) -> Solution:
+        if solution is None:
+            return None
+        return [self.graph.node(self.targets[edge]) for edge in solution]
+
+    # Creates the CSR version of a graph routing problem that starts from the given node (or the problem's start)
+    @staticmethod
+    def from_problem(problem: GraphRoutingProblem, initial_state: Optional[GraphNode] = None) -> 'CSRGraphRoutingProblem':
+        graph = CSRGraph.from_adjacency(problem.adjacency)
+        start = problem.start if initial_state is None else initial_state
+        return CSRGraphRoutingProblem(graph, graph.ids[start.name], graph.ids[problem.goal.name])
+
+    # Reads the graph file with the streaming loader (see graph_loader.py)
+    # If "sidecar" is True, the graph is cached in a binary file next to the graph file and memory-mapped on later loads
+    @staticmethod
+    def from_file(path: str, sidecar: bool = False) -> 'CSRGraphRoutingProblem':
+        from graph_loader import load_csr
+        return load_csr(path, sidecar)
+
+# The euclidean heuristic computed directly from the coordinate arrays
+def csr_heuristic(problem: CSRGraphRoutingProblem, state: int) -> float:
+    xs, ys, goal = problem.graph.xs, problem.graph.ys, problem.goal
+    dx, dy = xs[state] - xs[goal], ys[state] - ys[goal]
+    return math.sqrt(dx * dx + dy * dy)
+
+# This wraps a search function (uninformed or informed) so that it searches the CSR version of a graph routing problem
+# and returns the solution as a list of GraphNodes for the wrapped problem
+# The CSR graph is built once per problem and stored in problem.cache()
+# The euclidean heuristic is replaced by csr_heuristic, and any other heuristic is called with the GraphNode of the state
+def csr_search(search_fn: Callable[..., Solution]) -> Callable[..., Solution]:
+    def search(problem: GraphRoutingProblem, initial_state: GraphNode, *args) -> Solution:
+        cache = problem.cache()
+        graph = cache.get("csr_graph")
+        if graph is None:
+            graph = cache["csr_graph"] = CSRGraph.from_adjacency(problem.adjacency)
+        csr_problem = CSRGraphRoutingProblem(graph, graph.ids[initial_state.name], graph.ids[problem.goal.name])
+        if args:
+            heuristic, *rest = args
+            if heuristic is graphrouting_heuristic:
+                heuristic = csr_heuristic
+            else:
+                heuristic = _graph_node_heuristic(problem, heuristic)
+            args = (heuristic, *rest)
+        return csr_problem.to_graph_solution(search_fn(csr_problem, csr_problem.get_initial_state(), *args))
+    return search
+
+def _graph_node_heuristic(problem: GraphRoutingProblem, heuristic: HeuristicFunction) -> HeuristicFunction:
+    return lambda csr_problem, state: heuristic(problem, csr_problem.node(state))
+
+# Compares the memory and the search time of the dictionary and the CSR representations on a graph file
+def main(args: argparse.Namespace):
+    from search import UniformCostSearch, AStarSearch
+    tracemalloc.start()
+    problem = GraphRoutingProblem.from_file(args.graph)
+    dictionary_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    csr_problem = CSRGraphRoutingProblem.from_problem(problem)
+    csr_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"Nodes: {len(csr_problem.graph)}, Edges: {csr_problem.graph.edge_count}")
+    print(f"Memory: dict {dictionary_memory / 2**20:.2f}MB, CSR {csr_memory / 2**20:.2f}MB "
+          f"(the CSR memory includes the names and the id map)")
+
+    def path_cost(path: Solution) -> float:
+        if path is None: return float('inf')
+        cost, state = 0, problem.start
+        for action in path:
+            cost += problem.get_cost(state, action)
+            state = action
+        return cost
+
+    for name, search, heuristic in (("UCS", UniformCostSearch, None), ("A*", AStarSearch, graphrouting_heuristic)):
+        extra = () if heuristic is None else (heuristic,)
+        begin = time.time()
+        path = search(problem, problem.start, *extra)
+        dictionary_time = time.time() - begin
+        csr_extra = () if heuristic is None else (csr_heuristic,)
+        begin = time.time()
+        csr_path = csr_problem.to_graph_solution(search(csr_problem, csr_problem.start, *csr_extra))
+        csr_time = time.time() - begin
+        same = "same path" if path == csr_path else "DIFFERENT PATH"
+        print(f"{name:<4} dict {dictionary_time:.4f}s, CSR {csr_time:.4f}s (x{dictionary_time / max(csr_time, 1e-9):.1f}), "
+              f"cost {path_cost(path):.4f} / {path_cost(csr_path):.4f} ({same})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the dictionary and CSR graph representations")
+    parser.add_argument("graph", help="path to the graph file")
+    main(parser.parse_args())
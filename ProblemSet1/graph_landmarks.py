@@ -0,0 +1,192 @@
+from typing import Dict, List, Optional
+import argparse, heapq, random, time
+
+from graph import GraphNode, GraphRoutingProblem, graphrouting_heuristic
+from problem import HeuristicFunction
+from helpers.utils import fetch_recorded_calls
+
+# This file contains the landmark (ALT: A*, landmarks and triangle inequality) heuristic for the graph routing problem
+# A few nodes are selected as landmarks, and the exact distances from every node to every landmark and
+# from every landmark to every node are computed once (via Dijkstra using get_cost).
+# By the triangle inequality, for any landmark L, node v and goal t:
+#   d(v, t) >= d(v, L) - d(t, L)    and    d(v, t) >= d(L, t) - d(L, v)
+# so the maximum of these bounds over all the landmarks is an admissible and consistent heuristic.
+# Unlike the euclidean distance, it follows the actual roads so it stays tight when the edges zig-zag.
+#
+# Unreachable pairs have an infinite distance which is replaced by a finite value M that is larger than all the finite distances.
+# Replacing d by min(d, M) keeps the triangle inequality so the heuristic stays consistent everywhere (including the nodes that cannot
+# reach the goal, where it returns large finite values) and no infinite values reach the search.
+
+STRATEGIES = ("farthest", "avoid")
+
+# Runs Dijkstra from the source and returns the distances of all the reachable nodes
+# If backward is True, it follows the reverse adjacency so it returns the distances from all the nodes to the source
+# If "settled" is given, the nodes are appended to it in the order they are settled, where every node comes after its parent
+# (unlike the order of the distances, which can put a child before its parent when an edge has a zero cost)
+def shortest_distances(problem: GraphRoutingProblem, source: GraphNode, backward: bool = False,
+                       parents: Optional[Dict[GraphNode, GraphNode]] = None,
+                       settled: Optional[List[GraphNode]] = None) -> Dict[GraphNode, float]:
+    distances = {source: 0}
+    frontier = [(0, 0, source)]
+    counter = 1
+    done = set()
+    while frontier:
+        distance, _, node = heapq.heappop(frontier)
+        if node in done: continue
+        done.add(node)
+        if settled is not None: settled.append(node)
+        neighbors = problem.reverse_adjacency.get(node, []) if backward else problem.adjacency.get(node, [])
+        for neighbor in neighbors:
+            # The cost is always taken along the edge direction
+            cost = problem.get_cost(neighbor, node) if backward else problem.get_cost(node, neighbor)
+            new_distance = distance + cost
+            if new_distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_distance
+                if parents is not None: parents[neighbor] = node
+                heapq.heappush(frontier, (new_distance, counter, neighbor))
+                counter += 1
+    return distances
+
+class Landmarks:
+    # Selects "count" landmarks with the given strategy then computes their distance tables
+    #   "farthest": each landmark is the node farthest from the already selected ones
+    #   "avoid": each landmark is a leaf of the shortest path tree of a random root, in the subtree whose
+    #            current lower bounds are the worst (so the new landmark covers the regions that are still badly estimated)
+    def __init__(self, problem: GraphRoutingProblem, count: int = 8, strategy: str = "avoid", seed: int = 0) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown landmark selection strategy '{strategy}', expected one of {STRATEGIES}")
+        self.problem = problem
+        self.nodes: List[GraphNode] = list(dict.fromkeys(list(problem.adjacency) + list(problem.reverse_adjacency)))
+        self.landmarks: List[GraphNode] = []
+        # to_landmark[i][v] = d(v, L_i) and from_landmark[i][v] = d(L_i, v) (missing nodes cannot reach / be reached)
+        self.to_landmark: List[Dict[GraphNode, float]] = []
+        self.from_landmark: List[Dict[GraphNode, float]] = []
+        self.unreachable = 0
+        rng = random.Random(seed)
+        count = min(count, len(self.nodes))
+        while len(self.landmarks) < count:
+            if strategy == "farthest":
+                landmark = self._select_farthest(rng)
+            else:
+                landmark = self._select_avoid(rng)
+            if landmark is None: break
+            self._add(landmark)
+
+    def _add(self, landmark: GraphNode) -> None:
+        self.landmarks.append(landmark)
+        self.to_landmark.append(shortest_distances(self.problem, landmark, backward=True))
+        self.from_landmark.append(shortest_distances(self.problem, landmark))
+        # M must be larger than every finite distance in the tables
+        largest = max(max(table.values()) for table in (self.to_landmark[-1], self.from_landmark[-1]))
+        self.unreachable = max(self.unreachable, 2 * largest + 1)
+
+    # Returns the node that maximizes the minimum round trip distance to the selected landmarks
+    # (the unreachable nodes come first so that every component gets a landmark)
+    def _select_farthest(self, rng: random.Random) -> Optional[GraphNode]:
+        if not self.landmarks:
+            # Start from the node farthest from a random node (to avoid starting at the center of the graph)
+            distances = shortest_distances(self.problem, rng.choice(self.nodes))
+            return max(self.nodes, key=lambda node: distances.get(node, float('inf')))
+        INF = float('inf')
+        best, best_value = None, -1
+        for node in self.nodes:
+            if node in self.landmarks: continue
+            value = min(to_table.get(node, INF) + from_table.get(node, INF)
+                        for to_table, from_table in zip(self.to_landmark, self.from_landmark))
+            if value > best_value:
+                best, best_value = node, value
+        return best
+
+    # Selects a landmark via the "avoid" strategy (Goldberg and Harrelson)
+    def _select_avoid(self, rng: random.Random) -> Optional[GraphNode]:
+        candidates = [node for node in self.nodes if node not in self.landmarks]
+        if not candidates: return None
+        if not self.landmarks:
+            return self._select_farthest(rng)
+        root = rng.choice(candidates)
+        parents: Dict[GraphNode, GraphNode] = {}
+        order: List[GraphNode] = []
+        distances = shortest_distances(self.problem, root, parents=parents, settled=order)
+        # The weight of a node is the gap between its real distance from the root and the current lower bound
+        # The sizes are computed in the reverse settling order so the sizes of the children are known before their parent
+        children: Dict[GraphNode, List[GraphNode]] = {}
+        for node in order[1:]:
+            children.setdefault(parents[node], []).append(node)
+        landmarks = set(self.landmarks)
+        sizes: Dict[GraphNode, float] = {}
+        for node in reversed(order):
+            # The subtrees that contain a landmark are already covered so they are excluded (marked with -1)
+            if node in landmarks or any(sizes[child] < 0 for child in children.get(node, [])):
+                sizes[node] = -1
+                continue
+            gap = distances[node] - self.estimate(root, node)
+            sizes[node] = gap + sum(sizes[child] for child in children.get(node, []))
+        # Walk down from the root to a leaf, always choosing the child with the largest size
+        node = root
+        while True:
+            options = [child for child in children.get(node, []) if sizes[child] >= 0]
+            if not options: break
+            node = max(options, key=sizes.get)
+        return node if node not in landmarks else None
+
+    # Returns the landmark lower bound on the distance from source to target
+    def estimate(self, source: GraphNode, target: GraphNode) -> float:
+        M = self.unreachable
+        value = 0
+        for to_table, from_table in zip(self.to_landmark, self.from_landmark):
+            value = max(value,
+                        to_table.get(source, M) - to_table.get(target, M),
+                        from_table.get(target, M) - from_table.get(source, M))
+        return value
+
+# Creates a landmark heuristic with the given number of landmarks and selection strategy
+# The landmarks are selected on the first call for each problem and stored in problem.cache()
+# The distances between the goal and the landmarks are cached with them since the goal is fixed for each problem
+def make_landmark_heuristic(count: int = 8, strategy: str = "avoid", seed: int = 0) -> HeuristicFunction:
+    key = ("landmarks", count, strategy, seed)
+    def landmark_heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
+        cache = problem.cache()
+        entry = cache.get(key)
+        if entry is None:
+            landmarks = Landmarks(problem, count, strategy, seed)
+            M, goal = landmarks.unreachable, problem.goal
+            goal_bounds = [(to_table.get(goal, M), from_table.get(goal, M))
+                           for to_table, from_table in zip(landmarks.to_landmark, landmarks.from_landmark)]
+            entry = cache[key] = (landmarks, goal_bounds)
+        landmarks, goal_bounds = entry
+        M = landmarks.unreachable
+        value = 0
+        for (to_goal, from_goal), to_table, from_table in zip(goal_bounds, landmarks.to_landmark, landmarks.from_landmark):
+            value = max(value, to_table.get(state, M) - to_goal, from_goal - from_table.get(state, M))
+        return value
+    return landmark_heuristic
+
+# This heuristic uses 8 landmarks selected with the "avoid" strategy
+landmark_heuristic = make_landmark_heuristic()
+
+# Compares the landmark heuristic with the euclidean heuristic on a graph file
+def main(args: argparse.Namespace):
+    from search import AStarSearch
+    problem = GraphRoutingProblem.from_file(args.graph)
+    begin = time.time()
+    heuristic = make_landmark_heuristic(args.landmarks, args.strategy)
+    heuristic(problem, problem.get_initial_state())
+    print(f"Selected {args.landmarks} landmarks ({args.strategy}) in {time.time() - begin:.3f}s")
+    for name, function in (("Euclidean", graphrouting_heuristic), ("Landmarks", heuristic)):
+        fetch_recorded_calls(GraphRoutingProblem.get_actions)
+        begin = time.time()
+        path = AStarSearch(problem, problem.get_initial_state(), function)
+        elapsed = time.time() - begin
+        expansions = len(fetch_recorded_calls(GraphRoutingProblem.get_actions))
+        cost, state = 0, problem.get_initial_state()
+        for action in path or []:
+            cost += problem.get_cost(state, action)
+            state = action
+        print(f"{name:<10} cost: {cost if path is not None else float('inf'):.4f} expansions: {expansions} time: {elapsed:.4f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the landmark heuristic with the euclidean heuristic on a graph")
+    parser.add_argument("graph", help="path to the graph file")
+    parser.add_argument("--landmarks", "-l", type=int, default=8, help="the number of landmarks")
+    parser.add_argument("--strategy", "-s", default="avoid", choices=STRATEGIES, help="the landmark selection strategy")
+    main(parser.parse_args())
@@ -0,0 +1,254 @@
+from array import array
+from typing import Any, Dict, IO, Iterator, List, Optional, Sequence, Tuple
+import argparse, json, math, mmap, os, re, struct, time
+
+from graph_csr import CSRGraph, CSRGraphRoutingProblem
+
+# This file contains a streaming loader for big graph files and a binary sidecar cache for them
+#
+# json.load reads the whole file into a dictionary then GraphRoutingProblem.from_file creates a GraphNode for every node,
+# so the memory peaks at several copies of the graph and nothing can start before everything is materialized.
+# The streaming loader reads the file in chunks and decodes one node at a time (with json.JSONDecoder.raw_decode),
+# appending its position and edges directly into the flat arrays of a CSRGraph (see graph_csr.py).
+# The result is the same as building the CSR graph from GraphRoutingProblem.from_file
+# (the nodes keep their order in the file, the adjacent nodes are sorted and the edges to undefined nodes are dropped).
+#
+# The binary sidecar (e.g. graph.json -> graph.csr.bin) holds the raw arrays so later loads only memory-map it:
+# the arrays are memoryviews over the mapped file, so the operating system only reads the pages that a search touches.
+# It records the size and modification time of the graph file and it is rebuilt if they change.
+#
+# Sidecar layout (native byte order, every section is a multiple of 8 bytes):
+#   header: magic (8 bytes) then node count, edge count, start id, goal id, graph file size, graph file mtime (ns), byte order marker
+#   offsets (int64 x nodes+1), targets (int64 x edges), weights (float64 x edges), xs, ys (float64 x nodes),
+#   name offsets (int64 x nodes+1), names (utf-8 bytes)
+
+SIDECAR_MAGIC = b"CSRGRPH1"
+_HEADER = struct.Struct("=8s7q")
+_BYTE_ORDER_MARKER = 0x0102030405060708
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# A minimal incremental JSON reader that decodes the values of an object one at a time
+class _JSONStream:
+    def __init__(self, file: IO[str], chunk_size: int) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    # Reads the next chunk (dropping the consumed part of the buffer), returns False at the end of the file
+    def _fill(self) -> bool:
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    # Skips the whitespace and returns the next character (or an empty string at the end of the file)
+    def peek(self) -> str:
+        while True:
+            self.position = _WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' while reading the graph file")
+        self.position += 1
+
+    # Decodes the next value, reading more chunks if the value is cut at the end of the buffer
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self._fill()
+
+    # Iterates over the keys of the next object, the caller must read the value of each key before moving to the next one
+    def keys(self) -> Iterator[str]:
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self.position += 1
+            if separator == "}": return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' but found '{separator}' while reading the graph file")
+
+# Streams the nodes of a graph file as (name, position, adjacent names)
+# The other top-level fields (start, goal, figure, ...) are stored in "metadata" as they are read
+def stream_nodes(path: str, metadata: Dict[str, Any], chunk_size: int = 2**20) -> Iterator[Tuple[str, Sequence[float], List[str]]]:
+    with open(path, "r") as file:
+        stream = _JSONStream(file, chunk_size)
+        for key in stream.keys():
+            if key != "graph":
+                metadata[key] = stream.value()
+                continue
+            for name in stream.keys():
+                item = stream.value()
+                yield name, item.get("position", [0, 0]), item.get("adjacent", [])
+
+# Builds the CSR graph of a graph file with the streaming loader and returns it with the ids of the start and the goal
+def stream_csr(path: str, chunk_size: int = 2**20) -> Tuple[CSRGraph, int, int]:
+    # Every name gets a temporary id when it is first seen (as a node or as an adjacent node)
+    # since the edges can point to nodes that are defined later in the file
+    temporary_ids: Dict[str, int] = {}
+    defined = array('q')                # the temporary id of each defined node in the order of the file
+    xs, ys = array('d'), array('d')
+    edge_counts, edge_targets = array('q'), array('q')
+    metadata: Dict[str, Any] = {}
+    for name, position, adjacent in stream_nodes(path, metadata, chunk_size):
+        defined.append(temporary_ids.setdefault(name, len(temporary_ids)))
+        xs.append(position[0])
+        ys.append(position[1])
+        adjacent = sorted(adjacent)
+        for neighbor in adjacent:
+            edge_targets.append(temporary_ids.setdefault(neighbor, len(temporary_ids)))
+        edge_counts.append(len(adjacent))
+    # The final ids follow the order of the node definitions and the undefined names keep -1
+    final_ids = array('q', [-1]) * len(temporary_ids)
+    for index, temporary_id in enumerate(defined):
+        final_ids[temporary_id] = index
+    offsets, targets, weights = array('q', [0]), array('q'), array('d')
+    edge = 0
+    for source, count in enumerate(edge_counts):
+        x, y = xs[source], ys[source]
+        for temporary_id in edge_targets[edge:edge + count]:
+            target = final_ids[temporary_id]
+            if target < 0: continue
+            targets.append(target)
+            # The same computation as euclidean_distance so that the costs are identical
+            dx, dy = x - xs[target], y - ys[target]
+            weights.append(math.sqrt(dx * dx + dy * dy))
+        edge += count
+        offsets.append(len(targets))
+    names_by_temporary_id = list(temporary_ids)
+    names = [names_by_temporary_id[temporary_id] for temporary_id in defined]
+    start = final_ids[temporary_ids[metadata.get("start", "")]]
+    goal = final_ids[temporary_ids[metadata.get("goal", "")]]
+    return CSRGraph(names, xs, ys, offsets, targets, weights), start, goal
+
+# Returns the path of the sidecar of the given graph file
+def sidecar_path(graph_path: str) -> str:
+    return os.path.splitext(graph_path)[0] + ".csr.bin"
+
+def write_sidecar(path: str, graph: CSRGraph, start: int, goal: int, graph_stat: os.stat_result) -> None:
+    encoded = [name.encode("utf-8") for name in graph.names]
+    name_offsets = array('q', [0])
+    for name in encoded:
+        name_offsets.append(name_offsets[-1] + len(name))
+    header = _HEADER.pack(SIDECAR_MAGIC, len(graph), graph.edge_count, start, goal,
+                          graph_stat.st_size, graph_stat.st_mtime_ns, _BYTE_ORDER_MARKER)
+    # Write to a temporary file first so that a partially written sidecar is never loaded
+    temporary_path = path + f".{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(header)
+        for section in (graph.offsets, graph.targets, graph.weights, graph.xs, graph.ys, name_offsets):
+            f.write(bytes(section))
+        f.write(b"".join(encoded))
+    os.replace(temporary_path, path)
+
+# The names in the sidecar are decoded only when they are accessed
+class _MappedNames(Sequence[str]):
+    def __init__(self, offsets: Sequence[int], data: memoryview) -> None:
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self): raise IndexError("name index out of range")
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+# Memory-maps the sidecar and returns the graph with the ids of the start and the goal
+# Returns None if the sidecar is invalid, it does not match the graph file or it is too short for its sections (e.g. truncated)
+def read_sidecar(path: str, graph_stat: os.stat_result) -> Optional[Tuple[CSRGraph, int, int]]:
+    with open(path, "rb") as f:
+        # an empty file can not be memory-mapped
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            return None
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    magic, node_count, edge_count, start, goal, size, mtime, marker = _HEADER.unpack_from(view)
+    if magic != SIDECAR_MAGIC or marker != _BYTE_ORDER_MARKER or size != graph_stat.st_size or mtime != graph_stat.st_mtime_ns:
+        return None
+    position = _HEADER.size
+    sections = []
+    for count, fmt in ((node_count + 1, 'q'), (edge_count, 'q'), (edge_count, 'd'), (node_count, 'd'), (node_count, 'd'), (node_count + 1, 'q')):
+        end = position + 8 * count
+        if end > len(view):
+            return None
+        sections.append(view[position:end].cast(fmt))
+        position = end
+    offsets, targets, weights, xs, ys, name_offsets = sections
+    if name_offsets[-1] > len(view) - position:
+        return None
+    names = _MappedNames(name_offsets, view[position:])
+    return CSRGraph(names, xs, ys, offsets, targets, weights), start, goal
+
+# Loads a graph file as a CSR graph routing problem
+# If "sidecar" is True, the sidecar is memory-mapped if it is up to date, otherwise the file is streamed and the sidecar is written
+def load_csr(path: str, sidecar: bool = True, chunk_size: int = 2**20) -> CSRGraphRoutingProblem:
+    if sidecar:
+        graph_stat = os.stat(path)
+        cache_path = sidecar_path(path)
+        loaded = read_sidecar(cache_path, graph_stat) if os.path.exists(cache_path) else None
+        if loaded is None:
+            graph, start, goal = stream_csr(path, chunk_size)
+            write_sidecar(cache_path, graph, start, goal, graph_stat)
+            loaded = read_sidecar(cache_path, graph_stat)
+        return CSRGraphRoutingProblem(*loaded)
+    return CSRGraphRoutingProblem(*stream_csr(path, chunk_size))
+
+# Compares the load times of GraphRoutingProblem.from_file, the streaming loader and the sidecar on a graph file
+def main(args: argparse.Namespace):
+    from graph import GraphRoutingProblem
+    from graph_csr import csr_heuristic
+    from search import AStarSearch
+    if args.compare:
+        begin = time.time()
+        GraphRoutingProblem.from_file(args.graph)
+        print(f"GraphRoutingProblem.from_file: {time.time() - begin:.3f}s")
+    begin = time.time()
+    stream_csr(args.graph)
+    print(f"Streaming loader: {time.time() - begin:.3f}s")
+    cache_path = sidecar_path(args.graph)
+    if args.rebuild and os.path.exists(cache_path):
+        os.remove(cache_path)
+    begin = time.time()
+    load_csr(args.graph)
+    print(f"First load with sidecar (streams then writes it if needed): {time.time() - begin:.3f}s")
+    begin = time.time()
+    problem = load_csr(args.graph)
+    print(f"Memory-mapped load: {1000 * (time.time() - begin):.3f}ms ({len(problem.graph)} nodes, {problem.graph.edge_count} edges)")
+    begin = time.time()
+    solution = AStarSearch(problem, problem.get_initial_state(), csr_heuristic)
+    cost = sum(problem.get_cost(None, edge) for edge in solution) if solution is not None else float('inf')
+    print(f"A* on the memory-mapped graph: cost {cost:.4f} in {time.time() - begin:.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a graph file with the streaming loader and the binary sidecar")
+    parser.add_argument("graph", help="path to the graph file")
+    parser.add_argument("--rebuild", "-r", action="store_true", default=False, help="delete the sidecar before loading")
+    parser.add_argument("--compare", "-c", action="store_true", default=False, help="also time GraphRoutingProblem.from_file")
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+from typing import Tuple
+from problem import HeuristicFunction, Solution
+from sokoban import SokobanProblem, SokobanState
+from search_nodes import NodeArena
+from indexed_heap import IndexedHeap
+from helpers.utils import fetch_tracked_call_count
+import argparse, glob, heapq, time
+
+# This micro-benchmark compares the frontier of A* (and UCS which is A* with a zero heuristic) when implemented via:
+#   - "lazy": a raw heapq with lazy deletion where every push adds an entry (including duplicates of the same state)
+#   - "indexed": the IndexedHeap with decrease-key used by search.py
+# For each level, it reports the peak frontier size, the wall time, the number of expanded nodes and the path length.
+# Both versions should expand the same number of nodes and return the same path.
+
+# This heap counts the peak number of entries it holds
+class PeakTrackingHeap(IndexedHeap):
+    __slots__ = ("peak",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.peak = 0
+
+    def push(self, key, priority, value = None) -> bool:
+        changed = super().push(key, priority, value)
+        self.peak = max(self.peak, len(self))
+        return changed
+
+# This is the A* search with a lazy-deletion heapq frontier (how search.py implemented it before the indexed heap)
+def lazy_astar(problem: SokobanProblem, initial_state: SokobanState, heuristic: HeuristicFunction) -> Tuple[Solution, int]:
+    if problem.is_goal(initial_state):
+        return [], 0
+    nodes = NodeArena()
+    frontier = [(0, 0, initial_state, nodes.add_root())]
+    peak, counter = 1, 0
+    explored = set()
+    while frontier:
+        _, _, current, current_node = heapq.heappop(frontier)
+        if problem.is_goal(current):
+            return nodes.path(current_node), peak
+        if current in explored:
+            continue
+        explored.add(current)
+        for action in problem.get_actions(current):
+            next_state = problem.get_successor(current, action)
+            if next_state in explored:
+                continue
+            total_cost = nodes.cost(current_node) + problem.get_cost(current, action)
+            counter += 1
+            heapq.heappush(frontier, (total_cost + heuristic(problem, next_state), counter, next_state, nodes.add(current_node, action, total_cost)))
+        peak = max(peak, len(frontier))
+    return None, peak
+
+# This is the A* search of search.py but with a frontier that tracks its peak size
+def indexed_astar(problem: SokobanProblem, initial_state: SokobanState, heuristic: HeuristicFunction) -> Tuple[Solution, int]:
+    import search
+    original_heap = search.IndexedHeap
+    heaps = []
+    def create_heap():
+        heap = PeakTrackingHeap()
+        heaps.append(heap)
+        return heap
+    search.IndexedHeap = create_heap
+    try:
+        path = search.AStarSearch(problem, initial_state, heuristic)
+    finally:
+        search.IndexedHeap = original_heap
+    return path, max((heap.peak for heap in heaps), default=0)
+
+def get_heuristic(name: str) -> HeuristicFunction:
+    if name == "zero":
+        return lambda *_: 0
+    from sokoban_heuristic import weak_heuristic, strong_heuristic
+    return {"weak": weak_heuristic, "strong": strong_heuristic}[name]
+
+def main(args: argparse.Namespace):
+    print(f"{'level':<24}{'frontier':<10}{'peak size':>12}{'time (s)':>12}{'expanded':>12}{'path':>8}")
+    for level in sorted(glob.glob(args.levels)):
+        for name, search_fn in (("lazy", lazy_astar), ("indexed", indexed_astar)):
+            # Create a fresh problem for each run so that the heuristic cache does not favor the second run
+            problem = SokobanProblem.from_file(level)
+            heuristic = get_heuristic(args.heuristic)
+            fetch_tracked_call_count(SokobanProblem.get_actions)
+            start = time.time()
+            path, peak = search_fn(problem, problem.get_initial_state(), heuristic)
+            elapsed = time.time() - start
+            expanded = fetch_tracked_call_count(SokobanProblem.get_actions)
+            length = "-" if path is None else len(path)
+            print(f"{level:<24}{name:<10}{peak:>12}{elapsed:>12.3f}{expanded:>12}{length:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the lazy heapq frontier with the indexed heap frontier on Sokoban levels")
+    parser.add_argument("--levels", "-l", default="levels/*.txt", help="a glob pattern for the sokoban levels to run")
+    parser.add_argument("--heuristic", "-hf", default="strong", choices=["zero", "weak", "strong"],
+                        help="the heuristic used by A* (zero is equivalent to uniform cost search)")
+    main(parser.parse_args())
@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import functools, sys
+
+# This file contains the bounded caches used by CacheContainer (see CacheContainer.cache_region in helpers/utils.py)
+# A cache region is a named key-value store with an optional limit on its number of entries and/or its size in bytes.
+# When an insertion exceeds a limit, entries are evicted with one of the policies:
+#   "lru": evicts the least recently used entry (an OrderedDict moved to the end on every hit)
+#   "clock": the CLOCK approximation of LRU: every entry has a reference bit which is set on a hit and a hand sweeps over
+#            the entries clearing the bits, the first entry found with a cleared bit is evicted (a hit costs a single assignment)
+# The size of an entry in bytes is estimated by sys.getsizeof(key) + sys.getsizeof(value) (a shallow estimate),
+# a different estimate can be given with "size_fn".
+# Every region counts its hits, misses and evictions (see CacheStats).
+
+# The statistics of a cache region
+@dataclass
+class CacheStats:
+    name: str
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.hits} hits, {self.misses} misses ({100 * self.hit_rate:.1f}% hits), "
+                f"{self.evictions} evictions, {self.entries} entries, {self.bytes} bytes")
+
+# Returned by CacheRegion.get when the key is missing (None can be a cached value)
+MISSING = object()
+
+def entry_size(key: Any, value: Any) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+# The base class of the cache regions, the subclasses implement the storage and the eviction policy
+class CacheRegion:
+    def __init__(self, name: str, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 size_fn: Callable[[Any, Any], int] = entry_size) -> None:
+        if max_entries is not None and max_entries < 1:
+            raise ValueError(f"The cache region '{name}' must hold at least 1 entry, got max_entries={max_entries}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self.stats = CacheStats(name)
+        # The sizes are only computed if the region is limited in bytes
+        self._sizes: Dict[Hashable, int] = {}
+
+    # Returns the cached value of the key (or "default" if it is missing) and records a hit or a miss
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        value = self._lookup(key)
+        if value is MISSING:
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        return value
+
+    # Stores the value of the key then evicts entries until the region is within its limits
+    # A value larger than max_bytes is not stored
+    def put(self, key: Hashable, value: Any) -> None:
+        stats = self.stats
+        if self.max_bytes is not None:
+            size = self.size_fn(key, value)
+            if size > self.max_bytes: return
+            stats.bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+        if not self._store(key, value):
+            stats.entries += 1
+        while (self.max_entries is not None and stats.entries > self.max_entries) or \
+              (self.max_bytes is not None and stats.bytes > self.max_bytes):
+            evicted = self._evict()
+            stats.entries -= 1
+            stats.evictions += 1
+            if self.max_bytes is not None:
+                stats.bytes -= self._sizes.pop(evicted)
+
+    def clear(self) -> None:
+        self._clear()
+        self._sizes.clear()
+        self.stats.entries = 0
+        self.stats.bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key, touch=False) is not MISSING
+
+    def __len__(self) -> int:
+        return self.stats.entries
+
+    # Returns the value of the key or MISSING, and marks the entry as recently used if touch is True
+    def _lookup(self, key: Hashable, touch: bool = True) -> Any:
+        raise NotImplementedError()
+
+    # Stores the value and returns whether the key was already stored
+    def _store(self, key: Hashable, value: Any) -> bool:
+        raise NotImplementedError()
+
+    # Removes an entry chosen by the policy and returns its key
+    def _evict(self) -> Hashable:
+        raise NotImplementedError()
+
+    def _clear(self) -> None:
+        raise NotImplementedError()
+
+class LRURegion(CacheRegion):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._entries: OrderedDict = OrderedDict()
+
+    def _lookup(self, key: Hashable, touch: bool = True) -> Any:
+        value = self._entries.get(key, MISSING)
+        if touch and value is not MISSING:
+            self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any) -> bool:
+        stored = key in self._entries
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        return stored
+
+    def _evict(self) -> Hashable:
+        return self._entries.popitem(last=False)[0]
+
+    def _clear(self) -> None:
+        self._entries.clear()
+
+class ClockRegion(CacheRegion):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # The entries are stored in slots arranged in a ring, the slots of the evicted entries are reused
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Any] = []
+        self._values: List[Any] = []
+        self._referenced: List[bool] = []
+        self._free: List[int] = []
+        self._hand = 0
+
+    def _lookup(self, key: Hashable, touch: bool = True) -> Any:
+        slot = self._slots.get(key)
+        if slot is None: return MISSING
+        if touch: self._referenced[slot] = True
+        return self._values[slot]
+
+    def _store(self, key: Hashable, value: Any) -> bool:
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._values[slot] = value
+            self._referenced[slot] = True
+            return True
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot], self._values[slot], self._referenced[slot] = key, value, False
+        else:
+            slot = len(self._keys)
+            self._keys.append(key)
+            self._values.append(value)
+            self._referenced.append(False)
+        self._slots[key] = slot
+        return False
+
+    def _evict(self) -> Hashable:
+        keys, referenced, size = self._keys, self._referenced, len(self._keys)
+        hand = self._hand
+        while True:
+            key = keys[hand]
+            if key is not MISSING:
+                if not referenced[hand]: break
+                referenced[hand] = False
+            hand = (hand + 1) % size
+        del self._slots[key]
+        keys[hand], self._values[hand] = MISSING, None
+        self._free.append(hand)
+        self._hand = (hand + 1) % size
+        return key
+
+    def _clear(self) -> None:
+        self._slots.clear()
+        self._keys.clear()
+        self._values.clear()
+        self._referenced.clear()
+        self._free.clear()
+        self._hand = 0
+
+POLICIES = {"lru": LRURegion, "clock": ClockRegion}
+
+def create_region(name: str, policy: str = "lru", max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                  size_fn: Callable[[Any, Any], int] = entry_size) -> CacheRegion:
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown cache policy '{policy}', expected one of {list(POLICIES)}")
+    return POLICIES[policy](name, max_entries, max_bytes, size_fn)
+
+# Memoizes a heuristic (or any function called as fn(problem, state)) in a region of the problem's cache
+# Each problem instance has its own region (named after the function by default), so the cached values are released
+# with the problem and the states of different problems are never mixed.
+# It can be used as @memoize_heuristic or as @memoize_heuristic(policy="clock", max_entries=n, max_bytes=b, region="name")
+def memoize_heuristic(fn: Optional[Callable] = None, *, region: Optional[str] = None, policy: str = "lru",
+                      max_entries: Optional[int] = 2**16, max_bytes: Optional[int] = None) -> Callable:
+    if fn is None:
+        return lambda fn: memoize_heuristic(fn, region=region, policy=policy, max_entries=max_entries, max_bytes=max_bytes)
+    name = region or f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', repr(fn))}"
+    @functools.wraps(fn)
+    def memoized(problem, state) -> Any:
+        cache = problem.cache_region(name, policy, max_entries, max_bytes)
+        value = cache.get(state)
+        if value is MISSING:
+            value = fn(problem, state)
+            cache.put(state, value)
+        return value
+    memoized.region = name
+    return memoized
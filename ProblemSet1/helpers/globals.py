@@ -1,4 +1,8 @@
 from helpers import test_tools
 from graph import GraphRoutingProblem
 from sokoban import SokobanProblem
-from sokoban_heuristic import weak_heuristic
\ No newline at end of file
+from sokoban_heuristic import weak_heuristic
+from parking import ParkingProblem
+from transposition_table import TranspositionTable
+from graph_loader import load_csr
+from sokoban_push import SokobanPushProblem
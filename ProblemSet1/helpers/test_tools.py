@@ -1,12 +1,12 @@
-from typing import List, Optional, Set, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 from agents import HeuristicFunction
 from graph import GraphRoutingProblem, graphrouting_heuristic
 from sokoban import SokobanProblem, Direction
 from problem import A, S, Problem
 from .utils import Result, fetch_recorded_calls, fetch_tracked_call_count, load_function
 from .heuristic_checks import InconsistentHeuristicException, test_heuristic_consistency
-from functools import lru_cache
-import time
+from helpers.cache import memoize_heuristic
+import dataclasses, itertools, json, os, random, shutil, tempfile, time
 
 def run_parking_trajectory(
     problem: Problem[S, A],
@@ -119,7 +119,7 @@ def test_sokoban_heuristic(
     function_path: str, 
     problem: SokobanProblem) -> Tuple[float, int, str, float]:
     fetch_tracked_call_count(SokobanProblem.get_actions)
-    heuristic = lru_cache(2**16)(load_function("sokoban_heuristic.strong_heuristic"))
+    heuristic = memoize_heuristic(load_function("sokoban_heuristic.strong_heuristic"))
     original_get_successor = SokobanProblem.get_successor
     SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
     search_fn = load_function(function_path)
@@ -164,4 +164,366 @@ def compare_heuristic_for_sokoban(
         for i, (u, l) in enumerate(zip(thresholds[:-1], thresholds[1:])):
             message += '\n' + f'grade = {i+1} if {u} >= nodes > {l}'
         message += '\n' + f'grade = {len(thresholds)} if {thresholds[-1]} >= nodes'
-    return Result(grade != 0, grade, message)
\ No newline at end of file
+    return Result(grade != 0, grade, message)
+
+# Runs a search (e.g. 'search.AStarSearch') and returns the cost of its solution (None if it found no solution) and an error message
+# The heuristic (e.g. 'graph_landmarks.landmark_heuristic') is passed after the initial state if it is given
+# and, if check_consistency is True, every successor generated by the problem is checked for the consistency of the heuristic.
+# The wrapper (e.g. 'graph_csr.csr_search') is applied to the search function if it is given.
+# The other keyword arguments (e.g. memory_limit) are passed to the search function.
+def run_search_for_cost(
+    function_path: str,
+    problem: Problem[S, A],
+    heuristic_path: Optional[str] = None,
+    wrapper_path: Optional[str] = None,
+    check_consistency: bool = False,
+    **kwargs) -> Tuple[Optional[float], str]:
+    search_fn = load_function(function_path)
+    if wrapper_path is not None:
+        search_fn = load_function(wrapper_path)(search_fn)
+    args = () if heuristic_path is None else (load_function(heuristic_path),)
+    problem_type = type(problem)
+    original_get_successor = problem_type.get_successor
+    if check_consistency:
+        problem_type.get_successor = test_heuristic_consistency(args[0])(original_get_successor)
+    initial_state = problem.get_initial_state()
+    try:
+        path = search_fn(problem, initial_state, *args, **kwargs)
+    except InconsistentHeuristicException as err:
+        return None, "Heuristic is inconsistent:\n" + str(err)
+    finally:
+        problem_type.get_successor = original_get_successor
+    return check_path(problem, initial_state, path)
+
+# Returns the cost of the path (None if there is no path) and an error message if the path does not reach a goal
+def check_path(problem: Problem[S, A], initial_state: S, path: Optional[List[A]]) -> Tuple[Optional[float], str]:
+    if path is None:
+        return None, ""
+    path_cost = 0
+    state = initial_state
+    for action in path:
+        path_cost += problem.get_cost(state, action)
+        state = problem.get_successor(state, action)
+    if not problem.is_goal(state):
+        return path_cost, f"The path does not reach a goal: {[str(action) for action in path]}"
+    return path_cost, ""
+
+# Runs a search (e.g. 'search.IterativeDeepeningSearch') and returns the number of actions of its solution (None if it found no solution)
+# and an error message. The keyword arguments (e.g. limit or max_depth) are passed to the search function.
+def run_search_for_length(
+    function_path: str,
+    problem: Problem[S, A],
+    **kwargs) -> Tuple[Optional[int], str]:
+    initial_state = problem.get_initial_state()
+    path = load_function(function_path)(problem, initial_state, **kwargs)
+    _, message = check_path(problem, initial_state, path)
+    return (None if path is None else len(path)), message
+
+# Checks that the solution has the expected number of actions (or that there is no solution if expected_length is None)
+def compare_search_length(
+    output: Tuple[Optional[int], str],
+    expected_length: Optional[int],
+    problem_path: str) -> Result:
+    length, message = output
+    nl = '\n'
+    length_to_str = lambda l: "No solution" if l is None else f"{l} actions"
+    if not message:
+        if length == expected_length:
+            return Result(True, 1, "" if length is None else f"Path length: {length}")
+        message = f"Expected: {length_to_str(expected_length)}{nl}Got: {length_to_str(length)}"
+    problem = open(problem_path, 'r').read() if problem_path.endswith(".txt") else problem_path
+    return Result(False, 0, f"Problem:{nl}{problem}{nl}{message}")
+
+# Runs HDA* (parallel_astar.ParallelAStarSearch) with the given number of workers and returns the cost of its solution and an error message
+# The sokoban states are sent between the workers with parallel_astar.sokoban_codec
+def run_parallel_search_for_cost(
+    problem: Problem[S, A],
+    heuristic_path: str,
+    workers: int) -> Tuple[Optional[float], str]:
+    search_fn = load_function("parallel_astar.ParallelAStarSearch")
+    codec = load_function("parallel_astar.sokoban_codec")(problem) if isinstance(problem, SokobanProblem) else ()
+    initial_state = problem.get_initial_state()
+    result = search_fn(problem, initial_state, load_function(heuristic_path), workers, *codec)
+    path_cost, message = check_path(problem, initial_state, result.solution)
+    if not message and path_cost != result.cost:
+        message = f"The cost of the path is {path_cost} but the search reported {result.cost}"
+    return path_cost, message
+
+# Checks that the solution cost is within [expected_path_cost, max_ratio * expected_path_cost] (max_ratio = 1 for optimal searches)
+def compare_search_cost(
+    output: Tuple[Optional[float], str],
+    expected_path_cost: Optional[float],
+    problem_path: str,
+    max_ratio: float = 1) -> Result:
+    path_cost, message = output
+    nl = '\n'
+    cost_to_str = lambda c: "No solution" if c is None else str(c)
+    problem = open(problem_path, 'r').read() if problem_path.endswith(".txt") else problem_path
+    if not message:
+        if expected_path_cost is None or path_cost is None:
+            if path_cost == expected_path_cost:
+                return Result(True, 1, "")
+        elif expected_path_cost - 1e-6 <= path_cost <= max_ratio * expected_path_cost + 1e-6:
+            return Result(True, 1, f"Path cost: {path_cost}")
+        expected = cost_to_str(expected_path_cost)
+        if expected_path_cost is not None and max_ratio != 1:
+            expected += f" to {max_ratio * expected_path_cost}"
+        message = f"Expected path cost: {expected}{nl}Got: {cost_to_str(path_cost)}"
+    return Result(False, 0, f"Problem:{nl}{problem}{nl}{message}")
+
+# Runs ARA* (search.AnytimeAStarSolutions) with the given initial weight and returns the cost of its first solution and an error message
+# The cost of every solution must match its path and never increase from one solution to the next
+def run_anytime_search_for_cost(
+    problem: Problem[S, A],
+    heuristic_path: str,
+    weight: float) -> Tuple[Optional[float], str]:
+    search_fn = load_function("search.AnytimeAStarSolutions")
+    initial_state = problem.get_initial_state()
+    first_cost, previous_cost = None, float('inf')
+    for result in search_fn(problem, initial_state, load_function(heuristic_path), weight):
+        path_cost, message = check_path(problem, initial_state, result.solution)
+        if message:
+            return path_cost, message
+        if abs(path_cost - result.cost) > 1e-6:
+            return path_cost, f"The cost of the path is {path_cost} but the search reported {result.cost}"
+        if path_cost > previous_cost + 1e-6:
+            return path_cost, f"The solution cost increased from {previous_cost} to {path_cost}"
+        if first_cost is None:
+            first_cost = path_cost
+        previous_cost = path_cost
+    return first_cost, ""
+
+# Copies the graph file to a temporary folder, loads it with graph_loader.load_csr (which writes its sidecar), truncates the sidecar
+# to the given number of bytes then loads the graph again and returns the cost of the A* solution and an error message
+# The second load must detect that the sidecar is too short and rebuild it
+def run_search_with_truncated_sidecar(
+    graph_path: str,
+    truncated_size: int) -> Tuple[Optional[float], str]:
+    load_csr = load_function("graph_loader.load_csr")
+    sidecar_path = load_function("graph_loader.sidecar_path")
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, os.path.basename(graph_path))
+        shutil.copy2(graph_path, path)
+        load_csr(path)
+        full_size = os.path.getsize(sidecar_path(path))
+        with open(sidecar_path(path), 'r+b') as f:
+            f.truncate(truncated_size)
+        problem = load_csr(path)
+        if os.path.getsize(sidecar_path(path)) != full_size:
+            return None, f"The sidecar truncated to {truncated_size} bytes was not rebuilt"
+        initial_state = problem.get_initial_state()
+        solution = load_function("search.AStarSearch")(problem, initial_state, load_function("graph_csr.csr_heuristic"))
+        path_cost, message = check_path(problem, initial_state, solution)
+    finally:
+        shutil.rmtree(folder)
+    return path_cost, message
+
+# Runs a search with a statistics collector (search_stats.run_with_statistics), exports the statistics with to_json
+# and returns the statistics read back from the JSON file (the elapsed times are removed since they are not deterministic)
+def run_search_statistics(
+    function_path: str,
+    problem: Problem[S, A],
+    heuristic_path: Optional[str] = None,
+    track_states: bool = False) -> Dict[str, Any]:
+    run_with_statistics = load_function("search_stats.run_with_statistics")
+    args = () if heuristic_path is None else (load_function(heuristic_path),)
+    _, stats = run_with_statistics(load_function(function_path), problem, problem.get_initial_state(), *args, track_states=track_states)
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        stats.to_json(path)
+        with open(path, 'r') as f:
+            exported = json.load(f)
+    finally:
+        os.remove(path)
+    for key in ("heuristic_time", "successor_time", "elapsed"):
+        exported.pop(key)
+    return exported
+
+# Checks that every expected statistic has the expected value (the statistics that are not in "expected" are not checked)
+def compare_search_statistics(
+    output: Dict[str, Any],
+    expected: Dict[str, Any],
+    problem_path: str) -> Result:
+    nl = '\n'
+    wrong = [f"{key}: expected {value}, got {output.get(key)}" for key, value in expected.items() if output.get(key) != value]
+    if not wrong:
+        return Result(True, 1, "")
+    problem = open(problem_path, 'r').read() if problem_path.endswith(".txt") else problem_path
+    return Result(False, 0, f"Problem:{nl}{problem}{nl}{nl.join(wrong)}")
+
+# Creates an object with the given factory (e.g. 'indexed_heap.IndexedHeap') then applies the operations in order and returns their results
+# Every operation is a list [name, *arguments] which calls the method with the given name (or reads the attribute if it is not callable)
+# The operations "len" and "in" return len(object) and (argument in object). The dataclasses (e.g. CacheStats) are returned as dictionaries.
+def run_operations(
+    factory_path: str,
+    operations: List[List[Any]],
+    factory_args: Optional[List[Any]] = None) -> List[Tuple[List[Any], Any]]:
+    target = load_function(factory_path)(*(factory_args or []))
+    results = []
+    for operation in operations:
+        name, *args = operation
+        if name == "len":
+            result = len(target)
+        elif name == "in":
+            result = args[0] in target
+        else:
+            result = getattr(target, name)
+            if callable(result):
+                result = result(*args)
+        if dataclasses.is_dataclass(result):
+            result = dataclasses.asdict(result)
+        results.append((operation, result))
+    return results
+
+# Checks that the result of every operation equals the expected one
+def compare_operations(
+    output: List[Tuple[List[Any], Any]],
+    expected: List[Any]) -> Result:
+    nl = '\n'
+    wrong = [f"{operation}: expected {expected_result!r}, got {result!r}"
+             for (operation, result), expected_result in zip(output, expected) if result != expected_result]
+    if len(output) != len(expected):
+        wrong.append(f"Expected {len(expected)} results, got {len(output)}")
+    if not wrong:
+        return Result(True, 1, "")
+    return Result(False, 0, f"Wrong results:{nl}{nl.join(wrong)}")
+
+# Evaluates the heuristic memoized by helpers.cache.memoize_heuristic on the first "count" states reached by a breadth first
+# traversal of the problem, twice in the same order, and returns whether every memoized value equals the value of the heuristic
+# with the statistics of the cache region of the problem
+def run_memoized_heuristic(
+    problem: Problem[S, A],
+    heuristic_path: str,
+    count: int,
+    policy: str = "lru",
+    max_entries: Optional[int] = None) -> Dict[str, Any]:
+    heuristic = load_function(heuristic_path)
+    memoized = memoize_heuristic(heuristic, policy=policy, max_entries=max_entries)
+    states = [problem.get_initial_state()]
+    visited = set(states)
+    for state in states:
+        if len(states) >= count: break
+        for action in problem.get_actions(state):
+            successor = problem.get_successor(state, action)
+            if successor not in visited and len(states) < count:
+                visited.add(successor)
+                states.append(successor)
+    equal = all(memoized(problem, state) == heuristic(problem, state) for _ in range(2) for state in states)
+    stats = problem.cache_stats()[memoized.region]
+    return {"states": len(states), "equal": equal, "region": memoized.region,
+            "hits": stats.hits, "misses": stats.misses, "evictions": stats.evictions, "entries": stats.entries}
+
+# Solves random square cost matrices of the given size with assignment.solve_assignment, then replaces random rows one after
+# the other and repairs the previous solution with assignment.repair_assignment. Every repaired total is compared with
+# solving the new matrix from scratch (and with all the permutations if the size is at most 7).
+# The costs are integers in [0, max_cost] and a cost is replaced by "blocked" with the probability "blocked_rate"
+# (like the unreachable goals in the sokoban matching). Returns the list of the errors (empty if every repair is optimal).
+def run_assignment_repairs(
+    size: int,
+    matrices: int,
+    repairs: int,
+    seed: int,
+    max_cost: int = 100,
+    blocked: int = 32767,
+    blocked_rate: float = 0) -> List[str]:
+    solve_assignment = load_function("assignment.solve_assignment")
+    repair_assignment = load_function("assignment.repair_assignment")
+    rng = random.Random(seed)
+    random_row = lambda: [blocked if rng.random() < blocked_rate else rng.randint(0, max_cost) for _ in range(size)]
+    def best_total(costs: List[List[int]]) -> int:
+        return min(sum(costs[row][col] for row, col in enumerate(cols)) for cols in itertools.permutations(range(size)))
+    errors = []
+    for matrix in range(matrices):
+        costs = [random_row() for _ in range(size)]
+        assignment = solve_assignment(costs)
+        for repair in range(repairs):
+            row, row_costs = rng.randrange(size), random_row()
+            previous_total = assignment.total
+            repaired = repair_assignment(assignment, row, row_costs)
+            costs[row] = row_costs
+            expected = solve_assignment(costs).total if size > 7 else best_total(costs)
+            if assignment.total != previous_total:
+                errors.append(f"Matrix {matrix}, repair {repair}: the repair modified the given assignment")
+            if repaired.total != expected or sorted(repaired.row_match) != list(range(size)):
+                errors.append(f"Matrix {matrix}, repair {repair} of row {row}: expected total {expected}, got {repaired.total} "
+                              f"with the matching {repaired.row_match} of the costs {costs}")
+            assignment = repaired
+    return errors
+
+# Checks that the runner found no errors
+def compare_no_errors(output: List[str]) -> Result:
+    nl = '\n'
+    if not output:
+        return Result(True, 1, "")
+    return Result(False, 0, f"{len(output)} errors:{nl}{nl.join(output[:10])}")
+
+# Runs the members of the default portfolio of the domain (portfolio.default_members) that are named in "members" on the problem
+# and returns the cost of the returned solution, the winner, the status of every member and whether the solution is a valid path
+# whose cost is the reported cost
+def run_portfolio(
+    domain: str,
+    problem_path: str,
+    members: List[str],
+    mode: str = "best",
+    deadline: Optional[float] = None) -> Dict[str, Any]:
+    portfolio_members = [member for member in load_function("portfolio.default_members")(domain) if member.name in members]
+    problem = load_function("portfolio.load_problem")(domain, problem_path)
+    initial_state = problem.get_initial_state()
+    result = load_function("portfolio.run_portfolio")(problem, portfolio_members, initial_state, deadline, mode)
+    path_cost, message = check_path(problem, initial_state, result.solution)
+    valid = not message and (path_cost is None or abs(path_cost - result.cost) < 1e-6)
+    return {"cost": result.cost, "solved": result.solution is not None, "winner": result.winner, "valid": valid,
+            "statuses": {report.name: report.status for report in result.reports}}
+
+# Runs a case of the benchmark suite (benchmark.run_case) and returns its measurements without the time and the memory (which are not deterministic)
+def run_benchmark_case(
+    domain: str,
+    path: str,
+    algorithm: str,
+    timeout: float) -> Dict[str, Any]:
+    result = load_function("benchmark.run_case")(domain, path, algorithm, timeout)
+    if result["status"] in ("solved", "no solution"):
+        if not (result["time"] >= 0 and result["peak_rss_kb"] >= 0):
+            result["status"] = f"invalid measurements (time {result['time']}, peak RSS {result['peak_rss_kb']})"
+        del result["time"], result["peak_rss_kb"]
+    return result
+
+# Compares the given results with a history holding the previous results (benchmark.find_regressions) and returns the regressions found
+def run_benchmark_regressions(
+    previous: Dict[str, Dict[str, Any]],
+    results: Dict[str, Dict[str, Any]],
+    threshold: float = 10,
+    min_time: float = 0.05) -> Dict[str, Any]:
+    history = [{"timestamp": "", "commit": None, "results": previous}]
+    return {"regressions": load_function("benchmark.find_regressions")(history, results, threshold, min_time)}
+
+# Detects the domain of every file matched by the glob patterns (batch_solve.detect_domain) and returns it for each file
+# ("error" for the files whose domain cannot be detected)
+def run_detect_domain(patterns: List[str]) -> Dict[str, str]:
+    detect_domain = load_function("batch_solve.detect_domain")
+    domains = {}
+    for path in load_function("batch_solve.find_files")(patterns):
+        try:
+            domains[path] = detect_domain(path)
+        except ValueError:
+            domains[path] = "error"
+    return domains
+
+# Solves the files matched by the glob patterns with batch_solve.solve_all and returns the record of each file
+# without the search time (which is not deterministic)
+def run_batch_solve(
+    patterns: List[str],
+    algorithm: str,
+    heuristic: str = "default",
+    workers: int = 2,
+    timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    detect_domain = load_function("batch_solve.detect_domain")
+    tasks = [(path, detect_domain(path), algorithm, heuristic) for path in load_function("batch_solve.find_files")(patterns)]
+    records = {}
+    def emit(record: Dict[str, Any]) -> None:
+        record.pop("time", None)
+        records[record.pop("file")] = record
+    load_function("batch_solve.solve_all")(tasks, workers, timeout, None, emit)
+    return records
@@ -1,10 +1,12 @@
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 from dataclasses import dataclass
 from collections import deque
 import importlib, os, sys
 from importlib import util as ilu
 import traceback
 
+from helpers.cache import CacheRegion, CacheStats, create_region
+
 solution_path = ""
 
 def set_solution_path(path: str):
@@ -53,19 +55,23 @@ def fetch_tracked_call_count(fn):
     setattr(fn, "calls", 0)
     return calls
 
-def record_calls(fn):
+# Records the arguments of every call in a deque
+# It can be used as @record_calls or as @record_calls(maxlen=n) to keep only the last n calls (so long runs do not grow it forever)
+def record_calls(fn=None, *, maxlen=None):
+    if fn is None:
+        return lambda fn: record_calls(fn, maxlen=maxlen)
     def deco(*args, **kwargs):
         deco.calls.append({
             "args": args,
             "kwargs": kwargs
         })
         return fn(*args, **kwargs)
-    deco.calls = deque()
+    deco.calls = deque(maxlen=maxlen)
     return deco
 
 def fetch_recorded_calls(fn):
     calls = getattr(fn, "calls", deque())
-    setattr(fn, "calls", deque())
+    setattr(fn, "calls", deque(maxlen=calls.maxlen))
     return calls
 
 def add_call_listener(listener):
@@ -86,6 +92,22 @@ class CacheContainer:
             setattr(self, "_cache", cache)
             return cache
 
+    # Returns the named bounded cache region of this object (see helpers/cache.py), it is created on the first call
+    # The policy and the limits of an existing region are not changed
+    def cache_region(self, name: str, policy: str = "lru", max_entries: Optional[int] = None, max_bytes: Optional[int] = None) -> CacheRegion:
+        regions = getattr(self, "_cache_regions", None)
+        if regions is None:
+            regions = {}
+            setattr(self, "_cache_regions", regions)
+        region = regions.get(name)
+        if region is None:
+            region = regions[name] = create_region(name, policy, max_entries, max_bytes)
+        return region
+
+    # Returns the statistics of every cache region of this object
+    def cache_stats(self) -> Dict[str, CacheStats]:
+        return {name: region.stats for name, region in getattr(self, "_cache_regions", {}).items()}
+
 # Unused
 def _cache_function(self) -> Dict[Any, Any]:
     if hasattr(self, "_cache"):
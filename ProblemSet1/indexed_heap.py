@@ -0,0 +1,118 @@
+from typing import Any, Dict, Generic, List, Tuple, TypeVar
+
+# K is the type of the keys (e.g. search states) and V is the type of the values attached to them (e.g. search nodes)
+K = TypeVar("K")
+V = TypeVar("V")
+
+# This is an indexed binary min-heap
+# Unlike "heapq" which only supports push and pop (so a search has to push duplicates and skip stale entries later),
+# the indexed heap holds each key at most once and keeps a dictionary from every key to its position in the heap.
+# This allows:
+#   - checking whether a key is in the heap in O(1)
+#   - decreasing the priority of a key that is already in the heap in O(log n) (decrease-key)
+# So the heap size never exceeds the number of distinct keys it holds.
+# Priorities can be any comparable objects (e.g. the search algorithms use tuples of (cost, insertion order) to break ties)
+class IndexedHeap(Generic[K, V]):
+    __slots__ = ("_priorities", "_keys", "_values", "_positions")
+
+    def __init__(self) -> None:
+        # The heap is stored in 3 parallel lists where the entry at index i has its children at 2i+1 and 2i+2
+        self._priorities: List[Any] = []
+        self._keys: List[K] = []
+        self._values: List[V] = []
+        # A map from each key to its index in the lists above
+        self._positions: Dict[K, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __bool__(self) -> bool:
+        return bool(self._keys)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._positions
+
+    # Returns the keys in the heap (in no particular order)
+    def keys(self) -> List[K]:
+        return list(self._keys)
+
+    # Returns the current priority of the given key
+    def priority(self, key: K) -> Any:
+        return self._priorities[self._positions[key]]
+
+    # Returns the value attached to the given key
+    def value(self, key: K) -> V:
+        return self._values[self._positions[key]]
+
+    # Inserts the key if it is not in the heap.
+    # If it is already in the heap, its priority (and value) are replaced only if the new priority is smaller (decrease-key).
+    # Returns True if the heap was changed and False otherwise
+    def push(self, key: K, priority: Any, value: V = None) -> bool:
+        position = self._positions.get(key)
+        if position is None:
+            position = len(self._keys)
+            self._priorities.append(priority)
+            self._keys.append(key)
+            self._values.append(value)
+            self._positions[key] = position
+        elif priority < self._priorities[position]:
+            self._priorities[position] = priority
+            self._values[position] = value
+        else:
+            return False
+        self._sift_up(position)
+        return True
+
+    # Removes the entry with the smallest priority and returns it as a tuple (key, priority, value)
+    def pop(self) -> Tuple[K, Any, V]:
+        priorities, keys, values = self._priorities, self._keys, self._values
+        priority, key, value = priorities[0], keys[0], values[0]
+        del self._positions[key]
+        # Move the last entry to the root then sift it down to restore the heap property
+        last_priority, last_key, last_value = priorities.pop(), keys.pop(), values.pop()
+        if keys:
+            priorities[0], keys[0], values[0] = last_priority, last_key, last_value
+            self._positions[last_key] = 0
+            self._sift_down(0)
+        return key, priority, value
+
+    # Returns the entry with the smallest priority as a tuple (key, priority, value) without removing it
+    def peek(self) -> Tuple[K, Any, V]:
+        return self._keys[0], self._priorities[0], self._values[0]
+
+    # Moves the entry at the given position up until its parent has a smaller priority
+    def _sift_up(self, position: int) -> None:
+        priorities, keys, values, positions = self._priorities, self._keys, self._values, self._positions
+        priority, key, value = priorities[position], keys[position], values[position]
+        while position > 0:
+            parent = (position - 1) >> 1
+            if not priority < priorities[parent]:
+                break
+            # Move the parent down into the hole
+            priorities[position], keys[position], values[position] = priorities[parent], keys[parent], values[parent]
+            positions[keys[position]] = position
+            position = parent
+        priorities[position], keys[position], values[position] = priority, key, value
+        positions[key] = position
+
+    # Moves the entry at the given position down until both its children have larger priorities
+    def _sift_down(self, position: int) -> None:
+        priorities, keys, values, positions = self._priorities, self._keys, self._values, self._positions
+        size = len(keys)
+        priority, key, value = priorities[position], keys[position], values[position]
+        while True:
+            child = 2 * position + 1
+            if child >= size:
+                break
+            # Pick the child with the smaller priority
+            right = child + 1
+            if right < size and priorities[right] < priorities[child]:
+                child = right
+            if not priorities[child] < priority:
+                break
+            # Move the child up into the hole
+            priorities[position], keys[position], values[position] = priorities[child], keys[child], values[child]
+            positions[keys[position]] = position
+            position = child
+        priorities[position], keys[position], values[position] = priority, key, value
+        positions[key] = position
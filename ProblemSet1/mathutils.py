@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Iterator
-import math
+from typing import Iterable, Iterator, Tuple
+import math, random
 
 # the class Point will hold a 2D coordinate on a discrete grid
 # We use dataclass with frozen=True to automatically implement:
@@ -32,6 +32,11 @@ class Point:
     def __iter__(self) -> Iterator[int]:
         return iter((self.x, self.y))
 
+    # The default pickling of a frozen class with __slots__ restores the fields via setattr which is blocked,
+    # so the points are pickled as a call to the constructor (this is needed to send points between processes)
+    def __reduce__(self):
+        return (Point, (self.x, self.y))
+
 # This is a helper function to compute the manhattan distance between 2 points
 def manhattan_distance(p1: Point, p2: Point) -> int:
     return abs(p1.x - p2.x) + abs(p1.y - p2.y)
@@ -41,6 +46,35 @@ def euclidean_distance(p1: Point, p2: Point) -> int:
     difference = p1 - p2
     return math.sqrt(difference.x * difference.x + difference.y * difference.y)
 
+# This is a helper function to iterate over the indices of the set bits in an integer (from the lowest to the highest)
+# It is used to iterate over the items of sets that are packed into the bits of an integer (bitboards)
+def iterate_bits(mask: int) -> Iterator[int]:
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+# Zobrist hashing: every (piece, cell) pair gets a random 64-bit key and the hash of a position is the xor of the keys of its pieces
+# where a piece is a kind of object (e.g. the player or a crate) or a specific object (e.g. car 'i'), and the cells are numbered 0..N-1
+# Moving a piece from a cell to another updates the hash with 2 xors (see "move") instead of rehashing the whole position
+# The keys are generated from a fixed seed so the hashes are the same in every run (and in every process)
+class ZobristKeys:
+    def __init__(self, pieces: int, cells: int, seed: int = 0x5EED) -> None:
+        rng = random.Random(seed)
+        self.keys = tuple(tuple(rng.getrandbits(64) for _ in range(cells)) for _ in range(pieces))
+
+    # Returns the hash of a position given as (piece, cell) pairs
+    def hash(self, placements: Iterable[Tuple[int, int]]) -> int:
+        key = 0
+        for piece, cell in placements:
+            key ^= self.keys[piece][cell]
+        return key
+
+    # Returns the hash after moving the piece from the source cell to the target cell
+    def move(self, key: int, piece: int, source: int, target: int) -> int:
+        keys = self.keys[piece]
+        return key ^ keys[source] ^ keys[target]
+
 # This enum represent 4 directions (RIGHT, UP, LEFT, RIGHT)
 class Direction(IntEnum):
     RIGHT = 0
@@ -0,0 +1,292 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse, functools, glob, heapq, multiprocessing, operator, pickle, queue, time, traceback, zlib
+
+from problem import HeuristicFunction, Problem, Solution, S, A
+
+# This file contains a hash distributed A* (HDA*) which runs the search over several worker processes
+# Every state is owned by one worker (chosen by the hash of the state), and each worker keeps the open and closed lists of its own states.
+# When a worker expands a state, the successors that it does not own are batched per owner and sent to the owner's inbox.
+# A worker keeps the lowest g of each owned state, so a state reached again with a lower g (possible since the workers are not
+# synchronized) is reopened.
+#
+# The cost of the best goal found so far (the incumbent) is shared by all the workers, and the nodes with f >= incumbent are pruned.
+# The heuristic must be admissible, then once no worker has a node with f < incumbent and no batch is in flight, the incumbent is optimal.
+# The search is over when:
+#   - every worker is idle (its open list has no node with f < incumbent and its outgoing batches are sent)
+#   - and every batch that was sent was received (each worker counts the states it sent and received in shared arrays)
+# The coordinator checks this twice (with the counters read before and after the idle flags) so a batch that is received
+# while the flags are read is never missed.
+# Then the path is rebuilt by asking the owner of each state on the path for its parent (each worker stores (parent, action) of its states).
+# If a worker raises an exception, it sends it to the coordinator which terminates the other workers and raises it again
+# (a worker that exits without sending anything, e.g. killed by the OS, is detected by checking that the processes are alive).
+#
+# The workers are forked, so the problem and the heuristic are inherited (the heuristic caches are per worker).
+# On the platforms without fork, the workers are spawned, so the problem, the heuristic, "encode" and "decode" must be picklable.
+# Only the states and the actions are sent between the processes: if the states are not picklable or are expensive to pickle,
+# "encode" and "decode" convert them to and from a compact picklable key (see sokoban_codec). The owner is hash(key) % workers,
+# which is the same in every worker since they are forked from the same process (and share the hash seed).
+# The spawned workers have their own hash seed, so they use a hash of the pickled key instead (see _stable_hash).
+
+# The outcome of a parallel search
+@dataclass
+class ParallelSearchResult:
+    solution: Solution
+    cost: Optional[float]
+    expansions: List[int] = field(default_factory=list)    # the number of states expanded by each worker
+    messages: int = 0                                       # the number of states sent between the workers
+
+# Raised when a worker fails, it is the cause of the exception raised by the worker (and holds its traceback)
+class WorkerError(RuntimeError):
+    pass
+
+# The shared memory used by the workers and the coordinator
+class _SharedState:
+    def __init__(self, context, workers: int) -> None:
+        self.incumbent = context.RawValue('d', float('inf'))
+        self.incumbent_owner = context.RawValue('q', -1)
+        self.incumbent_lock = context.Lock()
+        # index "workers" of the counters is the coordinator (which sends the initial state)
+        self.sent = context.RawArray('q', workers + 1)
+        self.received = context.RawArray('q', workers + 1)
+        self.idle = context.RawArray('b', workers)
+        self.expansions = context.RawArray('q', workers)
+
+def _identity(value: Any) -> Any:
+    return value
+
+# Returns a hash of the key which is the same in every process (the hash of the strings is randomized per process)
+def _stable_hash(key: Any) -> int:
+    return zlib.crc32(pickle.dumps(key, protocol=4))
+
+# Runs the search of a worker and sends the exception that stopped it (if any) to the coordinator
+def _worker(index: int, workers: int, problem: Problem[S, A], heuristic: HeuristicFunction, encode: Callable, decode: Callable,
+            inboxes: List, replies, shared: _SharedState, batch_size: int, key_hash: Callable[[Any], int]) -> None:
+    try:
+        _search(index, workers, problem, heuristic, encode, decode, inboxes, replies, shared, batch_size, key_hash)
+    except BaseException as error:
+        trace = traceback.format_exc()
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(f"{type(error).__name__}: {error}")
+        replies.put(("error", index, error, trace))
+
+def _search(index: int, workers: int, problem: Problem[S, A], heuristic: HeuristicFunction, encode: Callable, decode: Callable,
+            inboxes: List, replies, shared: _SharedState, batch_size: int, key_hash: Callable[[Any], int]) -> None:
+    INF = float('inf')
+    inbox = inboxes[index]
+    best_g: Dict[Any, float] = {}
+    parents: Dict[Any, Tuple[Any, Any]] = {}    # key -> (parent key, action)
+    frontier = []
+    counter = 0
+    goal = None
+    outboxes: List[List] = [[] for _ in range(workers)]
+    incumbent = shared.incumbent
+
+    def insert(key, state, g, parent, action) -> None:
+        nonlocal counter
+        if g >= best_g.get(key, INF): return
+        f = g + heuristic(problem, state)
+        if f >= incumbent.value: return
+        best_g[key] = g
+        parents[key] = (parent, action)
+        counter += 1
+        heapq.heappush(frontier, (f, counter, g, key, state))
+
+    def flush(owner: int) -> None:
+        batch = outboxes[owner]
+        if not batch: return
+        # The batch is counted before it is sent so that it is never in flight without being counted
+        shared.sent[index] += len(batch)
+        inboxes[owner].put(("states", batch))
+        outboxes[owner] = []
+
+    # Handles a message, returns False if the worker should stop
+    def handle(message) -> bool:
+        kind, payload = message
+        if kind == "states":
+            shared.idle[index] = 0
+            for key, g, parent, action in payload:
+                insert(key, decode(key), g, parent, action)
+            shared.received[index] += len(payload)
+        elif kind == "trace":
+            # Send the parent of the given state (or of the goal of this worker if the key is None)
+            key = goal if payload is None else payload
+            replies.put(("trace", key) + parents[key])
+        elif kind == "stop":
+            return False
+        return True
+
+    while True:
+        # Receive all the pending batches without blocking
+        try:
+            while True:
+                if not handle(inbox.get_nowait()): return
+        except queue.Empty:
+            pass
+        if frontier and frontier[0][0] < incumbent.value:
+            f, _, g, key, state = heapq.heappop(frontier)
+            if g > best_g[key]: continue
+            if problem.is_goal(state):
+                with shared.incumbent_lock:
+                    if g < incumbent.value:
+                        incumbent.value = g
+                        shared.incumbent_owner.value = index
+                        goal = key
+                continue
+            shared.expansions[index] += 1
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_g = g + problem.get_cost(state, action)
+                next_key = encode(next_state)
+                owner = key_hash(next_key) % workers
+                if owner == index:
+                    insert(next_key, next_state, next_g, key, action)
+                else:
+                    outboxes[owner].append((next_key, next_g, key, action))
+                    if len(outboxes[owner]) >= batch_size: flush(owner)
+            # Flush regularly so that the other workers do not wait for the states that they own
+            if shared.expansions[index] % batch_size == 0:
+                for owner in range(workers): flush(owner)
+            continue
+        # There is no useful work: send everything then wait for new batches
+        for owner in range(workers): flush(owner)
+        frontier.clear()
+        shared.idle[index] = 1
+        try:
+            if not handle(inbox.get(timeout=0.005)): return
+        except queue.Empty:
+            pass
+
+# Returns the next reply of the workers or None if there is none within the timeout
+# Raises the exception of a failed worker, or a WorkerError if a worker exited without sending its exception
+def _receive(replies, processes: List, timeout: float) -> Optional[Tuple]:
+    try:
+        reply = replies.get(timeout=timeout)
+    except queue.Empty:
+        dead = [index for index, process in enumerate(processes) if not process.is_alive()]
+        if not dead: return None
+        # The exception of a worker may still be in the queue after the worker exited
+        try:
+            reply = replies.get(timeout=1)
+        except queue.Empty:
+            raise WorkerError(f"The worker {dead[0]} exited with code {processes[dead[0]].exitcode}") from None
+    if reply[0] == "error":
+        _, index, error, trace = reply
+        raise error from WorkerError(f"The worker {index} failed:\n{trace}")
+    return reply
+
+# Runs HDA* with the given number of worker processes and returns the optimal solution (if the heuristic is admissible)
+# If deadline (in seconds) is given and it expires before the search is over, the result has no solution
+# If a worker fails, its exception is raised (with a WorkerError holding the traceback of the worker as its cause)
+def ParallelAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, workers: int = 4,
+                        encode: Optional[Callable[[S], Any]] = None, decode: Optional[Callable[[Any], S]] = None,
+                        batch_size: int = 64, deadline: Optional[float] = None) -> ParallelSearchResult:
+    encode = encode or _identity
+    decode = decode or _identity
+    if problem.is_goal(initial_state):
+        return ParallelSearchResult([], 0, [0] * workers)
+    forked = "fork" in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if forked else None)
+    key_hash = hash if forked else _stable_hash
+    shared = _SharedState(context, workers)
+    inboxes = [context.Queue() for _ in range(workers)]
+    replies = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(index, workers, problem, heuristic, encode, decode, inboxes, replies, shared, batch_size, key_hash), daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    start = time.perf_counter()
+    failed = True
+    try:
+        root = encode(initial_state)
+        shared.sent[workers] = 1
+        inboxes[key_hash(root) % workers].put(("states", [(root, 0, None, None)]))
+
+        def quiescent() -> bool:
+            before = (sum(shared.sent), sum(shared.received))
+            if before[0] != before[1] or not all(shared.idle): return False
+            return before == (sum(shared.sent), sum(shared.received))
+
+        timed_out = False
+        while not quiescent():
+            if deadline is not None and time.perf_counter() - start > deadline:
+                timed_out = True
+                break
+            # Wait a little while checking that no worker failed
+            _receive(replies, processes, 0.001)
+        solution, cost = None, None
+        owner = shared.incumbent_owner.value
+        if not timed_out and owner >= 0:
+            # Walk back from the goal, asking the owner of each state for its parent
+            actions = []
+            inboxes[owner].put(("trace", None))
+            while True:
+                reply = _receive(replies, processes, 0.1)
+                if reply is None: continue
+                _, key, parent, action = reply
+                if parent is None: break
+                actions.append(action)
+                inboxes[key_hash(parent) % workers].put(("trace", parent))
+            solution, cost = actions[::-1], shared.incumbent.value
+        failed = False
+    finally:
+        # If a worker failed, the other workers are terminated without waiting for them
+        for inbox in inboxes:
+            inbox.put(("stop", None))
+        for process in processes:
+            if not failed: process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+    return ParallelSearchResult(solution, cost, list(shared.expansions), sum(shared.sent) - 1)
+
+def _decode_sokoban_state(state_type: type, layout, key: Tuple) -> Any:
+    return state_type(layout, *key)
+
+# The sokoban states hold their layout, so they are sent as (player, crates) and rebuilt with the layout of the problem
+# (the codec is made of picklable functions so that it can be sent to spawned workers)
+def sokoban_codec(problem) -> Tuple[Callable, Callable]:
+    from sokoban import SokobanState, PackedSokobanState, ZobristSokobanState
+    state = problem.get_initial_state()
+    layout = state.layout
+    if isinstance(state, ZobristSokobanState):
+        return operator.attrgetter("player", "crates", "key"), functools.partial(_decode_sokoban_state, ZobristSokobanState, layout)
+    if isinstance(state, PackedSokobanState):
+        return operator.attrgetter("player", "crates"), functools.partial(_decode_sokoban_state, PackedSokobanState, layout)
+    return operator.attrgetter("player", "crates"), functools.partial(_decode_sokoban_state, SokobanState, layout)
+
+# Measures HDA* with different numbers of workers on the sokoban levels and compares it with AStarSearch
+def main(args: argparse.Namespace):
+    from sokoban import SokobanProblem
+    from search import AStarSearch
+    from sokoban_heuristic import weak_heuristic, strong_heuristic
+    heuristic = {"weak": weak_heuristic, "strong": strong_heuristic}[args.heuristic]
+    print(f"{'level':<22}{'search':<12}{'cost':>6}{'expanded':>10}{'time (s)':>10}{'speedup':>9}   per worker")
+    for level in sorted(glob.glob(args.levels)):
+        problem = SokobanProblem.from_file(level, args.packed)
+        begin = time.perf_counter()
+        path = AStarSearch(problem, problem.get_initial_state(), heuristic)
+        serial = time.perf_counter() - begin
+        print(f"{level:<22}{'A*':<12}{len(path) if path is not None else '-':>6}{'':>10}{serial:>10.3f}")
+        for workers in args.workers:
+            problem = SokobanProblem.from_file(level, args.packed)
+            encode, decode = sokoban_codec(problem)
+            begin = time.perf_counter()
+            result = ParallelAStarSearch(problem, problem.get_initial_state(), heuristic, workers, encode, decode, args.batch)
+            elapsed = time.perf_counter() - begin
+            cost = "-" if result.cost is None else f"{result.cost:g}"
+            print(f"{level:<22}{f'HDA* x{workers}':<12}{cost:>6}{sum(result.expansions):>10}{elapsed:>10.3f}"
+                  f"{f'x{serial / elapsed:.2f}':>9}   {result.expansions}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the scaling of hash distributed A* on sokoban levels")
+    parser.add_argument("--levels", "-l", default="levels/*.txt", help="a glob pattern for the sokoban levels to run")
+    parser.add_argument("--workers", "-w", type=int, nargs="+", default=[1, 2, 4, 8], help="the numbers of workers to measure")
+    parser.add_argument("--heuristic", "-hf", default="strong", choices=["weak", "strong"], help="the heuristic used by the searches")
+    parser.add_argument("--batch", "-b", type=int, default=64, help="the number of states sent in each batch")
+    parser.add_argument("--packed", action="store_true", default=False, help="use the packed state representation")
+    main(parser.parse_args())
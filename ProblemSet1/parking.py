@@ -1,6 +1,7 @@
-from typing import Any, Dict, Set, Tuple, List
+from dataclasses import dataclass
+from typing import Any, Dict, Set, Tuple, List, Union
 from problem import Problem
-from mathutils import Direction, Point
+from mathutils import Direction, Point, ZobristKeys
 
 ParkingState = Tuple[Point]   
 # array of immutable points indicating cars' positions
@@ -10,28 +11,69 @@ ParkingState = Tuple[Point]
 # An action of the parking problem is a tuple containing an index 'i' and a direction 'd' where car 'i' should move in the direction 'd'.
 ParkingAction = Tuple[int, Direction]
 
+# The packed state is an alternative to ParkingState where everything is stored in a single integer:
+#   bits [i * cell_bits, (i + 1) * cell_bits): the index of the cell containing car 'i' (the passages are numbered in row-major order)
+#   bits [occupancy_shift, ...): the occupancy bitboard (bit c is set if cell c contains a car)
+# The occupancy is fully determined by the positions, so two packed states are equal if and only if the cars are at the same positions.
+# It is stored in the state so that checking whether a cell is free is a single bit test instead of a search in the tuple,
+# and the equality and the hash are computed on one integer instead of a tuple of points.
+PackedParkingState = int
+
+# The zobrist state is a packed state with its 64-bit zobrist hash ("key") where the pieces are the cars (piece 'i' is car 'i')
+# The hash of the state is the key and it is updated incrementally by "get_successor" (moving a car costs 2 xors)
+@dataclass(eq=False, frozen=True)
+class ZobristParkingState:
+    __slots__ = ("packed", "key")
+    packed: PackedParkingState
+    key: int
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ZobristParkingState) and self.key == other.key and self.packed == other.packed
+
+    def __hash__(self) -> int:
+        return self.key
+
 # This is the implementation of the parking problem
-class ParkingProblem(Problem[ParkingState, ParkingAction]):
+AnyParkingState = Union[ParkingState, PackedParkingState, ZobristParkingState]
+
+class ParkingProblem(Problem[AnyParkingState, ParkingAction]):
     passages: Set[Point]    # A set of points which indicate where a car can be (in other words, every position except walls).
-    cars: Tuple[Point]      # A tuple of points where state[i] is the position of car 'i'. 
+    cars: AnyParkingState   # The initial state: a tuple of points where state[i] is the position of car 'i' (or its packed or zobrist version).
     slots: Dict[Point, int] # A dictionary which indicate the index of the parking slot (if it is 'i' then it is the lot of car 'i') for every position.
                             # if a position does not contain a parking slot, it will not be in this dictionary.
     width: int              # The width of the parking lot.
     height: int             # The height of the parking lot.
+    # If the problem is packed (see "from_text"), it also contains the tables used by the packed states:
+    car_count: int                      # The number of cars
+    cells: Tuple[Point]                 # cells[c] is the position of the cell whose index is c
+    indices: Dict[Point, int]           # The index of every passage
+    neighbors: Tuple[Tuple[int]]        # neighbors[c][direction] is the index of the cell next to cell c in the given direction (or -1 if it is a wall)
+    cell_bits: int                      # The width of the field holding the cell index of each car
+    occupancy_shift: int                # The position of the occupancy bitboard in the packed state
+    goal_state: PackedParkingState      # The only goal state (every car is in its slot) or -1 if a car has no slot
+    zobrist: ZobristKeys = None         # The zobrist keys of the cars if the problem uses zobrist states
 
     # This function should return the initial state
-    def get_initial_state(self) -> ParkingState:
+    def get_initial_state(self) -> AnyParkingState:
         return self.cars    # Initially our state is the cars' initial positions
     
     # This function should return True if the given state is a goal. Otherwise, it should return False.
-    def is_goal(self, state: ParkingState) -> bool:
+    def is_goal(self, state: AnyParkingState) -> bool:
+        if isinstance(state, int):
+            return state == self.goal_state
+        if isinstance(state, ZobristParkingState):
+            return state.packed == self.goal_state
         for i,car_pos in enumerate(state):
             if self.slots.get(car_pos) != i:
                 return False
         return True
     
     # This function returns a list of all the possible actions that can be applied to the given state
-    def get_actions(self, state: ParkingState) -> List[ParkingAction]:
+    def get_actions(self, state: AnyParkingState) -> List[ParkingAction]:
+        if isinstance(state, int):
+            return self._get_packed_actions(state)
+        if isinstance(state, ZobristParkingState):
+            return self._get_packed_actions(state.packed)
         action_list = []
         for i, car_pos in enumerate(state):
             for direction in Direction:
@@ -40,22 +82,81 @@ class ParkingProblem(Problem[ParkingState, ParkingAction]):
                     action_list.append((i, direction))
         
         return action_list                    
+
+    # This is the same as "get_actions" but for packed states where the neighbors are looked up in the neighbor table
+    # and the collisions are checked in the occupancy bitboard (the actions are generated in the same order)
+    def _get_packed_actions(self, state: PackedParkingState) -> List[ParkingAction]:
+        action_list = []
+        neighbors, bits = self.neighbors, self.cell_bits
+        mask = (1 << bits) - 1
+        occupancy = state >> self.occupancy_shift
+        for i in range(self.car_count):
+            cell_neighbors = neighbors[state >> (i * bits) & mask]
+            for direction in Direction:
+                new_cell = cell_neighbors[direction]
+                if new_cell >= 0 and not occupancy >> new_cell & 1:
+                    action_list.append((i, direction))
+        return action_list
     
     # This function returns a new state which is the result of applying the given action to the given state
-    def get_successor(self, state: ParkingState, action: ParkingAction) -> ParkingState:
+    def get_successor(self, state: AnyParkingState, action: ParkingAction) -> AnyParkingState:
+        if isinstance(state, int):
+            return self._get_packed_successor(state, action)
+        if isinstance(state, ZobristParkingState):
+            return self._get_zobrist_successor(state, action)
         car_ind, direction = action
         new_state = list(state) 
         new_state[car_ind] = new_state[car_ind] +  direction.to_vector()
         
         return tuple(new_state)
+
+    # This is the same as "get_successor" but for packed states where moving a car replaces its field and flips 2 occupancy bits
+    def _get_packed_successor(self, state: PackedParkingState, action: ParkingAction) -> PackedParkingState:
+        car_ind, direction = action
+        shift = car_ind * self.cell_bits
+        cell = state >> shift & ((1 << self.cell_bits) - 1)
+        new_cell = self.neighbors[cell][direction]
+        return state + ((new_cell - cell) << shift) + (((1 << new_cell) - (1 << cell)) << self.occupancy_shift)
+
+    # This is the same as "_get_packed_successor" but the zobrist hash is updated with the move of the car
+    def _get_zobrist_successor(self, state: ZobristParkingState, action: ParkingAction) -> ZobristParkingState:
+        car_ind, direction = action
+        shift = car_ind * self.cell_bits
+        packed = state.packed
+        cell = packed >> shift & ((1 << self.cell_bits) - 1)
+        new_cell = self.neighbors[cell][direction]
+        packed += ((new_cell - cell) << shift) + (((1 << new_cell) - (1 << cell)) << self.occupancy_shift)
+        return ZobristParkingState(packed, self.zobrist.move(state.key, car_ind, cell, new_cell))
+
+    # Converts a packed state to the zobrist representation
+    def to_zobrist(self, state: PackedParkingState) -> ZobristParkingState:
+        mask = (1 << self.cell_bits) - 1
+        return ZobristParkingState(state, self.zobrist.hash((i, state >> (i * self.cell_bits) & mask) for i in range(self.car_count)))
+
+    # Converts a state from the point representation to the packed representation
+    def pack(self, state: ParkingState) -> PackedParkingState:
+        packed = 0
+        for i, car_pos in enumerate(state):
+            cell = self.indices[car_pos]
+            packed |= (cell << (i * self.cell_bits)) | (1 << (self.occupancy_shift + cell))
+        return packed
+
+    # Converts a packed (or zobrist) state back to the point representation
+    def unpack(self, state: Union[PackedParkingState, ZobristParkingState]) -> ParkingState:
+        if isinstance(state, ZobristParkingState): state = state.packed
+        mask = (1 << self.cell_bits) - 1
+        return tuple(self.cells[state >> (i * self.cell_bits) & mask] for i in range(self.car_count))
+
     # This function returns the cost of applying the given action to the given state
-    def get_cost(self, state: ParkingState, action: ParkingAction) -> float:
+    def get_cost(self, state: AnyParkingState, action: ParkingAction) -> float:
         index , _ = action
         return 26 - index 
     
     # Read a parking problem from text containing a grid of tiles
+    # If packed is True, the problem will use packed states (see PackedParkingState)
+    # If zobrist is True, the problem will use zobrist states (see ZobristParkingState) which are packed too
     @staticmethod
-    def from_text(text: str) -> 'ParkingProblem':
+    def from_text(text: str, packed: bool = False, zobrist: bool = False) -> 'ParkingProblem':
         passages =  set()
         cars, slots = {}, {}
         lines = [line for line in (line.strip() for line in text.splitlines()) if line]
@@ -76,11 +177,32 @@ class ParkingProblem(Problem[ParkingState, ParkingAction]):
         problem.slots = {position:index for index, position in slots.items()}
         problem.width = width
         problem.height = height
+        if packed or zobrist:
+            problem._pack_layout()
+        if zobrist:
+            problem.zobrist = ZobristKeys(problem.car_count, len(problem.cells))
+            problem.cars = problem.to_zobrist(problem.cars)
         return problem
 
+    # Numbers the passages and builds the tables used by the packed states, then packs the initial state
+    def _pack_layout(self) -> None:
+        self.cells = tuple(sorted(self.passages, key=lambda position: (position.y, position.x)))
+        self.indices = {position: index for index, position in enumerate(self.cells)}
+        self.neighbors = tuple(
+            tuple(self.indices.get(position + direction.to_vector(), -1) for direction in Direction)
+            for position in self.cells
+        )
+        self.car_count = len(self.cars)
+        self.cell_bits = max(1, (len(self.cells) - 1).bit_length())
+        self.occupancy_shift = self.cell_bits * self.car_count
+        goal = {index: position for position, index in self.slots.items()}
+        cars = range(self.car_count)
+        self.goal_state = self.pack(tuple(goal[i] for i in cars)) if all(i in goal for i in cars) else -1
+        self.cars = self.pack(self.cars)
+
     # Read a parking problem from file containing a grid of tiles
     @staticmethod
-    def from_file(path: str) -> 'ParkingProblem':
+    def from_file(path: str, packed: bool = False, zobrist: bool = False) -> 'ParkingProblem':
         with open(path, 'r') as f:
-            return ParkingProblem.from_text(f.read())
+            return ParkingProblem.from_text(f.read(), packed, zobrist)
     
\ No newline at end of file
@@ -0,0 +1,58 @@
+from typing import Callable, List, Tuple
+from problem import Solution
+from parking import ParkingProblem
+import argparse, glob, time
+
+# This benchmark compares the two state representations of the parking problem (see parking.py):
+#   - "tuple": the states are tuples of points and a collision check searches the tuple
+#   - "packed": the states are integers holding the cell index of each car and an occupancy bitboard
+# For each parking lot and search algorithm, it reports the expanded nodes, the wall time and the expansions per second.
+# Both representations generate the actions in the same order, so they should expand the same nodes and return the same path.
+
+SEARCHES = ("bfs", "dfs", "ucs")
+
+def get_search(name: str) -> Callable[..., Solution]:
+    from search import BreadthFirstSearch, DepthFirstSearch, UniformCostSearch
+    return {"bfs": BreadthFirstSearch, "dfs": DepthFirstSearch, "ucs": UniformCostSearch}[name]
+
+# Runs the search on a fresh problem "repeat" times and returns the solution, the expanded nodes (per run) and the total time
+# The expansions are counted by wrapping get_actions on the problem instance so that both representations pay the same overhead
+def run(path: str, packed: bool, search_name: str, repeat: int) -> Tuple[Solution, int, float]:
+    search_fn = get_search(search_name)
+    solution, expanded, elapsed = None, 0, 0
+    for _ in range(repeat):
+        problem = ParkingProblem.from_file(path, packed)
+        calls: List[int] = [0]
+        get_actions = problem.get_actions
+        def counting_get_actions(state):
+            calls[0] += 1
+            return get_actions(state)
+        problem.get_actions = counting_get_actions
+        start = time.perf_counter()
+        solution = search_fn(problem, problem.get_initial_state())
+        elapsed += time.perf_counter() - start
+        expanded = calls[0]
+    return solution, expanded, elapsed
+
+def main(args: argparse.Namespace):
+    print(f"{'park':<20}{'search':<8}{'state':<8}{'expanded':>10}{'time (s)':>12}{'expansions/s':>14}{'speedup':>9}")
+    for park in sorted(glob.glob(args.parks)):
+        for search_name in args.searches:
+            baseline = None
+            for name, packed in (("tuple", False), ("packed", True)):
+                solution, expanded, elapsed = run(park, packed, search_name, args.repeat)
+                rate = expanded * args.repeat / max(elapsed, 1e-9)
+                if baseline is None:
+                    baseline = (solution, rate)
+                    speedup = ""
+                else:
+                    speedup = f"x{rate / max(baseline[1], 1e-9):.2f}"
+                    if solution != baseline[0]: speedup += " (DIFFERENT SOLUTION)"
+                print(f"{park:<20}{search_name:<8}{name:<8}{expanded:>10}{elapsed:>12.3f}{rate:>14.0f}{speedup:>9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the tuple and packed state representations on parking problems")
+    parser.add_argument("--parks", "-p", default="parks/*.txt", help="a glob pattern for the parking lots to run")
+    parser.add_argument("--searches", "-s", nargs="+", default=["bfs", "ucs"], choices=SEARCHES, help="the search algorithms to run")
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="the number of runs of each search (the small lots need several runs to be timed)")
+    main(parser.parse_args())
@@ -0,0 +1,134 @@
+from typing import Dict, List, Tuple
+import argparse, glob, time
+
+from parking import AnyParkingState, ParkingProblem, ZobristParkingState
+from mathutils import Direction, Point
+
+# This file contains admissible and consistent heuristics for the parking problem
+#
+# distance_heuristic: the sum over the cars of (the cost of moving the car) x (the distance from the car to its slot)
+#   The distances are computed once per problem via BFS from each slot over the passages (ignoring the other cars).
+#   A move of car 'i' costs cost(i) and changes its distance by at most 1 (and does not change the others), so the heuristic is consistent.
+#
+# blocking_heuristic: distance_heuristic plus 2 x cost(j) for every car 'j' that is parked in its own slot
+#   while its slot separates another car 'i' from the slot of 'i' (every path of car 'i' goes through the slot of car 'j').
+#   Car 'j' has to leave its slot and come back, which is 2 moves of car 'j' that distance_heuristic does not count (its distance is 0),
+#   so the bonus is admissible and the bonuses of the different cars add up. It is also consistent:
+#     - if car 'j' leaves its slot, the heuristic decreases by 2 x cost(j) - cost(j) = cost(j) which is the cost of the move
+#     - a car 'i' that moves without entering its slot stays on the same side of the slot of 'j'
+#       (2 adjacent cells are connected even after removing another cell), so the bonuses do not change
+#     - a car that enters its slot can only add a bonus
+#
+# The heuristics accept both state representations (tuples of points and packed states, see parking.py).
+# For packed states, the tables are indexed by the cell indices of the problem instead of the points.
+
+UNREACHABLE = float('inf')
+
+# Returns the position of every car (points for tuple states and cell indices for packed states)
+def car_positions(problem: ParkingProblem, state: AnyParkingState) -> Tuple:
+    if isinstance(state, ZobristParkingState): state = state.packed
+    if isinstance(state, int):
+        mask = (1 << problem.cell_bits) - 1
+        return tuple(state >> (i * problem.cell_bits) & mask for i in range(problem.car_count))
+    return state
+
+# The tables used by the heuristics, computed once per problem and stored in problem.cache()
+class ParkingTables:
+    def __init__(self, problem: ParkingProblem) -> None:
+        packed = not isinstance(problem.get_initial_state(), tuple)
+        car_count = problem.car_count if packed else len(problem.cars)
+        # A car moves in any direction with the same cost, so the direction of this action does not matter
+        self.costs = [problem.get_cost(problem.get_initial_state(), (i, Direction.RIGHT)) for i in range(car_count)]
+        slots = {index: position for position, index in problem.slots.items()}
+        key = (lambda position: problem.indices[position]) if packed else (lambda position: position)
+        # distances[i][cell] is the distance from the cell to the slot of car 'i' (missing cells cannot reach it)
+        self.distances: List[Dict] = []
+        # separated[j][i] is the set of cells from which car 'i' cannot reach its slot if the slot of car 'j' is blocked
+        self.separated: List[Dict[int, frozenset]] = []
+        point_distances = [{} if slots.get(i) is None else bfs(problem.passages, slots[i]) for i in range(car_count)]
+        for i in range(car_count):
+            self.distances.append({key(position): distance for position, distance in point_distances[i].items()})
+        for j in range(car_count):
+            separated = {}
+            blocked = slots.get(j)
+            if blocked is not None:
+                for i in range(car_count):
+                    if i == j or slots.get(i) is None: continue
+                    reachable = bfs(problem.passages, slots[i], blocked)
+                    cut = frozenset(key(position) for position in point_distances[i] if position != blocked and position not in reachable)
+                    if cut: separated[i] = cut
+            self.separated.append(separated)
+
+# Runs BFS from the source over the passages (skipping the blocked cell) and returns the distance of every reached passage
+def bfs(passages, source: Point, blocked: Point = None) -> Dict[Point, int]:
+    distances = {source: 0}
+    frontier = [source]
+    while frontier:
+        next_frontier = []
+        for position in frontier:
+            distance = distances[position] + 1
+            for direction in Direction:
+                neighbor = position + direction.to_vector()
+                if neighbor in passages and neighbor != blocked and neighbor not in distances:
+                    distances[neighbor] = distance
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return distances
+
+def get_tables(problem: ParkingProblem) -> ParkingTables:
+    cache = problem.cache()
+    tables = cache.get("parking_tables")
+    if tables is None:
+        tables = cache["parking_tables"] = ParkingTables(problem)
+    return tables
+
+# The cost-weighted sum of the distances from the cars to their slots
+def distance_heuristic(problem: ParkingProblem, state: AnyParkingState) -> float:
+    tables = get_tables(problem)
+    total = 0
+    for cost, distances, position in zip(tables.costs, tables.distances, car_positions(problem, state)):
+        total += cost * distances.get(position, UNREACHABLE)
+    return total
+
+# The distance heuristic plus the cost of moving the parked cars that block the other cars out of their slots and back
+def blocking_heuristic(problem: ParkingProblem, state: AnyParkingState) -> float:
+    tables = get_tables(problem)
+    positions = car_positions(problem, state)
+    total = 0
+    for j, (cost, distances, position) in enumerate(zip(tables.costs, tables.distances, positions)):
+        distance = distances.get(position, UNREACHABLE)
+        total += cost * distance
+        if distance == 0 and any(positions[i] in cut for i, cut in tables.separated[j].items()):
+            total += 2 * cost
+    return total
+
+HEURISTICS = {"distance": distance_heuristic, "blocking": blocking_heuristic}
+
+# Compares uniform cost search with A* using each heuristic on the parking lots
+def main(args: argparse.Namespace):
+    from search import UniformCostSearch, AStarSearch
+    print(f"{'park':<20}{'search':<16}{'cost':>8}{'expanded':>10}{'time (s)':>10}")
+    for park in sorted(glob.glob(args.parks)):
+        runs = [("ucs", None)] + [(f"astar-{name}", heuristic) for name, heuristic in HEURISTICS.items()]
+        for name, heuristic in runs:
+            problem = ParkingProblem.from_file(park, args.packed)
+            calls = [0]
+            get_actions = problem.get_actions
+            def counting_get_actions(state):
+                calls[0] += 1
+                return get_actions(state)
+            problem.get_actions = counting_get_actions
+            start = time.perf_counter()
+            if heuristic is None:
+                path = UniformCostSearch(problem, problem.get_initial_state())
+            else:
+                path = AStarSearch(problem, problem.get_initial_state(), heuristic)
+            elapsed = time.perf_counter() - start
+            cost = "-" if path is None else sum(problem.get_cost(None, action) for action in path)
+            print(f"{park:<20}{name:<16}{cost:>8}{calls[0]:>10}{elapsed:>10.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare uniform cost search with A* using the parking heuristics")
+    parser.add_argument("--parks", "-p", default="parks/*.txt", help="a glob pattern for the parking lots to run")
+    parser.add_argument("--packed", action="store_true", default=False, help="use the packed state representation")
+    main(parser.parse_args())
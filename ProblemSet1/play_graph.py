@@ -4,6 +4,16 @@ from agents import HumanAgent, UninformedSearchAgent, InformedSearchAgent
 from helpers.utils import fetch_recorded_calls
 import argparse, os, json
 
+# Return the heuristic selected by the user
+def get_heuristic(name: str):
+    if name == "euclidean":
+        return graphrouting_heuristic
+    if name == "landmarks":
+        from graph_landmarks import landmark_heuristic
+        return landmark_heuristic
+    print(f"Requested Heuristic '{name}' is invalid")
+    exit(-1)
+
 # Create an agent based on the user selections
 def create_agent(args: argparse.Namespace):
     agent_type: str = args.agent
@@ -26,21 +36,40 @@ def create_agent(args: argparse.Namespace):
                 else:
                     print("Invalid Action")
         return HumanAgent(graph_user_action)
+    # If desired by the user, the search agents search the CSR version of the graph (see graph_csr.py)
+    # and its solution is converted back into graph nodes
+    search_backend = lambda search_fn: search_fn
+    if args.csr:
+        from graph_csr import csr_search
+        search_backend = csr_search
     if agent_type == "bfs":
         from search import BreadthFirstSearch
-        return UninformedSearchAgent(BreadthFirstSearch)
+        return UninformedSearchAgent(search_backend(BreadthFirstSearch))
     if agent_type == "dfs":
         from search import DepthFirstSearch
-        return UninformedSearchAgent(DepthFirstSearch)
+        return UninformedSearchAgent(search_backend(DepthFirstSearch))
+    if agent_type == "ids":
+        from search import IterativeDeepeningSearch
+        return UninformedSearchAgent(search_backend(IterativeDeepeningSearch))
     if agent_type == "ucs":
         from search import UniformCostSearch
-        return UninformedSearchAgent(UniformCostSearch)
+        return UninformedSearchAgent(search_backend(UniformCostSearch))
     if agent_type == "astar":
         from search import AStarSearch
-        return InformedSearchAgent(AStarSearch, graphrouting_heuristic)
+        return InformedSearchAgent(search_backend(AStarSearch), get_heuristic(args.heuristic))
+    if agent_type == "bidijkstra":
+        from graph_bidirectional import BidirectionalDijkstraSearch
+        return UninformedSearchAgent(BidirectionalDijkstraSearch)
+    if agent_type == "biastar":
+        from graph_bidirectional import BidirectionalAStarSearch
+        return InformedSearchAgent(BidirectionalAStarSearch, get_heuristic(args.heuristic))
+    if agent_type == "ch":
+        from graph_ch import make_ch_search
+        # The hierarchy is loaded from the sidecar of the graph file (it is only built if the sidecar is missing or stale)
+        return UninformedSearchAgent(make_ch_search(args.graph))
     if agent_type == "gbfs":
         from search import BestFirstSearch
-        return InformedSearchAgent(BestFirstSearch, graphrouting_heuristic)
+        return InformedSearchAgent(search_backend(BestFirstSearch), get_heuristic(args.heuristic))
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -100,8 +129,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Graph as Human or AI")
     parser.add_argument("graph", help="path to the graph to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'dfs', 'ids', 'ucs', 'astar', 'bidijkstra', 'biastar', 'ch', 'gbfs'],
                         help="the agent that will play the game")
+    parser.add_argument("--csr", action="store_true", default=False,
+                        help="Search over the compact (CSR) graph representation (only for bfs, dfs, ids, ucs, astar and gbfs)")
+    parser.add_argument("--heuristic", '-hf', default="euclidean",
+                        choices=["euclidean", "landmarks"],
+                        help="choose the heuristic to use with A* or Greedy Best First Search")
 
     args = parser.parse_args()
     try:
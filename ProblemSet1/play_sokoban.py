@@ -3,7 +3,7 @@ from sokoban import SokobanProblem, Direction, SokobanState, SokobanTile
 from agents import HumanAgent, UninformedSearchAgent, InformedSearchAgent
 from helpers.utils import fetch_tracked_call_count
 from helpers.heuristic_checks import test_heuristic_consistency
-from functools import lru_cache
+from helpers.cache import memoize_heuristic
 import argparse, time
 
 def colored_sokoban(level: str):
@@ -27,6 +27,12 @@ def get_heuristic(name: str):
     if name == "strong":
         from sokoban_heuristic import strong_heuristic
         return strong_heuristic
+    if name == "pdb":
+        from sokoban_pdb import pdb_heuristic
+        return pdb_heuristic
+    if name == "pdb3":
+        from sokoban_pdb import make_pdb_heuristic
+        return make_pdb_heuristic((2, 3))
     print(f"Requested Heuristic '{name}' is invalid")
     exit(-1)
 
@@ -50,31 +56,59 @@ def create_agent(args: argparse.Namespace):
                 else:
                     print("Invalid Action")
         return HumanAgent(sokoban_user_action)
+    # If desired by the user, the search agents search the push-level problem (see sokoban_push.py)
+    # and its solution is expanded back into player steps
+    search_level = lambda search_fn: search_fn
+    searched_problem = SokobanProblem
+    if args.pushes:
+        from sokoban_push import SokobanPushProblem, push_level_search
+        search_level = push_level_search
+        searched_problem = SokobanPushProblem
     if agent_type == "bfs":
         from search import BreadthFirstSearch
-        return UninformedSearchAgent(BreadthFirstSearch)
+        return UninformedSearchAgent(search_level(BreadthFirstSearch))
     if agent_type == "dfs":
         from search import DepthFirstSearch
-        return UninformedSearchAgent(DepthFirstSearch)
+        return UninformedSearchAgent(search_level(DepthFirstSearch))
+    if agent_type == "ids":
+        from search import IterativeDeepeningSearch
+        return UninformedSearchAgent(search_level(IterativeDeepeningSearch))
     if agent_type == "ucs":
         from search import UniformCostSearch
-        return UninformedSearchAgent(UniformCostSearch)
+        return UninformedSearchAgent(search_level(UniformCostSearch))
     if agent_type == "astar":
         from search import AStarSearch
-        # We cache the heuristic calls to speed up the search process if the heuristic is not fast
-        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        # We cache the heuristic calls (in a bounded cache region of the problem) to speed up the search process if the heuristic is not fast
+        heuristic = memoize_heuristic(get_heuristic(args.heuristic), policy=args.cache_policy, max_entries=args.cache_size)
         # If desired by the user, we track every transition and check for the heuristic consistency for each transition
         if args.checks:
-            SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
-        return InformedSearchAgent(AStarSearch, heuristic)
+            searched_problem.get_successor = test_heuristic_consistency(heuristic)(searched_problem.get_successor)
+        return InformedSearchAgent(search_level(AStarSearch), heuristic)
+    if agent_type in ("idastar", "smastar"):
+        from search import IterativeDeepeningAStarSearch, SMAStarSearch
+        search_fn = IterativeDeepeningAStarSearch if agent_type == "idastar" else SMAStarSearch
+        # The memory-bounded searches receive the memory budget (in nodes) selected by the user
+        budgeted_search = lambda problem, state, heuristic: search_fn(problem, state, heuristic, memory_limit=args.memory)
+        heuristic = memoize_heuristic(get_heuristic(args.heuristic), policy=args.cache_policy, max_entries=args.cache_size)
+        if args.checks:
+            searched_problem.get_successor = test_heuristic_consistency(heuristic)(searched_problem.get_successor)
+        return InformedSearchAgent(search_level(budgeted_search), heuristic)
+    if agent_type == "arastar":
+        from search import AnytimeAStarSearch
+        # The anytime search starts with the weight selected by the user and stops at the optimal solution or at the deadline
+        anytime_search = lambda problem, state, heuristic: AnytimeAStarSearch(problem, state, heuristic, weight=args.weight, deadline=args.deadline)
+        heuristic = memoize_heuristic(get_heuristic(args.heuristic), policy=args.cache_policy, max_entries=args.cache_size)
+        if args.checks:
+            searched_problem.get_successor = test_heuristic_consistency(heuristic)(searched_problem.get_successor)
+        return InformedSearchAgent(search_level(anytime_search), heuristic)
     if agent_type == "gbfs":
         from search import BestFirstSearch
-        # We cache the heuristic calls to speed up the search process if the heuristic is not fast
-        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        # We cache the heuristic calls (in a bounded cache region of the problem) to speed up the search process if the heuristic is not fast
+        heuristic = memoize_heuristic(get_heuristic(args.heuristic), policy=args.cache_policy, max_entries=args.cache_size)
         # If desired by the user, we track every transition and check for the heuristic consistency for each transition
         if args.checks:
-            SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
-        return InformedSearchAgent(BestFirstSearch, heuristic)
+            searched_problem.get_successor = test_heuristic_consistency(heuristic)(searched_problem.get_successor)
+        return InformedSearchAgent(search_level(BestFirstSearch), heuristic)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -82,7 +116,7 @@ def main(args: argparse.Namespace):
     state_printer = lambda state: print(state)
     if args.ansicolors: state_printer = lambda state: print(colored_sokoban(str(state)))
     start = time.time() # Track run time
-    problem = SokobanProblem.from_file(args.level) # create the problem
+    problem = SokobanProblem.from_file(args.level, args.packed, args.deadlocks) # create the problem
     state = problem.get_initial_state() # Get the initial state
     print("Initial State:")
     state_printer(state)
@@ -117,6 +151,8 @@ def main(args: argparse.Namespace):
     # This was a search agent, display the number of traversed nodes
     if not isinstance(agent, HumanAgent):
         print(f"Search explored {total_explored_nodes} nodes")
+        for stats in problem.cache_stats().values():
+            print(f"Cache {stats}")
     # Finally print the elapsed time for the whole process
     print(f"Elapsed time: {time.time() - start} seconds")
 
@@ -126,11 +162,27 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Sokoban as Human or AI")
     parser.add_argument("level", help="path to the sokoban level to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'dfs', 'ids', 'ucs', 'astar', 'idastar', 'smastar', 'arastar', 'gbfs'],
                         help="the agent that will play the game")
     parser.add_argument("--heuristic", '-hf', default="zero",
-                        choices=["zero", "weak", "strong"],
+                        choices=["zero", "weak", "strong", "pdb", "pdb3"],
                         help="choose the heuristic to use with A* or Greedy Best First Search")
+    parser.add_argument("--memory", "-m", type=int, default=2**16,
+                        help="the maximum number of nodes held in memory by IDA* and SMA*")
+    parser.add_argument("--weight", "-w", type=float, default=3.0,
+                        help="the initial weight of the heuristic in the anytime A* (ARA*)")
+    parser.add_argument("--deadline", "-t", type=float, default=None,
+                        help="the time limit of the anytime A* (ARA*) in seconds")
+    parser.add_argument("--cache-policy", default="lru", choices=["lru", "clock"],
+                        help="the eviction policy of the heuristic cache")
+    parser.add_argument("--cache-size", type=int, default=2**16,
+                        help="the maximum number of heuristic values held in the heuristic cache")
+    parser.add_argument("--packed", "-p", action="store_true", default=False,
+                        help="Use the packed state representation (cell indices and crate bitboards)")
+    parser.add_argument("--deadlocks", "-dl", action="store_true", default=False,
+                        help="Prune the pushes that lead to dead squares or freeze deadlocks")
+    parser.add_argument("--pushes", "-pu", action="store_true", default=False,
+                        help="Search over crate pushes instead of player steps (solutions are optimal in pushes, use the strong heuristic)")
     parser.add_argument("--checks", "-c", action='store_true', default=False,
                         help="Enable consistency checks for the heuristic")
     parser.add_argument("--ansicolors", "-ac", action="store_true",
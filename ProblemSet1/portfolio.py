@@ -0,0 +1,188 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+import argparse, multiprocessing, queue, time, traceback
+
+from problem import Problem, Solution, S, A
+
+# This file contains a portfolio runner which runs several search algorithms on the same problem in parallel
+# Each member of the portfolio runs in its own process (a pool cannot cancel a running task, so every member gets a process that can be terminated).
+# The processes are forked, so the problem, the search functions and the heuristics are inherited and do not need to be picklable
+# (only the solutions are sent back through a queue). On platforms without fork, they must be picklable.
+#
+# In the "first" mode, the first solution found is returned and the other members are cancelled.
+# In the "best" mode, the runner waits for all the members (or the deadline) and returns the solution with the lowest cost.
+# Every member counts its expansions (the calls to get_actions) in a shared array, so the counts of the cancelled members are reported too.
+
+# A member of the portfolio: a search function and the extra arguments passed after the initial state (e.g. a heuristic)
+@dataclass
+class PortfolioMember:
+    name: str
+    search_fn: Callable[..., Solution]
+    args: Tuple[Any, ...] = ()
+
+# The outcome of a member:
+#   status is one of "solved", "no solution", "cancelled" (stopped after the portfolio had a result),
+#   "timeout" (stopped at the deadline) or "error" (the search raised an exception, see "error")
+@dataclass
+class WorkerReport:
+    name: str
+    status: str
+    expansions: int
+    time: float
+    cost: Optional[float] = None
+    error: Optional[str] = None
+
+@dataclass
+class PortfolioResult:
+    winner: Optional[str]           # the name of the member whose solution was returned
+    solution: Solution
+    cost: Optional[float]
+    reports: List[WorkerReport] = field(default_factory=list)
+
+# Returns the cost of applying the solution from the given state
+def solution_cost(problem: Problem[S, A], initial_state: S, solution: Solution) -> float:
+    cost, state = 0, initial_state
+    for action in solution:
+        cost += problem.get_cost(state, action)
+        state = problem.get_successor(state, action)
+    return cost
+
+# The body of a worker process: runs the search while counting the expansions in counters[index], then sends the outcome
+def _run_member(problem: Problem[S, A], initial_state: S, member: PortfolioMember, index: int, counters, results) -> None:
+    get_actions = problem.get_actions
+    def counting_get_actions(state):
+        counters[index] += 1
+        return get_actions(state)
+    problem.get_actions = counting_get_actions
+    start = time.perf_counter()
+    try:
+        solution = member.search_fn(problem, initial_state, *member.args)
+        elapsed = time.perf_counter() - start
+        problem.get_actions = get_actions
+        if solution is None:
+            results.put((index, "no solution", None, None, elapsed, None))
+        else:
+            results.put((index, "solved", list(solution), solution_cost(problem, initial_state, solution), elapsed, None))
+    except Exception:
+        results.put((index, "error", None, None, time.perf_counter() - start, traceback.format_exc()))
+
+# Runs the portfolio members on the problem and returns the selected solution with a report for every member
+# If deadline (in seconds) is given, the members that are still running when it expires are stopped
+def run_portfolio(problem: Problem[S, A], members: List[PortfolioMember], initial_state: Optional[S] = None,
+                  deadline: Optional[float] = None, mode: str = "first") -> PortfolioResult:
+    if mode not in ("first", "best"):
+        raise ValueError(f"Unknown portfolio mode '{mode}', expected 'first' or 'best'")
+    if initial_state is None:
+        initial_state = problem.get_initial_state()
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    counters = context.RawArray('q', len(members))
+    results = context.Queue()
+    processes = [
+        context.Process(target=_run_member, args=(problem, initial_state, member, index, counters, results), daemon=True)
+        for index, member in enumerate(members)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    reports: List[Optional[WorkerReport]] = [None] * len(members)
+    best: Optional[Tuple[float, int, Solution]] = None
+    expired = False
+
+    def receive(block: bool, timeout: Optional[float]) -> bool:
+        nonlocal best
+        try:
+            index, status, solution, cost, elapsed, error = results.get(block, timeout)
+        except queue.Empty:
+            return False
+        reports[index] = WorkerReport(members[index].name, status, counters[index], elapsed, cost, error)
+        if status == "solved" and (best is None or cost < best[0]):
+            best = (cost, index, solution)
+        return True
+
+    while any(report is None for report in reports):
+        remaining = None if deadline is None else deadline - (time.perf_counter() - start)
+        if remaining is not None and remaining <= 0:
+            expired = True
+            break
+        receive(True, remaining)
+        if mode == "first" and best is not None:
+            break
+    # Collect the outcomes that arrived in the meantime before stopping the other members
+    while receive(False, None): pass
+    stopped_at = time.perf_counter() - start
+    for index, process in enumerate(processes):
+        if reports[index] is None:
+            process.terminate()
+            reports[index] = WorkerReport(members[index].name, "timeout" if expired else "cancelled", counters[index], stopped_at)
+    for process in processes:
+        process.join()
+    if best is None:
+        return PortfolioResult(None, None, None, reports)
+    cost, index, solution = best
+    return PortfolioResult(members[index].name, solution, cost, reports)
+
+# Returns the default portfolio of each domain
+def default_members(domain: str) -> List[PortfolioMember]:
+    from search import UniformCostSearch, AStarSearch, BestFirstSearch, IterativeDeepeningAStarSearch
+    if domain == "sokoban":
+        from sokoban_heuristic import strong_heuristic
+        return [
+            PortfolioMember("astar", AStarSearch, (strong_heuristic,)),
+            PortfolioMember("gbfs", BestFirstSearch, (strong_heuristic,)),
+            PortfolioMember("idastar", IterativeDeepeningAStarSearch, (strong_heuristic,)),
+            PortfolioMember("ucs", UniformCostSearch),
+        ]
+    if domain == "parking":
+        from parking_heuristic import blocking_heuristic
+        return [
+            PortfolioMember("astar", AStarSearch, (blocking_heuristic,)),
+            PortfolioMember("gbfs", BestFirstSearch, (blocking_heuristic,)),
+            PortfolioMember("idastar", IterativeDeepeningAStarSearch, (blocking_heuristic,)),
+            PortfolioMember("ucs", UniformCostSearch),
+        ]
+    from graph import graphrouting_heuristic
+    from graph_bidirectional import BidirectionalDijkstraSearch
+    return [
+        PortfolioMember("astar", AStarSearch, (graphrouting_heuristic,)),
+        PortfolioMember("gbfs", BestFirstSearch, (graphrouting_heuristic,)),
+        PortfolioMember("bidijkstra", BidirectionalDijkstraSearch),
+        PortfolioMember("ucs", UniformCostSearch),
+    ]
+
+def load_problem(domain: str, path: str) -> Problem:
+    if domain == "sokoban":
+        from sokoban import SokobanProblem
+        return SokobanProblem.from_file(path)
+    if domain == "parking":
+        from parking import ParkingProblem
+        return ParkingProblem.from_file(path)
+    from graph import GraphRoutingProblem
+    return GraphRoutingProblem.from_file(path)
+
+def main(args: argparse.Namespace):
+    problem = load_problem(args.domain, args.problem)
+    members = default_members(args.domain)
+    if args.members:
+        members = [member for member in members if member.name in args.members]
+    start = time.time()
+    result = run_portfolio(problem, members, deadline=args.deadline, mode=args.mode)
+    elapsed = time.time() - start
+    print(f"{'member':<12}{'status':<14}{'expanded':>10}{'time (s)':>10}{'cost':>12}")
+    for report in result.reports:
+        cost = "-" if report.cost is None else f"{report.cost:.4g}"
+        print(f"{report.name:<12}{report.status:<14}{report.expansions:>10}{report.time:>10.3f}{cost:>12}")
+        if report.error: print(report.error)
+    if result.solution is None:
+        print(f"No solution found in {elapsed:.3f}s")
+    else:
+        print(f"Winner: {result.winner} with cost {result.cost:.4g} ({len(result.solution)} actions) in {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a portfolio of search algorithms in parallel on a problem")
+    parser.add_argument("problem", help="path to the problem file")
+    parser.add_argument("--domain", "-d", default="sokoban", choices=["sokoban", "parking", "graph"], help="the domain of the problem")
+    parser.add_argument("--members", nargs="+", help="the names of the portfolio members to run (all by default)")
+    parser.add_argument("--mode", default="first", choices=["first", "best"],
+                        help="return the first solution or the best solution found before the deadline")
+    parser.add_argument("--deadline", "-t", type=float, default=None, help="the time limit in seconds")
+    main(parser.parse_args())
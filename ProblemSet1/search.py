@@ -1,10 +1,15 @@
 from problem import HeuristicFunction, Problem, S, A, Solution
 from collections import deque
 from helpers.utils import NotImplemented
+from search_nodes import NodeArena
+from indexed_heap import IndexedHeap
+from search_stats import SearchStatistics
+from transposition_table import TranspositionTable
+from typing import Iterator, NamedTuple, Optional, Set, Union
 
-from queue import PriorityQueue
 import itertools
 import heapq
+import time
 
 # All search functions take a problem and a state
 # If it is an informed search function, it will also receive a heuristic function
@@ -14,24 +19,40 @@ import heapq
 # 1. A list of actions which represent the path from the initial state to the final state
 # 2. None if there is no solution
 
-def BreadthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
+# The breadth first, uniform cost, A* and best first searches store their search trees in a NodeArena (see search_nodes.py)
+# So each frontier entry holds the index of its node in the arena instead of the list of actions done so far,
+# and the path is rebuilt from the arena only once when the goal is found
+
+# Every search also takes an optional statistics collector ("stats", see search_stats.py)
+# When it is given, the search runs on an instrumented version of the problem (and the heuristic)
+# and reports the size of its frontier after each expansion
+
+# The breadth first, uniform cost, A* and best first searches also take the container of their explored states ("explored")
+# It is a new set by default, a TranspositionTable (see transposition_table.py) can be given instead to store 8 bytes per explored state
+ExploredSet = Union[Set[S], TranspositionTable]
+
+def BreadthFirstSearch(problem: Problem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None,
+                       explored: Optional[ExploredSet] = None) -> Solution:
+    if stats is not None:
+        problem, _ = stats.instrument(problem, initial_state)
     
     # returninig an empty list in case if the goal is the initial state
     if problem.is_goal(initial_state):          
             return []               
         
-    visited = set()
+    visited = set() if explored is None else explored
     frontier = deque()
     
-    # In order to track the actions' path taken by the search, i need with each state to save it's current actions list                        
-    # Each frontier entry is (state, actions_done_so_far)
+    # In order to track the actions' path taken by the search, i need with each state to save the node that reached it
+    # Each frontier entry is (state, node_index_in_the_arena)
+    nodes = NodeArena()
     
-    frontier.append((initial_state, []))
+    frontier.append((initial_state, nodes.add_root()))
     
     while frontier:
                 
         # FIFO queue
-        curr_state, curr_actions = frontier.popleft()      
+        curr_state, curr_node = frontier.popleft()      
         
         if curr_state in visited:
             continue
@@ -47,90 +68,140 @@ def BreadthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
             if new_state in visited:    
                 continue                    
             
-            # append the last action to actions_list to get the  new_actions_list 
-            new_actions = curr_actions + [action]  
+            # store the new node (its parent and the last action) in the arena
+            new_node = nodes.add(curr_node, action)  
             
             # Early check of goal to decrease the complexity from O(b^(d+1)) to O(b^(d))
             if problem.is_goal(new_state):
-                return new_actions               
+                return nodes.path(new_node)               
 
             # new state that has not visited before will be appended in the frontier
-            # with all actions taken to get the this state
-            frontier.append((new_state, new_actions))     
+            # with the node from which all actions taken to get the this state can be retrieved
+            frontier.append((new_state, new_node))     
+        if stats is not None: stats.frontier(len(frontier))
     return None
 
-def DepthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
+def DepthFirstSearch(problem: Problem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None) -> Solution:
     """
     Depth-dirst search explore by going deep for each path before backtrack
     keep track of visited to avoid loops and returns actions to our goal
     """
-    # create shared variables so they exist in all recursive calls
-    if not hasattr(DepthFirstSearch, "visited"):
-        DepthFirstSearch.visited = set()
-    if not hasattr(DepthFirstSearch, "path"):
-        DepthFirstSearch.path = []
-    current = initial_state
-    #stop searching if we have reached our goal
-    if problem.is_goal(current):
-        result_path = DepthFirstSearch.path.copy()
-        #clean up static variables before return
-        DepthFirstSearch.visited.clear()
-        DepthFirstSearch.path.clear()
-        return result_path
-    # mark the current state to avoid revisit
-    DepthFirstSearch.visited.add(current)
-    # try every possible action from this state
-    for action in problem.get_actions(current):
-        next_state = problem.get_successor(current, action)
-        # skip states we hve already explored
-        if next_state in DepthFirstSearch.visited:
-            continue
-        # save this step in our current path
-        DepthFirstSearch.path.append(action)
-        # go deeper to the next state
-        result = DepthFirstSearch(problem, next_state)
-        # if we found a valid path return it
-        if result is not None:
-            return result
-        # otherwise undo this step -> backtrack
-        DepthFirstSearch.path.pop()
-    # If we are back to the start and found nothing then we do reset everything
-    if current == problem.get_initial_state():
-        DepthFirstSearch.visited.clear()
-        DepthFirstSearch.path.clear()
-    #no path found
+    if stats is not None:
+        problem, _ = stats.instrument(problem, initial_state)
+    solution, _ = _depth_first(problem, initial_state, None, stats)
+    return solution
+
+def DepthLimitedSearch(problem: Problem[S, A], initial_state: S, limit: int, stats: Optional[SearchStatistics] = None) -> Solution:
+    """
+    Depth-limited search -> a depth first search that does not expand the states at depth "limit"
+    """
+    if stats is not None:
+        problem, _ = stats.instrument(problem, initial_state)
+    solution, _ = _depth_first(problem, initial_state, limit, stats)
+    return solution
+
+def IterativeDeepeningSearch(problem: Problem[S, A], initial_state: S, max_depth: Optional[int] = None,
+                             stats: Optional[SearchStatistics] = None) -> Solution:
+    """
+    Iterative deepening search -> runs depth limited searches with the limits 1, 2, 3, ... until a solution is found
+    so it returns a solution with the fewest actions while only holding the current path in memory
+    it stops when a search is not cut by its limit (there is no solution) or when the limit exceeds "max_depth"
+    """
+    if stats is not None:
+        problem, _ = stats.instrument(problem, initial_state)
+    limit = 1
+    while max_depth is None or limit <= max_depth:
+        solution, cutoff = _depth_first(problem, initial_state, limit, stats)
+        if solution is not None or not cutoff:
+            return solution
+        limit += 1
     return None
 
-    
+# This is the engine of the depth first searches
+# The recursion is replaced by an explicit stack holding the actions iterator of each state on the current path,
+# and the visited states and the path are local to the call, so the search can not hit the recursion limit
+# and several searches can run at the same time (e.g. in different threads)
+# The successors are generated one at a time (when the search returns to their parent), so the states are expanded
+# in the same order as the recursive version: a successor is skipped if it was visited by the time it is generated
+# If "limit" is given, the states at depth "limit" are not expanded and a state reached again by a shorter path is expanded again
+# (otherwise the first long path to a state could hide a short solution). It returns the solution and whether the limit cut the search.
+def _depth_first(problem: Problem[S, A], initial_state: S, limit: Optional[int], stats: Optional[SearchStatistics]) -> "tuple[Solution, bool]":
+    #stop searching if we have reached our goal
+    if problem.is_goal(initial_state):
+        return [], False
+    if limit is not None and limit <= 0:
+        return None, True
+    # visited maps each visited state to the depth where it was entered
+    visited = {initial_state: 0}
+    states = [initial_state]
+    stack = [iter(problem.get_actions(initial_state))]
+    path = []
+    cutoff = False
+    while stack:
+        if stats is not None: stats.frontier(len(stack))
+        state, depth = states[-1], len(path)
+        # try the remaining actions of the state on top of the stack until one leads to an unvisited state
+        for action in stack[-1]:
+            next_state = problem.get_successor(state, action)
+            next_depth = depth + 1
+            # skip states we hve already explored (or, with a limit, explored from a path that is not longer)
+            if limit is None:
+                if next_state in visited:
+                    continue
+            elif visited.get(next_state, next_depth + 1) <= next_depth:
+                continue
+            path.append(action)
+            if problem.is_goal(next_state):
+                return path, cutoff
+            visited[next_state] = next_depth
+            if limit is not None and next_depth >= limit:
+                cutoff = True
+                path.pop()
+                continue
+            # go deeper to the next state
+            states.append(next_state)
+            stack.append(iter(problem.get_actions(next_state)))
+            break
+        else:
+            # all the actions were tried -> backtrack
+            stack.pop()
+            states.pop()
+            if path:
+                path.pop()
+    #no path found
+    return None, cutoff
 
-def UniformCostSearch(problem: Problem[S, A], initial_state: S) -> Solution: 
+def UniformCostSearch(problem: Problem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None,
+                      explored: Optional[ExploredSet] = None) -> Solution: 
+    if stats is not None:
+        problem, _ = stats.instrument(problem, initial_state)
     
     # Counter passed to frontier in order to prioritize
     # early-enqueued states in case of draw in cost
     counter = itertools.count()   
     
-    # queue of the current state and the actions done so far
+    # queue of the current state and its node in the arena (which holds the actions done so far)
     # priority is the accumelated cost to reach to the current node
-    frontier = PriorityQueue()
-    frontier.put((0,next(counter),initial_state, []))
+    # The frontier is an indexed heap which holds every state once and supports decrease-key,
+    # so reaching a state in the frontier from a cheaper path updates its entry instead of adding a duplicate
+    nodes = NodeArena()
+    frontier = IndexedHeap()
+    frontier.push(initial_state, (0, next(counter)), nodes.add_root())
     
     # store visited states to apply graph-search
-    visited = set()
+    visited = set() if explored is None else explored
     
-    while not frontier.empty():        
-        curr_cost, _ , curr_state, curr_actions = frontier.get()
+    while frontier:        
+        curr_state, (curr_cost, _), curr_node = frontier.pop()
         
         # Here goal check cannot be before adding to the frontier as in bfs,
         # because we could get to the same state from different path with lower cost
         # which will be visited before the higher-cost one
         if problem.is_goal(curr_state):
-            return curr_actions
-        
-        # don't process previously visited states
-        if curr_state in visited:
-            continue
+            return nodes.path(curr_node)
         
         # Marking state as visited
+        # (No need to skip previously visited states here since the frontier never holds stale duplicates)
         visited.add(curr_state)
         
         # Expand state
@@ -140,38 +211,46 @@ def UniformCostSearch(problem: Problem[S, A], initial_state: S) -> Solution:
             if new_state in visited:
                 continue
             
-            new_actions = curr_actions + [action]
-            
             # The new here is the cost calculation, as the UCS proritize on accumelated cost
             # from the path beggining till reaching the current state
+            # If the state is already in the frontier, it is only updated if the new path is cheaper.
+            # Ties keep the old entry since it was enqueued earlier (same as comparing the counters)
             action_cost = problem.get_cost(curr_state, action)
-            frontier.put((curr_cost + action_cost, next(counter), new_state, new_actions))
+            priority = (curr_cost + action_cost, next(counter))
+            if new_state in frontier and not priority < frontier.priority(new_state):
+                continue
+            new_node = nodes.add(curr_node, action, curr_cost + action_cost)
+            frontier.push(new_state, priority, new_node)
+        if stats is not None: stats.frontier(len(frontier))
             
     return None
 
-def AStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction) -> Solution:
+def AStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, stats: Optional[SearchStatistics] = None,
+                explored: Optional[ExploredSet] = None) -> Solution:
     """
     A* search -> combines the actual cost until now with heuristic estimate to choose the most good path
     expands nodes based on the lowest estimated total cost f = g + h
     """
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, initial_state, heuristic)
     # if start is our goal
     if problem.is_goal(initial_state):
         return []
-    #pq store tuples of (f_cost, order, current_state, path_taken, g_cost )
-    frontier = []
+    #indexed pq maps each state to its priority (f_cost, order) and its node
+    #the node index refers to the arena which holds the path taken and the g_cost
+    #each state is held once, reaching it again with a lower f_cost decreases its key instead of pushing a duplicate
+    nodes = NodeArena()
+    frontier = IndexedHeap()
     counter = 0
-    heapq.heappush(frontier, (0, counter, initial_state, [], 0))
-    explored = set()
+    frontier.push(initial_state, (0, counter), nodes.add_root())
+    explored = set() if explored is None else explored
     while frontier:
         # pick node with the lowest tot. estimated cost
-        _,_,current, current_path, current_cost = heapq.heappop(frontier)
+        current, _, current_node = frontier.pop()
         # if reached goal return actions
         if problem.is_goal(current):
-            return current_path
-        # skip visited 
-        if current in explored:
-            continue
-        #mark state as visited
+            return nodes.path(current_node)
+        #mark state as visited (popped states are never stale so no need to skip visited ones)
         explored.add(current)
         #check all possible moves from the curr state
         for action in problem.get_actions(current):
@@ -181,38 +260,45 @@ def AStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFu
                 continue
             #compute cost
             step_cost = problem.get_cost(current, action)
-            total_cost = current_cost + step_cost
+            total_cost = nodes.cost(current_node) + step_cost
             est_total = total_cost + heuristic(problem, next_state)
             #push the new state with its estimated priority
+            #if it is already in the frontier, keep the old entry unless the new one is strictly better
             counter += 1
-            heapq.heappush(
-                frontier,
-                (est_total, counter, next_state, current_path + [action], total_cost)
-            )
+            priority = (est_total, counter)
+            if next_state in frontier and not priority < frontier.priority(next_state):
+                continue
+            frontier.push(next_state, priority, nodes.add(current_node, action, total_cost))
+        if stats is not None: stats.frontier(len(frontier))
     # if the queue empty -> no path was found
     return None
 
-def BestFirstSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction) -> Solution:
+def BestFirstSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, stats: Optional[SearchStatistics] = None,
+                    explored: Optional[ExploredSet] = None) -> Solution:
     """
     best first search (greedy) choose the next state to explore based on heuristic estimate
     always expand the state that appears closest to the goal using the heuristic
     """
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, initial_state, heuristic)
     
     #DS
     #frontier: pq min heap to always expand state that looks like the best option
     #visited: set to know explored states & prevent re visit them
+    #nodes: arena storing the search tree to rebuild the path once the goal is reached
     frontier = []
-    visited = set()
-    #heap store tuples of ( heuristic_value,order, current_state, path )
+    visited = set() if explored is None else explored
+    nodes = NodeArena()
+    #heap store tuples of ( heuristic_value,order, current_state, node )
     #'order'ensure tie break when heuristic values equal
     order_counter = 0
-    heapq.heappush(frontier, (heuristic(problem, initial_state), order_counter, initial_state, []))
+    heapq.heappush(frontier, (heuristic(problem, initial_state), order_counter, initial_state, nodes.add_root()))
     while frontier:
         # pick state with the smallest heuristic value
-        _,_,current, path = heapq.heappop(frontier)
+        _,_,current, current_node = heapq.heappop(frontier)
         #if we have reach the goal return actions
         if problem.is_goal(current):
-            return path
+            return nodes.path(current_node)
         # prevent re visit already visited states
         if current in visited:
             continue
@@ -227,6 +313,352 @@ def BestFirstSearch(problem: Problem[S, A], initial_state: S, heuristic: Heurist
             order_counter += 1
             heapq.heappush(
                 frontier,
-                (heuristic(problem, next_state), order_counter, next_state, path + [action])
+                (heuristic(problem, next_state), order_counter, next_state, nodes.add(current_node, action))
             )
-    return None
\ No newline at end of file
+        if stats is not None: stats.frontier(len(frontier))
+    return None
+
+# The following searches are memory-bounded versions of A* for problems where the frontier and the explored set do not fit in memory
+# The budget ("memory_limit") is the maximum number of search nodes held at the same time. For admissible heuristics:
+#   - IDA* returns an optimal solution, or None if the budget is too small to search every path below the optimal cost
+#   - SMA* returns an optimal solution only if the optimal path fits in memory (it is shorter than the budget),
+#     otherwise it can return a worse solution (the best one that fits) or None
+
+def IterativeDeepeningAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                                  memory_limit: int = 2**20, table_size: int = 2**16, stats: Optional[SearchStatistics] = None) -> Solution:
+    """
+    IDA* -> runs a series of depth first searches, each one explores all the states with f = g + h <= bound
+    and the next bound is the minimum f of the states that were not explored (they exceeded the current bound or the memory budget)
+    memory holds only the current path plus a transposition table of at most "table_size" states
+    """
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, initial_state, heuristic)
+    INF = float('inf')
+    if problem.is_goal(initial_state):
+        return []
+    bound = heuristic(problem, initial_state)
+    while bound < INF:
+        next_bound = INF
+        # table: state -> lowest g at which it was entered in this iteration
+        # if a state is reached again with the same or higher g, its subtree was already searched with a bigger budget
+        table = {initial_state: 0}
+        # the explicit stack holds a frame (state, g, actions iterator) for each state on the current path
+        # and "actions" holds the actions done along the path (so it is always one shorter than the stack)
+        stack = [(initial_state, 0, iter(problem.get_actions(initial_state)))]
+        on_path = {initial_state}
+        actions = []
+        while stack:
+            state, g, remaining = stack[-1]
+            action = next(remaining, None)
+            # backtrack when all the actions of the top state are tried
+            if action is None:
+                stack.pop()
+                on_path.discard(state)
+                if actions:
+                    actions.pop()
+                continue
+            next_state = problem.get_successor(state, action)
+            # avoid cycles along the current path
+            if next_state in on_path:
+                continue
+            next_g = g + problem.get_cost(state, action)
+            f = next_g + heuristic(problem, next_state)
+            if f > bound:
+                next_bound = min(next_bound, f)
+                continue
+            if problem.is_goal(next_state):
+                return actions + [action]
+            if table.get(next_state, INF) <= next_g:
+                continue
+            # the path can not grow beyond the memory budget, the state is left for the next iteration like the states above the bound
+            if len(stack) >= memory_limit:
+                next_bound = min(next_bound, f)
+                continue
+            # only remember the state if there is room in the table (and the whole budget)
+            if next_state in table or (len(table) < table_size and len(table) + len(stack) < memory_limit):
+                table[next_state] = next_g
+            stack.append((next_state, next_g, iter(problem.get_actions(next_state))))
+            on_path.add(next_state)
+            actions.append(action)
+            if stats is not None: stats.frontier(len(stack))
+        # a state within the bound was cut by the memory budget, so a bigger bound would only find worse solutions
+        if next_bound <= bound:
+            return None
+        bound = next_bound
+    return None
+
+# A node in the search tree of SMA*
+class _SMANode:
+    __slots__ = ("state", "parent", "action", "g", "f", "depth", "actions", "next_action", "children", "forgotten", "version", "in_open")
+
+    def __init__(self, state, parent, action, g: float, f: float, depth: int) -> None:
+        self.state, self.parent, self.action = state, parent, action
+        self.g, self.f, self.depth = g, f, depth
+        self.actions = None         # the list of actions (filled once the node is first expanded)
+        self.next_action = 0        # the index of the first action that was never generated
+        self.children = {}          # action index -> child node (children in memory)
+        self.forgotten = {}         # action index -> backed up f of a child that was removed from memory
+        self.version = 0            # incremented whenever the heap entries of the node become invalid
+        self.in_open = False
+
+    # A node still has successors to generate if some actions were never tried or some children were forgotten
+    def has_pending(self) -> bool:
+        return self.next_action < len(self.actions) or bool(self.forgotten)
+
+def SMAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, memory_limit: int = 2**16,
+                  stats: Optional[SearchStatistics] = None) -> Solution:
+    """
+    SMA* (simplified memory-bounded A*) -> works like A* while there is room in memory
+    it generates one successor at a time, and when the memory is full, it forgets the worst leaf (highest f, shallowest)
+    the parent of a forgotten leaf remembers its f so it can regenerate it later if the rest of the tree turns out worse
+    the f of a node is backed up from its successors to its ancestors once all of them are generated
+    """
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, initial_state, heuristic)
+    INF = float('inf')
+    root = _SMANode(initial_state, None, None, 0, heuristic(problem, initial_state), 0)
+    memory = 1
+    # in_memory: state -> the node with the lowest g that holds the state in memory
+    # a successor is dropped if its state is already in memory with the same or lower g (this also avoids cycles)
+    # since the better node is either kept or remembered by its parent, no solution is lost
+    in_memory = {initial_state: root}
+    counter = itertools.count()
+    # OPEN is kept in 2 heaps (best first and worst first) with lazy invalidation via the node versions
+    best_heap, worst_heap = [], []
+
+    def push_open(node: _SMANode) -> None:
+        node.in_open = True
+        node.version += 1
+        heapq.heappush(best_heap, (node.f, -node.depth, next(counter), node.version, node))
+        heapq.heappush(worst_heap, (-node.f, node.depth, next(counter), node.version, node))
+
+    def remove_open(node: _SMANode) -> None:
+        node.in_open = False
+        node.version += 1
+
+    # Returns the best node in OPEN (lowest f, deepest)
+    def peek_best() -> _SMANode:
+        while best_heap:
+            _, _, _, version, node = best_heap[0]
+            if node.in_open and node.version == version:
+                return node
+            heapq.heappop(best_heap)
+        return None
+
+    # Removes and returns the worst leaf in OPEN (highest f, shallowest) other than the excluded node
+    def pop_worst_leaf(excluded: _SMANode) -> _SMANode:
+        skipped = []
+        leaf = None
+        while worst_heap:
+            entry = heapq.heappop(worst_heap)
+            _, _, _, version, node = entry
+            if not node.in_open or node.version != version:
+                continue
+            # the root and the node being expanded can not be forgotten so keep their entries
+            if node is root or node is excluded:
+                skipped.append(entry)
+                continue
+            # non-leaves are pushed again once they lose their last child
+            if node.children:
+                continue
+            leaf = node
+            break
+        for entry in skipped:
+            heapq.heappush(worst_heap, entry)
+        return leaf
+
+    # Recomputes the f of a fully generated node from its successors and propagates the change to its ancestors
+    def backup(node: _SMANode) -> None:
+        while node is not None and node.actions is not None and node.next_action == len(node.actions):
+            f = min([child.f for child in node.children.values()] + list(node.forgotten.values()), default=INF)
+            if f <= node.f:
+                break
+            node.f = f
+            if node.in_open:
+                push_open(node)
+            node = node.parent
+
+    # Removes a leaf from memory, its parent remembers its f and goes back to OPEN to be able to regenerate it
+    # If the parent is left without children and successors to generate, it is a dead end so it is removed too
+    # (unless it is the root or the "kept" node which is currently being expanded)
+    def forget(node: _SMANode, kept: _SMANode = None) -> None:
+        nonlocal memory
+        while True:
+            parent = node.parent
+            del parent.children[node.action[0]]
+            # a successor with infinite f is useless so there is no need to regenerate it
+            if node.f < INF:
+                parent.forgotten[node.action[0]] = node.f
+            remove_open(node)
+            memory -= 1
+            if in_memory.get(node.state) is node:
+                del in_memory[node.state]
+            if parent.has_pending():
+                push_open(parent)
+            elif not parent.children and parent is not root and parent is not kept:
+                parent.f = INF
+                node = parent
+                continue
+            else:
+                remove_open(parent)
+            backup(parent)
+            return
+
+    push_open(root)
+    while True:
+        best = peek_best()
+        if best is None or best.f == INF:
+            return None
+        if problem.is_goal(best.state):
+            actions = []
+            while best.parent is not None:
+                actions.append(best.action[1])
+                best = best.parent
+            actions.reverse()
+            return actions
+        if best.actions is None:
+            best.actions = list(problem.get_actions(best.state))
+        if best.has_pending():
+            # generate the next successor: the actions that were never tried come first,
+            # then the forgotten children starting with the one with the lowest f
+            if best.next_action < len(best.actions):
+                index = best.next_action
+                best.next_action += 1
+                remembered_f = -INF
+            else:
+                index = min(best.forgotten, key=best.forgotten.get)
+                remembered_f = best.forgotten.pop(index)
+            action = best.actions[index]
+            state = problem.get_successor(best.state, action)
+            g = best.g + problem.get_cost(best.state, action)
+            duplicate = in_memory.get(state)
+            if duplicate is None or g < duplicate.g:
+                # f never decreases along a path (pathmax) and a regenerated child keeps its backed up f
+                f = max(best.f, g + heuristic(problem, state), remembered_f)
+                # a path that fills the whole memory can not be extended so a non-goal node at the maximum depth is useless
+                if best.depth + 2 >= memory_limit and not problem.is_goal(state):
+                    f = INF
+                child = _SMANode(state, best, (index, action), g, f, best.depth + 1)
+                stored = True
+                if memory >= memory_limit:
+                    worst = pop_worst_leaf(best)
+                    # if the new child is worse than every leaf (or there is no leaf), the child is forgotten instead
+                    if worst is None or (child.f, -child.depth) > (worst.f, -worst.depth):
+                        if worst is not None:
+                            heapq.heappush(worst_heap, (-worst.f, worst.depth, next(counter), worst.version, worst))
+                        if child.f < INF:
+                            best.forgotten[index] = child.f
+                        stored = False
+                    else:
+                        forget(worst, best)
+                if stored:
+                    best.children[index] = child
+                    in_memory[state] = child
+                    memory += 1
+                    push_open(child)
+                    if stats is not None: stats.frontier(memory)
+        # a node leaves OPEN once all its successors are in memory
+        if not best.has_pending():
+            # a dead end (no actions or all the successors were dropped) is useless so it is forgotten right away
+            if not best.children:
+                best.f = INF
+                if best is root:
+                    return None
+                forget(best)
+                continue
+            remove_open(best)
+        backup(best)
+
+# A solution found by the anytime search where "bound" is the current suboptimality bound (cost <= bound x the optimal cost)
+# and "weight" is the weight of the heuristic in the iteration that found it
+class AnytimeSolution(NamedTuple):
+    solution: Solution
+    cost: float
+    bound: float
+    weight: float
+
+def AnytimeAStarSolutions(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, weight: float = 3.0,
+                          weight_step: float = 0.5, deadline: Optional[float] = None,
+                          stats: Optional[SearchStatistics] = None) -> Iterator[AnytimeSolution]:
+    """
+    ARA* (anytime repairing A*) -> runs weighted A* (f = g + weight * h) with a decreasing weight
+    each iteration yields the best solution so far with its suboptimality bound, until the weight reaches 1 (the solution is optimal)
+    the search tree, the costs and the heuristic values are kept between the iterations:
+    a state whose cost decreases after it was expanded in the current iteration is not expanded again,
+    it waits in the INCONS list and goes back to OPEN in the next iteration
+    if "deadline" (in seconds) is given, the search stops when it expires (without yielding the unfinished iteration)
+    """
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, initial_state, heuristic)
+    INF = float('inf')
+    end = None if deadline is None else time.perf_counter() + deadline
+    weight = max(weight, 1.0)
+    if problem.is_goal(initial_state):
+        yield AnytimeSolution([], 0, 1.0, weight)
+        return
+    nodes = NodeArena()
+    # g: the lowest cost found for each state, node_of: the arena node of that path, h_values: the heuristic value of each state
+    g = {initial_state: 0}
+    node_of = {initial_state: nodes.add_root()}
+    h_values = {initial_state: heuristic(problem, initial_state)}
+    counter = itertools.count()
+    frontier = IndexedHeap()
+    frontier.push(initial_state, (weight * h_values[initial_state], next(counter)))
+    closed, incons = set(), set()
+    # the goals are not expanded, the best one is kept as the incumbent
+    best_cost, best_node = INF, None
+    while True:
+        # expand while a state in OPEN may lead to a better solution than the incumbent
+        while frontier and frontier.peek()[1][0] < best_cost:
+            if end is not None and time.perf_counter() > end:
+                return
+            state, _, _ = frontier.pop()
+            closed.add(state)
+            state_g, state_node = g[state], node_of[state]
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_g = state_g + problem.get_cost(state, action)
+                if next_g >= g.get(next_state, INF):
+                    continue
+                g[next_state] = next_g
+                node_of[next_state] = nodes.add(state_node, action, next_g)
+                if problem.is_goal(next_state):
+                    if next_g < best_cost:
+                        best_cost, best_node = next_g, node_of[next_state]
+                    continue
+                if next_state not in h_values:
+                    h_values[next_state] = heuristic(problem, next_state)
+                if next_state in closed:
+                    incons.add(next_state)
+                else:
+                    frontier.push(next_state, (next_g + weight * h_values[next_state], next(counter)))
+            if stats is not None: stats.frontier(len(frontier))
+        if best_node is None:
+            # every reachable state was expanded without finding a goal
+            return
+        # the optimal cost is at least the lowest g + h among the incumbent and the states that may still be improved
+        lower = min([g[state] + h_values[state] for state in itertools.chain(frontier.keys(), incons)] + [best_cost])
+        bound = 1.0 if lower >= best_cost else (min(weight, best_cost / lower) if lower > 0 else weight)
+        yield AnytimeSolution(nodes.path(best_node), best_cost, bound, weight)
+        if bound <= 1.0 or weight <= 1.0:
+            return
+        # decrease the weight, move INCONS back to OPEN and recompute the priorities with the new weight
+        weight = max(1.0, weight - weight_step)
+        states = frontier.keys() + list(incons)
+        frontier = IndexedHeap()
+        for state in states:
+            frontier.push(state, (g[state] + weight * h_values[state], next(counter)))
+        closed.clear()
+        incons.clear()
+
+def AnytimeAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, weight: float = 3.0,
+                       weight_step: float = 0.5, deadline: Optional[float] = None,
+                       stats: Optional[SearchStatistics] = None) -> Solution:
+    """
+    Runs ARA* (see AnytimeAStarSolutions) until it finds an optimal solution or the deadline expires
+    and returns the best solution found (or None if none was found before the deadline)
+    """
+    best = None
+    for best in AnytimeAStarSolutions(problem, initial_state, heuristic, weight, weight_step, deadline, stats):
+        pass
+    return None if best is None else best.solution
@@ -0,0 +1,47 @@
+from array import array
+from typing import Generic, List, Optional
+from problem import A
+
+# The node arena stores the whole search tree generated by a search algorithm
+# Instead of storing a node object (or a copy of the path) for each generated state,
+# the nodes are stored in parallel compact arrays where each node is identified by its index:
+#   parents[i] -> the index of the parent of node i (-1 for the root)
+#   actions[i] -> the action applied to the parent of node i to reach node i (None for the root)
+#   costs[i]   -> the accumulated path cost (g) from the root to node i
+# So a frontier entry only needs to hold the node index (O(1) memory) instead of the list of actions done so far (O(depth) memory)
+# and the path is rebuilt only once (when the goal is found) by following the parents back to the root
+class NodeArena(Generic[A]):
+    __slots__ = ("parents", "actions", "costs")
+
+    def __init__(self) -> None:
+        self.parents = array('q')
+        self.actions: List[Optional[A]] = []
+        self.costs = array('d')
+
+    # Adds the root node (the node of the initial state) and returns its index
+    def add_root(self) -> int:
+        return self.add(-1, None, 0)
+
+    # Adds a node which is reached by applying "action" to the node "parent" and returns its index
+    def add(self, parent: int, action: Optional[A], cost: float = 0) -> int:
+        self.parents.append(parent)
+        self.actions.append(action)
+        self.costs.append(cost)
+        return len(self.actions) - 1
+
+    # Returns the accumulated path cost from the root to the given node
+    def cost(self, node: int) -> float:
+        return self.costs[node]
+
+    # Returns the list of actions from the root to the given node
+    def path(self, node: int) -> List[A]:
+        parents, actions = self.parents, self.actions
+        path = []
+        while parents[node] != -1:
+            path.append(actions[node])
+            node = parents[node]
+        path.reverse()
+        return path
+
+    def __len__(self) -> int:
+        return len(self.actions)
@@ -0,0 +1,213 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import argparse, json, time
+
+from problem import HeuristicFunction, Problem, Solution, S, A
+
+# This file contains the statistics collector of the search algorithms in search.py
+# Every search function takes an optional "stats" argument. If it is None (the default), nothing is collected
+# and the only overhead is a None check per expansion. If it is a SearchStatistics, the search runs on an InstrumentedProblem
+# which wraps the problem and counts and times the calls, and the heuristic is wrapped to count and time its calls.
+# The wrapped problem calls the methods of the original problem, so @track_call_count and @record_calls keep counting as usual
+# and the search explores exactly the same states in the same order.
+#
+# The collected statistics are:
+#   expanded: the number of calls to get_actions, generated: the number of calls to get_successor
+#   peak_frontier: the largest frontier reported by the search (the open list, or the current path for the depth first searches)
+#   heuristic_calls and heuristic_time, successor_time: the time spent in get_actions and get_successor
+# The following statistics need the collector to remember every expanded and generated state (a second copy of the explored set
+# and the frontier), so they are only collected if "track_states" is True (otherwise reopened is None and branching is empty):
+#   reopened: the number of expansions of a state that was already expanded
+#   branching: for each depth, the number of expanded states and the number of their actions (so their ratio is the branching factor)
+#     The depth of a state is the fewest actions along the paths that the search generated to it.
+# They can be exported as JSON (see to_json).
+
+class SearchStatistics:
+    def __init__(self, name: str = "", track_states: bool = False) -> None:
+        self.name = name
+        self.track_states = track_states
+        self.expanded = 0
+        self.generated = 0
+        self.reopened: Optional[int] = 0 if track_states else None
+        self.peak_frontier = 0
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+        self.successor_time = 0.0
+        self.elapsed = 0.0
+        self.solution_length: Optional[int] = None
+        # depth -> [expanded states, actions]
+        self.branching: Dict[int, List[int]] = {}
+        self._depths: Dict[Any, int] = {}
+        self._expanded_states = set()
+
+    # Returns the instrumented version of the problem and the heuristic (a problem that is already instrumented is returned as is)
+    # The initial state is the root of the depths
+    def instrument(self, problem: Problem[S, A], initial_state: S,
+                   heuristic: Optional[HeuristicFunction] = None) -> Tuple[Problem[S, A], Optional[HeuristicFunction]]:
+        if not (isinstance(problem, InstrumentedProblem) and problem.stats is self):
+            problem = InstrumentedProblem(problem, self)
+            if self.track_states:
+                self._depths.setdefault(initial_state, 0)
+        if heuristic is not None and getattr(heuristic, "stats", None) is not self:
+            heuristic = self._timed_heuristic(heuristic, problem.problem)
+        return problem, heuristic
+
+    def _timed_heuristic(self, heuristic: HeuristicFunction, problem: Problem[S, A]) -> HeuristicFunction:
+        clock = time.perf_counter
+        def timed_heuristic(_, state: S) -> float:
+            start = clock()
+            value = heuristic(problem, state)
+            self.heuristic_time += clock() - start
+            self.heuristic_calls += 1
+            return value
+        timed_heuristic.stats = self
+        return timed_heuristic
+
+    # Called by the searches with the current size of their frontier
+    def frontier(self, size: int) -> None:
+        if size > self.peak_frontier:
+            self.peak_frontier = size
+
+    # Returns the branching factor of each depth (actions per expanded state)
+    def branching_factors(self) -> Dict[int, float]:
+        return {depth: actions / expanded for depth, (expanded, actions) in sorted(self.branching.items())}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "expanded": self.expanded,
+            "generated": self.generated,
+            "reopened": self.reopened,
+            "peak_frontier": self.peak_frontier,
+            "heuristic_calls": self.heuristic_calls,
+            "heuristic_time": self.heuristic_time,
+            "successor_time": self.successor_time,
+            "elapsed": self.elapsed,
+            "solution_length": self.solution_length,
+            "branching": {str(depth): {"expanded": expanded, "actions": actions, "factor": actions / expanded}
+                          for depth, (expanded, actions) in sorted(self.branching.items())},
+        }
+
+    # Returns the statistics as a JSON string and also writes them to the given path (if any)
+    def to_json(self, path: Optional[str] = None, indent: Optional[int] = 2) -> str:
+        text = json.dumps(self.to_dict(), indent=indent)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def __str__(self) -> str:
+        reopened = "" if self.reopened is None else f", reopened {self.reopened}"
+        lines = [f"{self.name or 'search'}: expanded {self.expanded}, generated {self.generated}{reopened}, "
+                 f"peak frontier {self.peak_frontier}, elapsed {self.elapsed:.4f}s",
+                 f"  heuristic: {self.heuristic_calls} calls in {self.heuristic_time:.4f}s, successors: {self.successor_time:.4f}s"]
+        lines += [f"  depth {depth}: {expanded} expanded, branching {actions / expanded:.2f}"
+                  for depth, (expanded, actions) in sorted(self.branching.items())]
+        return "\n".join(lines)
+
+# A problem that forwards every call to the wrapped problem while recording the statistics
+# The other attributes (e.g. the layout of a sokoban problem) are read from the wrapped problem
+class InstrumentedProblem(Problem[S, A]):
+    def __init__(self, problem: Problem[S, A], stats: SearchStatistics) -> None:
+        self.problem = problem
+        self.stats = stats
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.problem, name)
+
+    def cache(self) -> Dict[Any, Any]:
+        return self.problem.cache()
+
+    def cache_region(self, *args, **kwargs):
+        return self.problem.cache_region(*args, **kwargs)
+
+    def cache_stats(self):
+        return self.problem.cache_stats()
+
+    def get_initial_state(self) -> S:
+        return self.problem.get_initial_state()
+
+    def is_goal(self, state: S) -> bool:
+        return self.problem.is_goal(state)
+
+    def get_actions(self, state: S) -> Iterable[A]:
+        stats = self.stats
+        start = time.perf_counter()
+        actions = self.problem.get_actions(state)
+        stats.successor_time += time.perf_counter() - start
+        # The generators are consumed here to count the actions (the search receives the same actions)
+        if not hasattr(actions, "__len__"):
+            actions = list(actions)
+        stats.expanded += 1
+        if not stats.track_states:
+            return actions
+        if state in stats._expanded_states:
+            stats.reopened += 1
+        else:
+            stats._expanded_states.add(state)
+        depth = stats._depths.get(state, 0)
+        entry = stats.branching.setdefault(depth, [0, 0])
+        entry[0] += 1
+        entry[1] += len(actions)
+        return actions
+
+    def get_successor(self, state: S, action: A) -> S:
+        stats = self.stats
+        start = time.perf_counter()
+        successor = self.problem.get_successor(state, action)
+        stats.successor_time += time.perf_counter() - start
+        stats.generated += 1
+        if not stats.track_states:
+            return successor
+        depth = stats._depths.get(state, 0) + 1
+        if depth < stats._depths.get(successor, depth + 1):
+            stats._depths[successor] = depth
+        return successor
+
+    def get_cost(self, state: S, action: A) -> float:
+        return self.problem.get_cost(state, action)
+
+# Runs a search function with a statistics collector and returns the solution and the statistics
+# "track_states" enables the per state statistics (reopened and branching, see SearchStatistics)
+def run_with_statistics(search_fn: Callable[..., Solution], problem: Problem[S, A], initial_state: S, *args,
+                        track_states: bool = False, **kwargs) -> Tuple[Solution, SearchStatistics]:
+    stats = SearchStatistics(getattr(search_fn, "__name__", ""), track_states)
+    start = time.perf_counter()
+    solution = search_fn(problem, initial_state, *args, stats=stats, **kwargs)
+    stats.elapsed = time.perf_counter() - start
+    stats.solution_length = None if solution is None else len(solution)
+    return solution, stats
+
+# Runs a search on a problem file and prints (or exports) its statistics
+def main(args: argparse.Namespace):
+    import search
+    from portfolio import load_problem
+    problem = load_problem(args.domain, args.problem)
+    search_fn = {
+        "bfs": search.BreadthFirstSearch, "dfs": search.DepthFirstSearch, "ids": search.IterativeDeepeningSearch, "ucs": search.UniformCostSearch,
+        "astar": search.AStarSearch, "gbfs": search.BestFirstSearch,
+        "idastar": search.IterativeDeepeningAStarSearch, "smastar": search.SMAStarSearch,
+    }[args.agent]
+    extra = ()
+    if args.agent in ("astar", "gbfs", "idastar", "smastar"):
+        if args.domain == "sokoban":
+            from sokoban_heuristic import strong_heuristic as heuristic
+        elif args.domain == "parking":
+            from parking_heuristic import blocking_heuristic as heuristic
+        else:
+            from graph import graphrouting_heuristic as heuristic
+        extra = (heuristic,)
+    _, stats = run_with_statistics(search_fn, problem, problem.get_initial_state(), *extra, track_states=args.track_states)
+    print(stats)
+    if args.json:
+        stats.to_json(args.json)
+        print(f"Statistics written to {args.json}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect the statistics of a search on a problem")
+    parser.add_argument("problem", help="path to the problem file")
+    parser.add_argument("--domain", "-d", default="sokoban", choices=["sokoban", "parking", "graph"], help="the domain of the problem")
+    parser.add_argument("--agent", "-a", default="astar", choices=["bfs", "dfs", "ids", "ucs", "astar", "gbfs", "idastar", "smastar"],
+                        help="the search algorithm")
+    parser.add_argument("--track-states", "-s", action="store_true", help="also count the reopened states and the branching factor of each depth")
+    parser.add_argument("--json", "-j", default=None, help="a path to export the statistics as JSON")
+    main(parser.parse_args())
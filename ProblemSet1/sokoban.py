@@ -1,8 +1,8 @@
 from dataclasses import dataclass
-from typing import FrozenSet, Iterable
+from typing import Dict, FrozenSet, Iterable, Tuple, Union
 from enum import Enum
 
-from mathutils import Direction, Point
+from mathutils import Direction, Point, ZobristKeys, iterate_bits
 from problem import Problem
 from helpers.utils import track_call_count
 
@@ -26,14 +26,23 @@ class SokobanTile(str, Enum):
 # we only need the default equality which compares objects by pointers.
 # The layout contains the problem details that are unchangeable across states such as:
 #   The walkable area (locations without walls) and the locations of the goals
+# The layout also owns its distance tables (see sokoban_distances.py) which are computed on the first call to "distances"
 @dataclass(eq=False, frozen=True)
 class SokobanLayout:
-    __slots__ = ("width", "height", "walkable", "goals")
+    __slots__ = ("width", "height", "walkable", "goals", "_distances")
     width: int
     height: int
     walkable: FrozenSet[Point]
     goals: FrozenSet[Point]
 
+    # Returns the all-pairs walk and push distance tables of the layout (they are computed once then stored in the layout)
+    def distances(self) -> 'SokobanDistances':
+        if not hasattr(self, "_distances"):
+            from sokoban_distances import SokobanDistances
+            # The layout is frozen so we bypass the dataclass __setattr__
+            object.__setattr__(self, "_distances", SokobanDistances(self))
+        return self._distances
+
 # For the sokoban state, we use dataclass with frozen=True to automatically implement:
 #   the constructor, the == operator, the hash function and to make the class immutable
 # Now it can be added to sets and used as keys in dictionaries
@@ -60,6 +69,93 @@ class SokobanState:
             return SokobanTile.EMPTY
         return '\n'.join(''.join(position_to_str(Point(x, y)) for x in range(self.layout.width)) for y in range(self.layout.height))
 
+# The packed layout is an alternative layout where the walkable cells are numbered 0..N-1 in row-major order
+# In addition to the details of SokobanLayout, it contains:
+#   cells: where cells[i] is the position of the cell whose index is i
+#   indices: which maps the position of each walkable cell to its index
+#   neighbors: where neighbors[i][direction] is the index of the cell next to cell i in the given direction (or -1 if it is a wall)
+#   goal_mask: the goals packed as a bitboard (bit i is set if cell i is a goal)
+# These tables are computed once per layout so that the packed states never have to allocate points
+@dataclass(eq=False, frozen=True)
+class PackedSokobanLayout(SokobanLayout):
+    __slots__ = ("cells", "indices", "neighbors", "goal_mask")
+    cells: Tuple[Point, ...]
+    indices: Dict[Point, int]
+    neighbors: Tuple[Tuple[int, ...], ...]
+    goal_mask: int
+
+    # Creates the packed version of the given layout
+    @staticmethod
+    def from_layout(layout: SokobanLayout) -> 'PackedSokobanLayout':
+        cells = tuple(sorted(layout.walkable, key=lambda position: (position.y, position.x)))
+        indices = {position: index for index, position in enumerate(cells)}
+        neighbors = tuple(
+            tuple(indices.get(position + direction.to_vector(), -1) for direction in Direction)
+            for position in cells
+        )
+        goal_mask = sum(1 << indices[goal] for goal in layout.goals)
+        return PackedSokobanLayout(layout.width, layout.height, layout.walkable, layout.goals, cells, indices, neighbors, goal_mask)
+
+    # Converts a state from the point representation to the packed representation
+    def pack(self, state: SokobanState) -> 'PackedSokobanState':
+        return PackedSokobanState(self, self.indices[state.player], sum(1 << self.indices[crate] for crate in state.crates))
+
+# The packed state is an alternative to SokobanState where:
+#   player: is the index of the cell containing the player
+#   crates: is a bitboard where bit i is set if cell i contains a crate
+# So the equality and the hash are computed from 2 integers instead of walking a frozenset of points
+@dataclass(frozen=True)
+class PackedSokobanState:
+    __slots__ = ("layout", "player", "crates")
+    layout: PackedSokobanLayout
+    player: int
+    crates: int
+
+    # Converts the state back to the point representation
+    def unpack(self) -> SokobanState:
+        cells = self.layout.cells
+        return SokobanState(self.layout, cells[self.player], frozenset(cells[crate] for crate in iterate_bits(self.crates)))
+
+    # This operator will convert the state to a string containing the grid representation of the level at the current state
+    # It renders the same grid as the equivalent SokobanState
+    def __str__(self) -> str:
+        return str(self.unpack())
+
+# The zobrist layout is a packed layout which also holds the zobrist keys of the player (piece 0) and the crates (piece 1) on every cell
+# Its states are ZobristSokobanStates which carry their 64-bit zobrist hash, it is updated incrementally by "get_successor"
+ZOBRIST_PLAYER, ZOBRIST_CRATE = 0, 1
+
+@dataclass(eq=False, frozen=True)
+class ZobristSokobanLayout(PackedSokobanLayout):
+    __slots__ = ("zobrist",)
+    zobrist: ZobristKeys
+
+    # Creates the zobrist version of the given layout
+    @staticmethod
+    def from_layout(layout: SokobanLayout) -> 'ZobristSokobanLayout':
+        packed = PackedSokobanLayout.from_layout(layout)
+        return ZobristSokobanLayout(packed.width, packed.height, packed.walkable, packed.goals, packed.cells,
+                                    packed.indices, packed.neighbors, packed.goal_mask, ZobristKeys(2, len(packed.cells)))
+
+    def pack(self, state: SokobanState) -> 'ZobristSokobanState':
+        packed = super().pack(state)
+        placements = [(ZOBRIST_PLAYER, packed.player)] + [(ZOBRIST_CRATE, crate) for crate in iterate_bits(packed.crates)]
+        return ZobristSokobanState(self, packed.player, packed.crates, self.zobrist.hash(placements))
+
+# The zobrist state is a packed state which also holds its zobrist hash ("key")
+# The hash of the state is the key (so the sets and the dictionaries do not hash the fields) and the key is compared first by the equality
+@dataclass(eq=False, frozen=True)
+class ZobristSokobanState(PackedSokobanState):
+    __slots__ = ("key",)
+    key: int
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ZobristSokobanState) and self.key == other.key and self.player == other.player \
+            and self.crates == other.crates and self.layout is other.layout
+
+    def __hash__(self) -> int:
+        return self.key
+
 # This is a list of all the possible actions for the sokoban agent
 AllSokobanActions = [
     Direction.RIGHT,
@@ -69,20 +165,29 @@ AllSokobanActions = [
 ]
 
 # This is the implementation of the sokoban problem
-class SokobanProblem(Problem[SokobanState, Direction]):
+# The problem works with both state representations (SokobanState and PackedSokobanState)
+# The representation is selected when the problem is created (see "from_text")
+class SokobanProblem(Problem[Union[SokobanState, PackedSokobanState], Direction]):
     # The problem will contain the sokoban layout and the inital state
     layout: SokobanLayout
-    initial_state: SokobanState
+    initial_state: Union[SokobanState, PackedSokobanState]
+    # If deadlock pruning is enabled, this will contain the DeadlockDetector (see sokoban_deadlock.py) of the layout
+    # and the actions that push a crate into a deadlock will not be returned by "get_actions"
+    deadlocks = None
 
-    def get_initial_state(self) -> SokobanState:
+    def get_initial_state(self) -> Union[SokobanState, PackedSokobanState]:
         return self.initial_state
 
-    def is_goal(self, state: SokobanState) -> bool:
+    def is_goal(self, state: Union[SokobanState, PackedSokobanState]) -> bool:
+        if isinstance(state, PackedSokobanState):
+            return self.layout.goal_mask == state.crates
         return self.layout.goals == state.crates
 
     # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
     @track_call_count
-    def get_actions(self, state: SokobanState) -> Iterable[Direction]:
+    def get_actions(self, state: Union[SokobanState, PackedSokobanState]) -> Iterable[Direction]:
+        if isinstance(state, PackedSokobanState):
+            return self._get_packed_actions(state)
         actions = []
         for direction in Direction:
             position = state.player + direction.to_vector()
@@ -94,10 +199,35 @@ class SokobanProblem(Problem[SokobanState, Direction]):
                 crate_position = position + direction.to_vector()
                 if crate_position not in self.layout.walkable or crate_position in state.crates:
                     continue
+                # If enabled, make sure that the push does not create a deadlock
+                if self.deadlocks is not None and self.deadlocks.is_deadlocked_point_push(state.crates, position, crate_position):
+                    continue
+            actions.append(direction)
+        return actions
+
+    # This is the same as "get_actions" but for packed states where the positions are looked up in the neighbor table
+    def _get_packed_actions(self, state: PackedSokobanState) -> Iterable[Direction]:
+        actions = []
+        neighbors, crates = self.layout.neighbors, state.crates
+        for direction in Direction:
+            position = neighbors[state.player][direction]
+            # Disallow walking into walls
+            if position < 0: continue
+            # Check if walking into a crate
+            if crates >> position & 1:
+                # make sure that the crate is not pushed into a wall or another crate
+                crate_position = neighbors[position][direction]
+                if crate_position < 0 or crates >> crate_position & 1:
+                    continue
+                # If enabled, make sure that the push does not create a deadlock
+                if self.deadlocks is not None and self.deadlocks.is_deadlocked_push(crates ^ (1 << position) ^ (1 << crate_position), crate_position):
+                    continue
             actions.append(direction)
         return actions
 
-    def get_successor(self, state: SokobanState, action: Direction) -> SokobanState:
+    def get_successor(self, state: Union[SokobanState, PackedSokobanState], action: Direction) -> Union[SokobanState, PackedSokobanState]:
+        if isinstance(state, PackedSokobanState):
+            return self._get_packed_successor(state, action)
         player = state.player + action.to_vector()
         crates = state.crates
         if player not in self.layout.walkable:
@@ -112,13 +242,41 @@ class SokobanProblem(Problem[SokobanState, Direction]):
             crates = crates.symmetric_difference({player,crate_position})
         return SokobanState(state.layout, player, crates)
 
-    def get_cost(self, state: SokobanState, action: Direction) -> float:
+    # This is the same as "get_successor" but for packed states where pushing a crate flips 2 bits in the bitboard
+    # For zobrist states, the hash is updated with the moves of the player and the pushed crate
+    def _get_packed_successor(self, state: PackedSokobanState, action: Direction) -> PackedSokobanState:
+        neighbors = self.layout.neighbors
+        player = neighbors[state.player][action]
+        crates = state.crates
+        if player < 0:
+            # If we try to walk into a wall, then this action is wrong
+            raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+        pushed = crates >> player & 1
+        if pushed:
+            crate_position = neighbors[player][action]
+            if crate_position < 0 or crates >> crate_position & 1:
+                # If we try to push a crate into a wall or another crate, then this action is wrong
+                raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+            # If we walk to a crate, we push it
+            crates ^= (1 << player) | (1 << crate_position)
+        if isinstance(state, ZobristSokobanState):
+            zobrist = self.layout.zobrist
+            key = zobrist.move(state.key, ZOBRIST_PLAYER, state.player, player)
+            if pushed: key = zobrist.move(key, ZOBRIST_CRATE, player, crate_position)
+            return ZobristSokobanState(state.layout, player, crates, key)
+        return PackedSokobanState(state.layout, player, crates)
+
+    def get_cost(self, state: Union[SokobanState, PackedSokobanState], action: Direction) -> float:
         # All actions have the same cost
         return 1
 
     # Read a sokoban problem from text containing a grid of tiles
+    # If packed is True, the problem will use the packed layout and states (PackedSokobanLayout & PackedSokobanState)
+    # If prune_deadlocks is True, the pushes that lead to deadlocks are pruned from the actions
+    # If zobrist is True, the problem will use the zobrist layout and states (ZobristSokobanLayout & ZobristSokobanState) which are packed too
+    # NOTE: deadlock pruning is disabled by default since it changes the number of expanded nodes
     @staticmethod
-    def from_text(text: str) -> 'SokobanProblem':
+    def from_text(text: str, packed: bool = False, prune_deadlocks: bool = False, zobrist: bool = False) -> 'SokobanProblem':
         walkable, crates, goals =  set(), set(), set()
         player: Point = None
         lines = [line for line in (line.strip() for line in text.splitlines()) if line]
@@ -142,10 +300,19 @@ class SokobanProblem(Problem[SokobanState, Direction]):
         problem = SokobanProblem()
         problem.layout = SokobanLayout(width, height, frozenset(walkable), frozenset(goals))
         problem.initial_state = SokobanState(problem.layout, player, frozenset(crates))
+        if zobrist:
+            problem.layout = ZobristSokobanLayout.from_layout(problem.layout)
+            problem.initial_state = problem.layout.pack(problem.initial_state)
+        elif packed:
+            problem.layout = PackedSokobanLayout.from_layout(problem.layout)
+            problem.initial_state = problem.layout.pack(problem.initial_state)
+        if prune_deadlocks:
+            from sokoban_deadlock import DeadlockDetector
+            problem.deadlocks = DeadlockDetector(problem.layout)
         return problem
 
     # Read a sokoban problem from file containing a grid of tiles
     @staticmethod
-    def from_file(path: str) -> 'SokobanProblem':
+    def from_file(path: str, packed: bool = False, prune_deadlocks: bool = False, zobrist: bool = False) -> 'SokobanProblem':
         with open(path, 'r') as f:
-            return SokobanProblem.from_text(f.read())
\ No newline at end of file
+            return SokobanProblem.from_text(f.read(), packed, prune_deadlocks, zobrist)
\ No newline at end of file
@@ -0,0 +1,97 @@
+from typing import FrozenSet
+from collections import deque
+
+from mathutils import Direction, Point
+from sokoban import SokobanLayout, PackedSokobanLayout
+
+# This file contains the deadlock detection used to prune pushes that make the level unsolvable
+# It detects 2 kinds of deadlocks:
+#   1. Simple dead squares: cells from which a crate can never reach any goal (e.g. a non-goal corner).
+#      They are static (they only depend on the layout) so they are precomputed once per layout
+#      by pulling a crate backward from every goal; every cell that a pulled crate cannot reach is dead.
+#   2. Freeze deadlocks: a crate that can no longer move along both axes (e.g. 2x2 blocks of crates and walls,
+#      or crates frozen along walls) while it (or a crate it is frozen with) is not on a goal.
+#      They depend on the other crates, so they are checked after each push.
+# All the checks work on cell indices and crate bitboards (see PackedSokobanLayout),
+# so layouts with point states are packed once when the detector is created.
+# NOTE: Pruning deadlocks never removes a solution but it changes the number of expanded nodes.
+
+# The 2 axes along which a crate can be blocked, each is represented by its 2 opposite directions
+_AXES = ((Direction.LEFT, Direction.RIGHT), (Direction.UP, Direction.DOWN))
+
+class DeadlockDetector:
+    def __init__(self, layout: SokobanLayout) -> None:
+        if not isinstance(layout, PackedSokobanLayout):
+            layout = PackedSokobanLayout.from_layout(layout)
+        self.layout = layout
+        self.dead_mask = self._find_dead_squares()
+
+    # Returns a bitboard where bit i is set if cell i is a simple dead square
+    def _find_dead_squares(self) -> int:
+        neighbors = self.layout.neighbors
+        # Start from all the goals and pull the crate in every direction:
+        # The crate at cell can be pulled to "previous" if the player can stand at "previous" and step back to "behind"
+        live = set(self.layout.indices[goal] for goal in self.layout.goals)
+        frontier = deque(live)
+        while frontier:
+            cell = frontier.popleft()
+            for direction in Direction:
+                previous = neighbors[cell][direction]
+                if previous < 0 or previous in live: continue
+                behind = neighbors[previous][direction]
+                if behind < 0: continue
+                live.add(previous)
+                frontier.append(previous)
+        return sum(1 << cell for cell in range(len(self.layout.cells)) if cell not in live)
+
+    # Returns True if the crate at the given cell index can never reach a goal
+    def is_dead_square(self, cell: int) -> bool:
+        return bool(self.dead_mask >> cell & 1)
+
+    # Returns True if pushing a crate to "target" creates a deadlock
+    # "crates" is the crate bitboard after the push (so it contains target)
+    def is_deadlocked_push(self, crates: int, target: int) -> bool:
+        if self.dead_mask >> target & 1:
+            return True
+        frozen = []
+        if not self._is_frozen(crates, target, 1 << target, frozen):
+            return False
+        # The crates are frozen forever, it is only a deadlock if one of them is not on a goal
+        goal_mask = self.layout.goal_mask
+        return any(not (goal_mask >> cell & 1) for cell in frozen)
+
+    # This is the same as "is_deadlocked_push" but for point states
+    # "crates" is the set of crates before the push and the crate is pushed from "source" to "target"
+    def is_deadlocked_point_push(self, crates: FrozenSet[Point], source: Point, target: Point) -> bool:
+        indices = self.layout.indices
+        mask = sum(1 << indices[crate] for crate in crates) ^ (1 << indices[source]) ^ (1 << indices[target])
+        return self.is_deadlocked_push(mask, indices[target])
+
+    # Checks if the crate at "cell" cannot move along both axes. "walls" is a bitboard of the crates that
+    # are currently being checked; they are treated as walls to avoid infinite recursion between neighboring crates.
+    # The frozen crates are appended to "frozen" so that the caller can check whether they are all on goals.
+    # If the crate is not frozen, the crates appended while checking it are removed since their freeze assumed it cannot move.
+    def _is_frozen(self, crates: int, cell: int, walls: int, frozen: list) -> bool:
+        start = len(frozen)
+        for axis in _AXES:
+            if not self._is_blocked(crates, cell, axis, walls, frozen):
+                del frozen[start:]
+                return False
+        frozen.append(cell)
+        return True
+
+    # Checks if the crate at "cell" cannot move along the given axis. This happens if:
+    #   1. there is a wall on either side of the crate along the axis, or
+    #   2. both sides are dead squares (so moving along the axis is pointless), or
+    #   3. there is a frozen crate on either side of the crate along the axis
+    def _is_blocked(self, crates: int, cell: int, axis, walls: int, frozen: list) -> bool:
+        neighbors = self.layout.neighbors
+        sides = [neighbors[cell][direction] for direction in axis]
+        if any(side < 0 or walls >> side & 1 for side in sides):
+            return True
+        if all(self.dead_mask >> side & 1 for side in sides):
+            return True
+        for side in sides:
+            if crates >> side & 1 and self._is_frozen(crates, side, walls | (1 << side), frozen):
+                return True
+        return False
@@ -0,0 +1,95 @@
+from array import array
+from collections import deque
+from typing import Dict, List, Tuple
+
+from mathutils import Direction, Point
+from sokoban import SokobanLayout, PackedSokobanLayout
+
+# The problem set only allows the builtin modules, so NumPy is optional:
+# if it is installed, the tables are numpy matrices computed with vectorized operations, otherwise they are computed in pure python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# This value is stored in the distance tables for the pairs of cells that cannot reach each other (the maximum int16)
+UNREACHABLE = 2**15 - 1
+
+# This class holds the all-pairs distance tables of a sokoban layout
+# The cells are numbered in row-major order (the same indices used by PackedSokobanLayout) and the tables are dense int16 matrices:
+#   walk[i][j]: the number of steps needed by the player to walk from cell i to cell j (ignoring the crates)
+#   push[i][j]: the number of pushes needed to move a crate from cell i to cell j (ignoring the other crates)
+#               A crate can only be pushed from i to its neighbor in some direction if the cell behind it (where the player stands) is walkable
+# Both tables are computed once per layout (see SokobanLayout.distances) and any heuristic can look them up in O(1)
+# The tables are numpy arrays if NumPy is installed and lists of int16 arrays (one per row) otherwise, both are indexed as table[i][j]
+class SokobanDistances:
+    cells: Tuple[Point, ...]
+    indices: Dict[Point, int]
+
+    def __init__(self, layout: SokobanLayout) -> None:
+        if not isinstance(layout, PackedSokobanLayout):
+            layout = PackedSokobanLayout.from_layout(layout)
+        self.cells = layout.cells
+        self.indices = layout.indices
+        neighbors = layout.neighbors
+        # The player can walk to any walkable neighbor
+        walk_moves = [[cell_neighbors[direction] for cell_neighbors in neighbors] for direction in Direction]
+        # The crate can only be pushed to a walkable neighbor if the opposite neighbor is walkable too
+        push_moves = [
+            [cell_neighbors[direction] if cell_neighbors[direction.rotate(2)] >= 0 else -1 for cell_neighbors in neighbors]
+            for direction in Direction
+        ]
+        all_pairs_distances = _all_pairs_distances if np is not None else _all_pairs_distances_python
+        self.walk = all_pairs_distances(walk_moves)
+        self.push = all_pairs_distances(push_moves)
+
+    # Returns the push distances from every cell to the given cells (a list of ints per cell)
+    def push_distances_to(self, targets: List[int]) -> List[List[int]]:
+        if np is not None:
+            return self.push[:, targets].tolist()
+        return [[row[target] for target in targets] for row in self.push]
+
+# Computes the all-pairs distance matrix via a level-synchronous breadth first search from all the cells at once
+# "moves" contains a list for each direction where moves[d][i] is the cell reached by moving from cell i in direction d (or -1)
+# Since moving in a certain direction never leads 2 different cells to the same cell,
+# the reached cells of each direction can be updated with a single vectorized fancy-indexing operation
+def _all_pairs_distances(moves) -> 'np.ndarray':
+    moves = [np.array(targets, dtype=np.int64) for targets in moves]
+    size = len(moves[0])
+    distances = np.full((size, size), UNREACHABLE, dtype=np.int16)
+    # frontier[s, c] is True if cell c was first reached from source s in the last step
+    frontier = np.eye(size, dtype=bool)
+    reached = frontier.copy()
+    distances[frontier] = 0
+    valid_moves = [(np.nonzero(targets >= 0)[0], targets[targets >= 0]) for targets in moves]
+    step = 0
+    while frontier.any():
+        step += 1
+        next_frontier = np.zeros_like(frontier)
+        for sources, targets in valid_moves:
+            next_frontier[:, targets] |= frontier[:, sources]
+        next_frontier &= ~reached
+        reached |= next_frontier
+        distances[next_frontier] = step
+        frontier = next_frontier
+    return distances
+
+# The pure python version of _all_pairs_distances: a breadth first search from each cell
+def _all_pairs_distances_python(moves) -> List[array]:
+    size = len(moves[0])
+    # successors[i] is the list of cells reached from cell i in one move
+    successors = [[targets[cell] for targets in moves if targets[cell] >= 0] for cell in range(size)]
+    rows = []
+    for source in range(size):
+        row = array('h', [UNREACHABLE]) * size
+        row[source] = 0
+        frontier = deque([source])
+        while frontier:
+            cell = frontier.popleft()
+            step = row[cell] + 1
+            for successor in successors[cell]:
+                if row[successor] == UNREACHABLE:
+                    row[successor] = step
+                    frontier.append(successor)
+        rows.append(row)
+    return rows
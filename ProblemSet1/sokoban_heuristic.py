@@ -1,188 +1,71 @@
-from sokoban import SokobanProblem, SokobanState
-from mathutils import Direction, Point, manhattan_distance
-from collections import deque
-from typing import Dict
+from sokoban import SokobanProblem, SokobanState, PackedSokobanState
+from mathutils import Direction, manhattan_distance, iterate_bits
+from assignment import solve_assignment, repair_assignment
 # This heuristic returns the distance between the player and the nearest crate as an estimate for the path cost
 # While it is consistent, it does a bad job at estimating the actual cost thus the search will explore a lot of nodes before finding a goal
+# Packed states are converted back to points first
 def weak_heuristic(problem: SokobanProblem, state: SokobanState):
+    if isinstance(state, PackedSokobanState): state = state.unpack()
     return min(manhattan_distance(state.player, crate) for crate in state.crates) - 1
 
 #TODO: Import any modules and write any functions you want to use
 
 
-def bfs(point , passage):
-    frontier = deque()
-    
-    frontier.append((point, 0))
-    
-    destinations = {point: 0}
-    
-    while frontier:
-        curr_pos, curr_dist = frontier.popleft()
-        
-        for direction in Direction:
-            new_pos = curr_pos + direction.to_vector()
-            if new_pos in passage and new_pos not in destinations:
-
-                destinations[new_pos] = curr_dist + 1
-                frontier.append((new_pos, curr_dist + 1))
-            
-    return destinations
-
-def build_cost_matrix(state, points_dist):
-    n_row = len(state.crates)
-    n_col = len(state.layout.goals)
-    
-    n = max(n_row, n_col)
-    
-    cost_matrix = [[0]* n for _ in range(n)]
-    for i, crate in enumerate(state.crates):
-        for j, goal in  enumerate(state.layout.goals):
-            cost_matrix[i][j] = points_dist[(crate, goal)]
-
-    return cost_matrix
-
-
-def _find_augmenting_path(matrix, row, visited, row_match, col_match):
-    n = len(matrix)
-    for col in range(n):
-        if matrix[row][col] == 0 and not visited[col]:
-            visited[col] = True
-            
-            if col_match[col] == -1 or \
-                _find_augmenting_path(matrix, col_match[col], visited, row_match, col_match):
-                    row_match[row] = col
-                    col_match[col] = row
-                    return True
-    return False
-
-
-def find_matches(matrix, row_match, col_match):
-    """Returns the number of matches found"""
-    n = len(matrix)
-    match_count = 0
-    
-    for row in range(n):
-        if row_match[row] == -1:
-            visited = [False] * n
-            if _find_augmenting_path(matrix, row, visited, row_match, col_match):
-                match_count += 1
-    
-    return match_count
-
-
-def get_cover(matrix, row_match, col_match, n):
-    """
-    Find minimum vertex cover using alternating paths.
-    This is the tricky part - we need to mark rows/cols properly.
-    """
-    # Start with all unmatched rows marked
-    marked_rows = [row_match[i] == -1 for i in range(n)]
-    marked_cols = [False] * n
-    
-    # Repeatedly mark cols reachable from marked rows via zeros,
-    # then mark rows matched to those cols
-    changed = True
-    while changed:
-        changed = False
-        
-        # Mark columns that have zeros in marked rows
-        for i in range(n):
-            if marked_rows[i]:
-                for j in range(n):
-                    if matrix[i][j] == 0 and not marked_cols[j]:
-                        marked_cols[j] = True
-                        changed = True
-        
-        # Mark rows that are matched to marked columns
-        for j in range(n):
-            if marked_cols[j] and col_match[j] != -1:
-                row = col_match[j]
-                if not marked_rows[row]:
-                    marked_rows[row] = True
-                    changed = True
-    
-    # The cover is: unmarked rows + marked columns
-    covered_rows = [not marked for marked in marked_rows]
-    covered_cols = marked_cols
-    
-    return covered_rows, covered_cols
-
-
-def hangarian_algorithm(cost_matrix):
-    n = len(cost_matrix)
-    
-    # Make a copy
-    matrix = [row[:] for row in cost_matrix]
-    
-    # Step 1: Row reduction
-    for i in range(n):
-        row_min = min(matrix[i])
-        for j in range(n):
-            matrix[i][j] -= row_min
-    
-    # Step 2: Column reduction
-    for j in range(n):
-        col_min = min(matrix[i][j] for i in range(n))
-        for i in range(n):
-            matrix[i][j] -= col_min
-    
-    # Step 3: Find initial matching
-    row_match = [-1] * n
-    col_match = [-1] * n
-    
-    max_match = find_matches(matrix, row_match, col_match)
-    
-    # Step 4: If not perfect matching, iterate
-    max_iterations = n * n  # Safety limit
-    iteration = 0
-    
-    while max_match < n and iteration < max_iterations:
-        iteration += 1
-        
-        # Find covering
-        covered_rows, covered_cols = get_cover(matrix, row_match, col_match, n)
-        
-        # Find minimum uncovered value
-        min_val = float('inf')
-        for i in range(n):
-            for j in range(n):
-                if not covered_rows[i] and not covered_cols[j]:
-                    min_val = min(min_val, matrix[i][j])
-        
-        if min_val == float('inf'):
-            # Should not happen if algorithm is correct
-            break
-        
-        # Adjust matrix
-        for i in range(n):
-            for j in range(n):
-                if not covered_rows[i] and not covered_cols[j]:
-                    matrix[i][j] -= min_val
-                elif covered_rows[i] and covered_cols[j]:
-                    matrix[i][j] += min_val
-        
-        # Try to find more matches
-        new_matches = find_matches(matrix, row_match, col_match)
-        max_match += new_matches
-    
-    # Calculate result
-    assignments = []
-    total_cost = 0
-    
-    for i in range(n):
-        j = row_match[i]
-        if j != -1:  # Safety check
-            assignments.append((i, j))
-            total_cost += cost_matrix[i][j]
-    
-    return total_cost, assignments
-
-from scipy.optimize import linear_sum_assignment
-import numpy as np
+# The costs of the assignment are the push distances from the crates to the goals
+# They are looked up in the distance table owned by the layout (see sokoban_distances.py) where the cells are indexed in row-major order
+# A crate needs at least as many pushes (and thus player steps) as its push distance, so the heuristic is admissible,
+# and a single step changes the push distance of at most one crate by at most one, so it is consistent.
+# Unreachable crate-goal pairs get the UNREACHABLE cost (a crate that cannot reach any goal stays like that so such states are dead ends)
+
+# Returns the row of the cost matrix for the crate at the given cell: the push distance from the crate to each goal
+# padded with zeros to the size of the matrix (when there are more crates than goals)
+def crate_costs(cell, goal_costs, n):
+    row = goal_costs[cell]
+    return row + [0] * (n - len(row))
+
+# Yields the crate sets from which the given crates can be reached by pushing one crate one step
+# as tuples of (parent crates, crate cell before the push, crate cell after the push)
+# The crates are frozensets of points for SokobanState and bitboards for PackedSokobanState
+# The player stands where the pushed crate was, so the crates next to the player are tried first
+def parent_crate_sets(state, indices):
+    if isinstance(state, PackedSokobanState):
+        neighbors, crates = state.layout.neighbors, state.crates
+        candidates = [(state.player, crate) for crate in neighbors[state.player]]
+        candidates += [(previous, crate) for crate in iterate_bits(crates) for previous in neighbors[crate]]
+        for previous, crate in candidates:
+            if previous >= 0 and crate >= 0 and crates >> crate & 1 and not crates >> previous & 1:
+                yield crates ^ (1 << crate) ^ (1 << previous), previous, crate
+    else:
+        crates = state.crates
+        candidates = [(state.player, state.player + direction.to_vector()) for direction in Direction]
+        candidates += [(crate - direction.to_vector(), crate) for crate in crates for direction in Direction]
+        for previous, crate in candidates:
+            if crate in crates and previous in indices and previous not in crates:
+                yield crates.difference((crate,)).union((previous,)), indices[previous], indices[crate]
+
+# Returns the cells of the crates of the given state
+def crate_cells(state, indices):
+    if isinstance(state, PackedSokobanState):
+        return tuple(iterate_bits(state.crates))
+    return tuple(indices[crate] for crate in state.crates)
+
+# Computes the minimum assignment of the crates to the goals (the order of the crate cells fixes the rows of the cost matrix)
+# If the assignment of a parent crate set (that differs by one pushed crate) is cached, only the row of the pushed crate is repaired
+def find_assignment(state, indices, goal_costs, n, assignments):
+    for parent, previous, crate in parent_crate_sets(state, indices):
+        entry = assignments.get(parent)
+        if entry is None: continue
+        order, assignment = entry
+        row = order.index(previous)
+        order = order[:row] + (crate,) + order[row+1:]
+        return order, repair_assignment(assignment, row, crate_costs(crate, goal_costs, n))
+    # No parent is cached so solve from scratch (the extra rows for missing crates are all zeros)
+    order = crate_cells(state, indices)
+    cost_matrix = [crate_costs(crate, goal_costs, n) for crate in order]
+    cost_matrix += [[0] * n for _ in range(n - len(order))]
+    return order, solve_assignment(cost_matrix)
 
 def strong_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
-    #TODO: ADD YOUR CODE HERE
     #IMPORTANT: DO NOT USE "problem.get_actions" HERE.
     # Calling it here will mess up the tracking of the expanded nodes count
     # which is the number of get_actions calls during the search
@@ -191,23 +74,21 @@ def strong_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
 
     cache = problem.cache()
 
-    if 'points_dist' in cache: 
-        points_dist = cache['points_dist']
-    else:
-        passages = list(state.layout.walkable)
-
-        points_dist: Dict[(Point, Point), int] = {}
-
-        for point in passages:
-            distances = bfs(point,state.layout.walkable)
-            
-            for dest, dist in distances.items():
-                points_dist[(point, dest)] = dist
-            
-        cache['points_dist'] = points_dist
-        
-    cost_matrix = build_cost_matrix(state, points_dist)    
-
-    total_cost, _ = hangarian_algorithm(cost_matrix)
-    
-    return total_cost
+    if 'assignments' not in cache:
+        distances = state.layout.distances()
+        goals = [distances.indices[goal] for goal in state.layout.goals]
+        cache['indices'] = distances.indices
+        # goal_costs[cell] is the list of push distances from the cell to every goal
+        cache['goal_costs'] = distances.push_distances_to(goals)
+        cache['size'] = max(len(crate_cells(state, distances.indices)), len(goals))
+        # This maps each crate set to (crate cells order, assignment)
+        # It is keyed on the crates only since the player position does not affect the heuristic
+        cache['assignments'] = {}
+
+    assignments = cache['assignments']
+    entry = assignments.get(state.crates)
+    if entry is None:
+        entry = find_assignment(state, cache['indices'], cache['goal_costs'], cache['size'], assignments)
+        assignments[state.crates] = entry
+
+    return entry[1].total
@@ -0,0 +1,178 @@
+from typing import List, Sequence, Tuple
+from collections import deque
+from itertools import combinations
+from math import comb
+from array import array
+import hashlib, os
+
+from mathutils import Direction, iterate_bits
+from problem import HeuristicFunction
+from sokoban import SokobanLayout, SokobanProblem, SokobanState, PackedSokobanLayout, PackedSokobanState
+from sokoban_heuristic import strong_heuristic
+from sokoban_distances import UNREACHABLE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# This file contains pattern databases (PDBs) for sokoban
+# A pattern database of size k stores the exact cost (in player steps) to solve an abstraction of the level that contains:
+#   the walls, the goals, the player and only k of the crates (a pattern).
+# Since the crates are identical, the pattern is solved when its k crates are on any k distinct goals.
+# The table is indexed by the sorted cells of the k crates (using the row-major cell indices of PackedSokobanLayout) and the player cell.
+# The crates are ranked among the k-combinations of the n cells (see _index), so a table has C(n, k) * n entries instead of n^(k+1).
+# It is computed by a retrograde (backward) breadth first search that starts from all the abstract goal states
+# and applies the reverse moves (the player steps back, optionally pulling a crate).
+#
+# Every step in the real level is also a valid step in the abstraction (removing crates only removes obstacles),
+# so the abstract cost of any k crates is a consistent lower bound on the real cost.
+# The heuristic is the maximum over all the k-subsets of the crates (and strong_heuristic) which stays admissible and consistent.
+#
+# The tables depend only on the layout, so they are saved to disk under a hash of the layout and memory-mapped on later runs.
+# NumPy is optional (like in sokoban_distances.py): without it, the tables are int16 arrays saved as raw binary files (".bin" instead of ".npy")
+# which are read back into memory instead of being memory-mapped.
+# The value UNREACHABLE is stored in the tables for abstract states that cannot be solved.
+# A table costs 2 bytes per entry while it is built plus the frontier of the search, so the tables with more than
+# MAX_TABLE_ENTRIES entries are refused (e.g. the triples of a level with 230 cells or the quadruples of a level with 95 cells).
+
+# The default folder in which the tables are saved
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdb_cache")
+
+# The largest table that can be built (2**28 entries take 512 MB)
+MAX_TABLE_ENTRIES = 2**28
+
+# Raised when the table of a pattern size would have more than MAX_TABLE_ENTRIES entries
+class PatternDatabaseTooLarge(ValueError):
+    pass
+
+# Returns a hash that identifies the walkable cells and the goals of the layout (the only parts of the level that the tables depend on)
+def layout_hash(layout: SokobanLayout) -> str:
+    row_major = lambda position: (position.y, position.x)
+    key = ";".join((
+        f"{layout.width}x{layout.height}",
+        ",".join(f"{p.x}:{p.y}" for p in sorted(layout.walkable, key=row_major)),
+        ",".join(f"{p.x}:{p.y}" for p in sorted(layout.goals, key=row_major)),
+    ))
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+class PatternDatabase:
+    # Loads the table of the given pattern size for the layout from the cache folder, or builds and saves it if it does not exist
+    # If cache_dir is None, the table is built in memory and not saved
+    # Raises PatternDatabaseTooLarge if the table has more than max_entries entries
+    def __init__(self, layout: SokobanLayout, size: int = 2, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = MAX_TABLE_ENTRIES) -> None:
+        if not isinstance(layout, PackedSokobanLayout):
+            layout = PackedSokobanLayout.from_layout(layout)
+        self.layout = layout
+        self.size = size
+        self.cell_count = count = len(layout.cells)
+        # binomials[i][cell] = C(cell, i + 1) is the contribution of the i-th smallest crate to the rank of the crates
+        self._binomials = [[comb(cell, i + 1) for cell in range(count)] for i in range(size)]
+        self.entry_count = comb(count, size) * count
+        if self.entry_count > max_entries:
+            raise PatternDatabaseTooLarge(f"The pattern database of {size} crates on a level with {count} cells has {self.entry_count} entries "
+                                          f"(the limit is {max_entries}), use smaller patterns")
+        if cache_dir is None:
+            self.table = self._build()
+            return
+        # The "c" marks the tables indexed by the rank of the crates (the older tables had n^(k+1) entries)
+        path = os.path.join(cache_dir, f"{layout_hash(layout)}_{size}c." + ("npy" if np is not None else "bin"))
+        if not os.path.exists(path):
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temporary file first so that a partially written table is never loaded
+            temporary_path = path + f".{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as f:
+                if np is not None:
+                    np.save(f, np.frombuffer(self._build(), dtype=np.int16))
+                else:
+                    self._build().tofile(f)
+            os.replace(temporary_path, path)
+        if np is not None:
+            self.table = np.load(path, mmap_mode="r")
+        else:
+            self.table = array('h')
+            with open(path, "rb") as f:
+                self.table.frombytes(f.read())
+
+    # Converts the player cell and the sorted crate cells into an index in the flat table
+    # The rank of the crates c_0 < c_1 < ... < c_(k-1) is C(c_0, 1) + C(c_1, 2) + ... + C(c_(k-1), k),
+    # which numbers the k-combinations of the cells from 0 to C(n, k) - 1 (in colexicographic order)
+    def _index(self, player: int, crates: Sequence[int]) -> int:
+        rank = 0
+        for binomials, crate in zip(self._binomials, crates):
+            rank += binomials[crate]
+        return rank * self.cell_count + player
+
+    # Returns the exact abstract cost of the given player cell and sorted crate cells (the number of crates must equal the size)
+    def lookup(self, player: int, crates: Sequence[int]) -> int:
+        return int(self.table[self._index(player, crates)])
+
+    # Returns the maximum abstract cost over all the patterns of the given crate cells
+    def evaluate(self, player: int, crates: Sequence[int]) -> int:
+        crates = sorted(crates)
+        return max((self.lookup(player, pattern) for pattern in combinations(crates, self.size)), default=0)
+
+    # Computes the table via a retrograde breadth first search from all the abstract goal states
+    def _build(self) -> array:
+        neighbors, count, size = self.layout.neighbors, self.cell_count, self.size
+        costs = array('h', [UNREACHABLE]) * self.entry_count
+        frontier = deque()
+        goals = sorted(self.layout.indices[goal] for goal in self.layout.goals)
+        # The goal states have the pattern crates on any distinct goals and the player in any other cell
+        for pattern in combinations(goals, size):
+            for player in range(count):
+                if player in pattern: continue
+                costs[self._index(player, pattern)] = 0
+                frontier.append((player, pattern))
+        while frontier:
+            player, crates = frontier.popleft()
+            cost = costs[self._index(player, crates)] + 1
+            for direction in Direction:
+                # The player came to its cell by moving in "direction" from the previous cell
+                previous = neighbors[player][direction.rotate(2)]
+                if previous < 0 or previous in crates: continue
+                # It either walked from there (the crates did not move)
+                predecessors = [crates]
+                # Or it pushed the crate that is now in front of it (so the crate was where the player is now)
+                front = neighbors[player][direction]
+                if front >= 0 and front in crates:
+                    predecessors.append(tuple(sorted(player if crate == front else crate for crate in crates)))
+                for predecessor in predecessors:
+                    index = self._index(previous, predecessor)
+                    if costs[index] == UNREACHABLE:
+                        costs[index] = cost
+                        frontier.append((previous, predecessor))
+        return costs
+
+# Returns the player cell and the crate cells of the state
+def _state_cells(layout: SokobanLayout, state: SokobanState) -> Tuple[int, List[int]]:
+    if isinstance(state, PackedSokobanState):
+        return state.player, list(iterate_bits(state.crates))
+    indices = layout.indices if isinstance(layout, PackedSokobanLayout) else layout.distances().indices
+    return indices[state.player], [indices[crate] for crate in state.crates]
+
+# Creates a pattern database heuristic that uses the given pattern sizes (e.g. (2,) for pairs or (2, 3) for pairs and triples)
+# The databases are created on the first call for each problem and stored in problem.cache()
+# NOTE: a table of size k has C(n, k) * n entries for a level with n cells, and it is built by a search in pure python over all of them
+# (about 1 second per million entries, only on the first run since the table is saved to the cache folder).
+# The pairs are cheap, the triples of a level with 100 cells (16 million entries) take tens of seconds
+# and the sizes with more than MAX_TABLE_ENTRIES entries raise PatternDatabaseTooLarge.
+def make_pdb_heuristic(sizes: Sequence[int] = (2,), cache_dir: str = DEFAULT_CACHE_DIR) -> HeuristicFunction:
+    key = ("pdb", tuple(sizes), cache_dir)
+    def pdb_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
+        cache = problem.cache()
+        player, crates = _state_cells(state.layout, state)
+        databases = cache.get(key)
+        if databases is None:
+            # A pattern cannot be bigger than the number of crates or the number of goals
+            limit = min(len(crates), len(state.layout.goals))
+            databases = cache[key] = [PatternDatabase(state.layout, size, cache_dir) for size in sizes if size <= limit]
+        value = strong_heuristic(problem, state)
+        for database in databases:
+            value = max(value, database.evaluate(player, crates))
+        return value
+    return pdb_heuristic
+
+# This heuristic uses the pattern databases of crate pairs
+pdb_heuristic = make_pdb_heuristic((2,))
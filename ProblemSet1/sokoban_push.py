@@ -0,0 +1,142 @@
+from typing import Callable, FrozenSet, Iterable, List, Optional, Set, Tuple
+from collections import deque
+
+from mathutils import Direction, Point
+from problem import Problem, Solution
+from sokoban import SokobanProblem, SokobanState, PackedSokobanState
+from helpers.utils import track_call_count
+
+# This file contains a push-level (macro-move) version of the sokoban problem
+# In SokobanProblem, each action is a single player step, so the search graph contains every player position between pushes.
+# In SokobanPushProblem, each action pushes a crate one cell in some direction, and the player walks to the push location for free.
+# Since the player can walk anywhere in its reachable region without changing anything,
+# the player position in the state is normalized to the minimum cell (in row-major order) of its reachable region.
+# So all the states that only differ in the player position within the same region become one state.
+# NOTE: Every push costs 1, so the solutions are optimal in the number of pushes (not in the number of player steps).
+#       "weak_heuristic" measures player steps so it is not admissible for push costs, while "strong_heuristic" is.
+
+# A push action is a tuple containing the position of a crate and the direction in which it is pushed
+PushAction = Tuple[Point, Direction]
+
+# The key used to order the cells in row-major order
+def _row_major(position: Point) -> Tuple[int, int]:
+    return position.y, position.x
+
+class SokobanPushProblem(Problem[SokobanState, PushAction]):
+    # The push problem wraps a sokoban problem and starts from the given state (or the problem's initial state)
+    # Packed states are converted to points since the pushes are expressed in points
+    def __init__(self, problem: SokobanProblem, initial_state: Optional[SokobanState] = None) -> None:
+        super().__init__()
+        self.problem = problem
+        self.layout = problem.layout
+        if initial_state is None:
+            initial_state = problem.get_initial_state()
+        if isinstance(initial_state, PackedSokobanState):
+            initial_state = initial_state.unpack()
+        # The start state holds the real player position which is needed to expand the solution into steps
+        self.start_state = initial_state
+        self.initial_state = self.normalize(initial_state)
+
+    def get_initial_state(self) -> SokobanState:
+        return self.initial_state
+
+    def is_goal(self, state: SokobanState) -> bool:
+        return self.layout.goals == state.crates
+
+    # Returns the set of cells that the player can walk to without pushing any crate (flood fill)
+    def reachable(self, player: Point, crates: FrozenSet[Point]) -> Set[Point]:
+        walkable = self.layout.walkable
+        region = {player}
+        frontier = [player]
+        while frontier:
+            position = frontier.pop()
+            for direction in Direction:
+                next_position = position + direction.to_vector()
+                if next_position in walkable and next_position not in crates and next_position not in region:
+                    region.add(next_position)
+                    frontier.append(next_position)
+        return region
+
+    # Returns the same state but with the player moved to the canonical (minimum) cell of its reachable region
+    def normalize(self, state: SokobanState) -> SokobanState:
+        player = min(self.reachable(state.player, state.crates), key=_row_major)
+        return SokobanState(state.layout, player, state.crates)
+
+    # The actions are all the pushes where the player can reach the cell behind the crate
+    # and the cell in front of the crate is free. The crates are visited in row-major order to keep the order deterministic.
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: SokobanState) -> Iterable[PushAction]:
+        region = self.reachable(state.player, state.crates)
+        walkable, deadlocks = self.layout.walkable, self.problem.deadlocks
+        actions = []
+        for crate in sorted(state.crates, key=_row_major):
+            for direction in Direction:
+                vector = direction.to_vector()
+                target = crate + vector
+                if crate - vector not in region: continue
+                if target not in walkable or target in state.crates: continue
+                # If enabled in the wrapped problem, skip the pushes that lead to deadlocks
+                if deadlocks is not None and deadlocks.is_deadlocked_point_push(state.crates, crate, target): continue
+                actions.append((crate, direction))
+        return actions
+
+    # After the push, the player stands where the crate was
+    def get_successor(self, state: SokobanState, action: PushAction) -> SokobanState:
+        crate, direction = action
+        target = crate + direction.to_vector()
+        if crate not in state.crates or target not in self.layout.walkable or target in state.crates:
+            raise Exception(f"Invalid push {crate} {direction} in state:" + "\n" + str(state))
+        crates = state.crates.symmetric_difference({crate, target})
+        return self.normalize(SokobanState(state.layout, crate, crates))
+
+    def get_cost(self, state: SokobanState, action: PushAction) -> float:
+        # All pushes have the same cost
+        return 1
+
+    # Returns the list of steps that the player walks (without pushing) from "source" to "destination" (via breadth first search)
+    def walk(self, source: Point, destination: Point, crates: FrozenSet[Point]) -> List[Direction]:
+        walkable = self.layout.walkable
+        parents = {source: None}
+        frontier = deque([source])
+        while frontier:
+            position = frontier.popleft()
+            if position == destination:
+                break
+            for direction in Direction:
+                next_position = position + direction.to_vector()
+                if next_position in walkable and next_position not in crates and next_position not in parents:
+                    parents[next_position] = (position, direction)
+                    frontier.append(next_position)
+        if destination not in parents:
+            raise Exception(f"Cannot walk from {source} to {destination}")
+        steps = []
+        while parents[destination] is not None:
+            destination, direction = parents[destination]
+            steps.append(direction)
+        steps.reverse()
+        return steps
+
+    # Expands a solution of pushes into a list of player steps that can be applied to the wrapped problem
+    # starting from the start state (which holds the real player position)
+    def expand_solution(self, pushes: List[PushAction]) -> List[Direction]:
+        steps = []
+        player, crates = self.start_state.player, self.start_state.crates
+        for crate, direction in pushes:
+            vector = direction.to_vector()
+            steps.extend(self.walk(player, crate - vector, crates))
+            steps.append(direction)
+            player, crates = crate, crates.symmetric_difference({crate, crate + vector})
+        return steps
+
+# This wraps a search function (uninformed or informed) so that it searches the push-level problem
+# and returns the solution as a list of player steps for the wrapped sokoban problem
+# It can be passed to the search agents instead of the search function
+def push_level_search(search_fn: Callable[..., Solution]) -> Callable[..., Solution]:
+    def search(problem: SokobanProblem, initial_state: SokobanState, *args) -> Solution:
+        push_problem = SokobanPushProblem(problem, initial_state)
+        pushes = search_fn(push_problem, push_problem.get_initial_state(), *args)
+        if pushes is None:
+            return None
+        return push_problem.expand_solution(pushes)
+    return search
@@ -0,0 +1,62 @@
+from typing import Callable, List, Tuple
+from problem import Problem, Solution
+from sokoban import SokobanProblem
+from parking import ParkingProblem
+from transposition_table import TranspositionTable
+from search import BreadthFirstSearch, UniformCostSearch
+import argparse, glob, time, tracemalloc
+
+# This benchmark compares the explored sets of the searches on the sokoban levels and the parking lots:
+#   - "set": the packed states in a python set (the default of search.py)
+#   - "zobrist": the zobrist states (packed states carrying an incrementally updated 64-bit hash) in a python set
+#   - "table": the zobrist states in a TranspositionTable which only stores their 64-bit keys
+# For each problem, it reports the peak memory allocated during the search (measured by tracemalloc), the wall time,
+# the expanded nodes and the path length. The three versions should expand the same nodes and return the same path
+# (unless the table overwrites entries, see "overwrites").
+# NOTE: tracemalloc slows down every allocation, so the times are only comparable with each other
+
+# Returns a function which creates a fresh problem of the file with the given representation
+def get_loader(path: str) -> Callable[[bool], Problem]:
+    if path.endswith(".txt") and "park" in path:
+        return lambda zobrist: ParkingProblem.from_file(path, packed=True, zobrist=zobrist)
+    return lambda zobrist: SokobanProblem.from_file(path, packed=True, zobrist=zobrist)
+
+def get_search(name: str):
+    return {"bfs": BreadthFirstSearch, "ucs": UniformCostSearch}[name]
+
+# Runs the search and returns the solution, the expanded nodes, the wall time, the peak memory and the overwrites of the table
+# The memory of the table (8 bytes per slot) is included in the peak memory
+def run(problem: Problem, search_name: str, table: bool, capacity: int) -> Tuple[Solution, int, float, int, int]:
+    calls: List[int] = [0]
+    get_actions = problem.get_actions
+    def counting_get_actions(state):
+        calls[0] += 1
+        return get_actions(state)
+    problem.get_actions = counting_get_actions
+    tracemalloc.start()
+    explored = TranspositionTable(capacity) if table else None
+    start = time.perf_counter()
+    solution = get_search(search_name)(problem, problem.get_initial_state(), explored=explored)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return solution, calls[0], elapsed, peak, 0 if explored is None else explored.overwrites
+
+def main(args: argparse.Namespace):
+    print(f"{'problem':<20}{'search':<8}{'explored':<10}{'peak memory':>14}{'time (s)':>10}{'expanded':>10}{'path':>7}{'overwrites':>12}")
+    paths = sorted(glob.glob(args.levels)) + sorted(glob.glob(args.parks))
+    for path in paths:
+        load = get_loader(path)
+        for search_name in args.searches:
+            for name, zobrist, table in (("set", False, False), ("zobrist", True, False), ("table", True, True)):
+                solution, expanded, elapsed, peak, overwrites = run(load(zobrist), search_name, table, args.capacity)
+                length = "-" if solution is None else len(solution)
+                print(f"{path:<20}{search_name:<8}{name:<10}{peak / 1024:>12.0f}KB{elapsed:>10.3f}{expanded:>10}{length:>7}{overwrites:>12}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the explored sets with the zobrist transposition table on sokoban and parking problems")
+    parser.add_argument("--levels", "-l", default="levels/*.txt", help="a glob pattern for the sokoban levels to run")
+    parser.add_argument("--parks", "-p", default="parks/*.txt", help="a glob pattern for the parking lots to run")
+    parser.add_argument("--searches", "-s", nargs="+", default=["bfs"], choices=["bfs", "ucs"], help="the search algorithms to run")
+    parser.add_argument("--capacity", "-c", type=int, default=2**18, help="the number of slots of the transposition table (it should exceed twice the explored states)")
+    main(parser.parse_args())
@@ -0,0 +1,93 @@
+from array import array
+from typing import Any, Callable, Hashable, Optional, Set
+
+# This is a fixed-size transposition table which can replace the explored sets of the search algorithms
+# (every search in search.py which keeps an explored set takes it as the "explored" argument)
+# Unlike a set, it does not store the states: it only stores a 64-bit key per state in a flat array of slots (8 bytes per slot),
+# so the states that left the frontier can be freed, while a set keeps every explored state alive and uses ~3 words per entry.
+# The key of a state is its zobrist hash (see ZobristSokobanState and ZobristParkingState) or the result of the "key" function if given.
+# The states are compared by their keys only, so 2 different states with the same key are considered the same
+# (with random 64-bit zobrist keys, the chance of such a collision among n states is about n^2 / 2^65).
+# The python hashes are not random enough to be trusted that way (e.g. hash(-1) == hash(-2) and hash(n) wraps around 2^61 - 1),
+# so the states without a zobrist key are stored as they are in a python set (where the equal hashes are checked with ==).
+#
+# The slots are found by open addressing (linear probing over "probes" slots starting from the home slot of the key).
+# The table never grows: when every probed slot is taken by other keys, the key replaces the entry in its home slot.
+# The replaced state is forgotten (it is reported in "overwrites"), so a search may expand it again if it reaches it again.
+# To avoid this, the capacity should be about twice the number of explored states (the load factor "len(table) / capacity" should stay below 0.5).
+
+MASK64 = (1 << 64) - 1
+# The multiplier of fibonacci hashing which spreads the keys (e.g. small integers returned by a "key" function) over the slots
+GOLDEN = 0x9E3779B97F4A7C15
+
+# Returns the zobrist hash of a state or None if it has none
+def state_key(state: Hashable) -> Optional[int]:
+    return getattr(state, "key", None)
+
+class TranspositionTable:
+    __slots__ = ("_slots", "_shift", "_mask", "_probes", "_key", "_size", "_states", "overwrites")
+
+    # The capacity is rounded up to a power of 2
+    # The key function returns the 64-bit key of a state (or None to store the state itself in the set)
+    def __init__(self, capacity: int = 2**20, probes: int = 32, key: Optional[Callable[[Any], Optional[int]]] = None) -> None:
+        bits = max(1, (capacity - 1).bit_length())
+        # Every slot holds a key, 0 marks an empty slot (a key of 0 is stored as 1)
+        self._slots = array('Q', bytes(8 << bits))
+        self._shift = 64 - bits
+        self._mask = (1 << bits) - 1
+        self._probes = min(probes, 1 << bits)
+        self._key = key or state_key
+        self._size = 0
+        # The states without a key
+        self._states: Set[Hashable] = set()
+        self.overwrites = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._slots)
+
+    def __len__(self) -> int:
+        return self._size + len(self._states)
+
+    # Returns the home slot of the key
+    def _home(self, key: int) -> int:
+        return (key * GOLDEN & MASK64) >> self._shift
+
+    def __contains__(self, state: Hashable) -> bool:
+        key = self._key(state)
+        if key is None: return state in self._states
+        key = key or 1
+        slots, mask = self._slots, self._mask
+        index = self._home(key)
+        for _ in range(self._probes):
+            stored = slots[index]
+            if stored == key: return True
+            if stored == 0: return False
+            index = (index + 1) & mask
+        return False
+
+    def add(self, state: Hashable) -> None:
+        key = self._key(state)
+        if key is None:
+            self._states.add(state)
+            return
+        key = key or 1
+        slots, mask = self._slots, self._mask
+        home = index = self._home(key)
+        for _ in range(self._probes):
+            stored = slots[index]
+            if stored == key: return
+            if stored == 0:
+                slots[index] = key
+                self._size += 1
+                return
+            index = (index + 1) & mask
+        # Every probed slot is taken, so the entry of the home slot is replaced
+        slots[home] = key
+        self.overwrites += 1
+
+    def clear(self) -> None:
+        self._slots = array('Q', bytes(8 * len(self._slots)))
+        self._size = 0
+        self._states.clear()
+        self.overwrites = 0